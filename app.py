@@ -1,21 +1,33 @@
-from flask import Flask, request, jsonify, render_template, send_file
+from flask import Flask, request, jsonify, render_template, send_file, Response, stream_with_context
 from flask_cors import CORS
 import os
+import re
 import json
+import time
 import uuid
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import threading
-import time
 
+from config import get_config
+from services.job_queue import JobQueue, JobTimeoutError, QueueFullError
+from services.pipeline import BranchError, Pipeline
+from services.probe import video_probe
+from services.import_tracker import ImportTracker
+from services.task_events import TaskEventBroker, create_event_bridge
+from services.task_store import TERMINAL_STATUSES, create_task_store
 from services.tiktok_downloader import TikTokDownloader
 from services.youtube_uploader import YouTubeUploader
 from services.instagram_uploader import InstagramUploader
+from services.media_host import media_host
 from services.metadata_processor import MetadataProcessor
 from services.video_processor import VideoProcessor
 
 load_dotenv()
 
+config = get_config()
+
 app = Flask(__name__)
 CORS(app)
 
@@ -37,13 +49,116 @@ instagram_uploader = InstagramUploader()
 metadata_processor = MetadataProcessor()
 video_processor = VideoProcessor()
 
-# Almacén en memoria para el estado de las tareas
-tasks = {}
+# Videos ya importados desde perfiles/hashtags y puntos de control por fuente
+import_tracker = ImportTracker(config.IMPORT_DB)
+
+# Plataformas de subida soportadas
+UPLOADERS = {
+    'youtube': 'YouTube',
+    'instagram': 'Instagram'
+}
+
+# Estado de las tareas (con TTL y límite de memoria); cada cambio se
+# publica en el broker para los clientes conectados por SSE (y, con un
+# backend compartido, en los demás workers de gunicorn a través del bridge)
+task_events = TaskEventBroker(queue_size=config.SSE_QUEUE_SIZE, bridge=create_event_bridge())
+tasks = create_task_store(task_events)
+
+# Cola de trabajos persistente con pool de workers acotado
+job_queue = JobQueue(
+    db_path=config.JOB_QUEUE_DB,
+    workers=config.JOB_QUEUE_WORKERS,
+    max_queue_size=config.JOB_QUEUE_MAX_SIZE,
+    stage_limits=config.JOB_STAGE_CONCURRENCY,
+    timeout=config.TASK_TIMEOUT,
+    retry_count=config.TASK_RETRY_COUNT,
+    retry_delay=config.TASK_RETRY_DELAY,
+    slot_dir=config.JOB_STAGE_SLOT_DIR
+)
+
+def queue_full_response(error):
+    """Respuesta 429 con la profundidad actual de la cola"""
+    response = jsonify({
+        'error': 'La cola de trabajos está llena, intenta más tarde',
+        'queue_depth': error.depth,
+        'max_queue_size': error.capacity
+    })
+    response.headers['Retry-After'] = str(config.TASK_RETRY_DELAY)
+    return response, 429
+
+def enqueue_task(kind, payload, initial_state):
+    """Crea el registro de la tarea y encola el trabajo asociado"""
+    task_id = str(uuid.uuid4())
+    tasks[task_id] = dict(initial_state, created_at=datetime.now().isoformat())
+    
+    try:
+        job_queue.submit(kind, payload, job_id=task_id)
+    except QueueFullError:
+        tasks.pop(task_id, None)
+        raise
+    
+    return task_id
+
+def handle_process_error(ctx, error, will_retry):
+    """
+    Si algunas plataformas se subieron, la tarea y el trabajo terminan con
+    éxito parcial ('completed_with_errors', como los lotes de /api/batch)
+    """
+    uploads = tasks.get(ctx.job_id, {}).get('uploads', {})
+    succeeded = [name for name, record in uploads.items() if record.get('status') == 'completed']
+    failed = [name for name, record in uploads.items() if record.get('status') != 'completed']
+    
+    if will_retry or not succeeded:
+        handle_job_error(ctx, error, will_retry)
+        return None
+    
+    tasks[ctx.job_id].update({
+        'status': 'completed_with_errors',
+        'progress': 100,
+        'message': f"Completado con errores en: {', '.join(failed)}"
+    })
+    return 'completed_with_errors'
+
+def handle_job_error(ctx, error, will_retry):
+    """Refleja en la tarea un fallo del trabajo (reintento o error definitivo)"""
+    task = tasks.setdefault(ctx.job_id, {'created_at': datetime.now().isoformat()})
+    
+    if will_retry:
+        task.update({
+            'status': 'queued',
+            'message': f'Error: {str(error)}. Reintentando en {config.TASK_RETRY_DELAY}s '
+                       f'(intento {ctx.attempt + 1}/{ctx.max_attempts})...'
+        })
+    else:
+        task.update({
+            'status': 'error',
+            'progress': 0,
+            'message': f'Error: {str(error)}'
+        })
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def run_download_job(ctx):
+    task_id = ctx.job_id
+    tasks[task_id].update({
+        'status': 'downloading',
+        'message': 'Descargando video de TikTok...'
+    })
+    
+    # La reserva de los archivos no se libera aquí: el cliente sube después
+    # el video por /api/upload y la reserva vence sola (DOWNLOAD_CACHE_LEASE_TTL)
+    with ctx.stage('download'):
+        result = tiktok_downloader.download(ctx.payload['url'], task_id)
+    
+    tasks[task_id].update({
+        'status': 'completed',
+        'progress': 100,
+        'message': 'Video descargado exitosamente',
+        'result': result
+    })
+
 @app.route('/api/download', methods=['POST'])
 def download_tiktok():
     try:
@@ -53,37 +168,12 @@ def download_tiktok():
         if not url:
             return jsonify({'error': 'URL is required'}), 400
         
-        # Generar ID único para la tarea
-        task_id = str(uuid.uuid4())
-        
-        # Inicializar estado de la tarea
-        tasks[task_id] = {
-            'status': 'downloading',
+        # Encolar descarga (el pool de workers limita la concurrencia)
+        task_id = enqueue_task('download', {'url': url}, {
+            'status': 'queued',
             'progress': 0,
-            'message': 'Descargando video de TikTok...',
-            'created_at': datetime.now().isoformat()
-        }
-        
-        # Ejecutar descarga en hilo separado
-        def download_task():
-            try:
-                result = tiktok_downloader.download(url, task_id)
-                tasks[task_id].update({
-                    'status': 'completed',
-                    'progress': 100,
-                    'message': 'Video descargado exitosamente',
-                    'result': result
-                })
-            except Exception as e:
-                tasks[task_id].update({
-                    'status': 'error',
-                    'progress': 0,
-                    'message': f'Error: {str(e)}'
-                })
-        
-        thread = threading.Thread(target=download_task)
-        thread.daemon = True
-        thread.start()
+            'message': 'Descarga en cola...'
+        })
         
         return jsonify({
             'task_id': task_id,
@@ -91,9 +181,169 @@ def download_tiktok():
             'message': 'Descarga iniciada'
         })
         
+    except QueueFullError as e:
+        return queue_full_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def set_upload_status(task_id, platform, progress_start=0, **fields):
+    """
+    Actualiza el estado independiente de una plataforma en tasks[task_id]['uploads']
+    y recalcula el progreso global de la tarea a partir del de cada plataforma
+    """
+    task = tasks[task_id]
+    uploads = task.setdefault('uploads', {})
+    uploads.setdefault(platform, {'status': 'pending', 'progress': 0}).update(fields)
+    
+    average = sum(record.get('progress', 0) for record in uploads.values()) / len(uploads)
+    uploading = [name for name, record in uploads.items() if record.get('status') == 'uploading']
+    
+    # Reasignar 'uploads' para que el cambio se publique a los clientes
+    changes = {
+        'uploads': uploads,
+        'progress': progress_start + (100 - progress_start) * average / 100
+    }
+    if uploading:
+        changes['message'] = f"Subiendo a {', '.join(uploading)}..."
+    task.update(changes)
+
+# Subidas en curso en este proceso: (task_id, plataforma) -> Event que se
+# marca al terminar. Un intento vencido puede dejar una subida en marcha y el
+# reintento no debe publicar el mismo video otra vez
+active_uploads = {}
+active_uploads_lock = threading.Lock()
+
+def wait_for_uploads(task_id, timeout):
+    """
+    Espera las subidas de la tarea que siguen en curso (de un intento anterior)
+    
+    Returns:
+        bool: True si ya no queda ninguna en curso
+    """
+    with active_uploads_lock:
+        events = [event for (upload_task, _), event in active_uploads.items() if upload_task == task_id]
+    
+    deadline = time.time() + max(0, timeout)
+    return all(event.wait(max(0, deadline - time.time())) for event in events)
+
+def pending_platforms(task_id, platforms):
+    """Plataformas soportadas sin subir ni subiéndose (se omiten al reintentar)"""
+    uploads = tasks[task_id].get('uploads', {})
+    with active_uploads_lock:
+        in_flight = {platform for upload_task, platform in active_uploads if upload_task == task_id}
+    return [
+        platform for platform in platforms
+        if platform in UPLOADERS
+        and platform not in in_flight
+        and uploads.get(platform, {}).get('status') != 'completed'
+    ]
+
+def finish_upload(task_id, platform, progress_start, result=None, error=None):
+    """Registra el resultado final de la subida a una plataforma"""
+    with active_uploads_lock:
+        event = active_uploads.pop((task_id, platform), None)
+    if event:
+        event.set()
+    
+    if error is not None:
+        print(f"[ERROR] ❌ Error en {UPLOADERS[platform]}: {str(error)}")
+        set_upload_status(task_id, platform, progress_start, status='error', success=False, error=str(error))
+        return
+    
+    if platform == 'youtube':
+        print(f"[SUCCESS] ✅ YouTube Short subido: {result.get('video_url', 'URL no disponible')}")
+    else:
+        print(f"[SUCCESS] ✅ Instagram Reel subido: {result.get('permalink', 'URL no disponible')}")
+    set_upload_status(task_id, platform, progress_start, **dict(result, status='completed', progress=100))
+
+def upload_to_platform(task_id, platform, video_path, description, thumbnail_path=None, title=None, progress_start=0, wait=True):
+    """
+    Sube a una plataforma registrando su propio estado, progreso y error
+    
+    Con wait=False la subida a Instagram devuelve un Future en cuanto se crea
+    el container: la espera hasta que Instagram lo procesa no ocupa el hilo
+    """
+    with active_uploads_lock:
+        active_uploads[(task_id, platform)] = threading.Event()
+    set_upload_status(task_id, platform, progress_start, status='uploading', progress=0, error=None)
+    
+    try:
+        if platform == 'youtube':
+            print(f"[INFO] 🎬 Subiendo a YouTube Shorts...")
+            result = youtube_uploader.upload(
+                video_path, description, thumbnail_path, title,
+                # Avance real por chunk confirmado por YouTube
+                progress_callback=lambda fraction: set_upload_status(
+                    task_id, platform, progress_start, progress=int(fraction * 100)
+                ),
+                # El ID del trabajo se mantiene en reintentos y reinicios: la
+                # sesión resumible se retoma aunque el video esté en otra ruta
+                session_scope=task_id
+            )
+        else:
+            print(f"[INFO] 📱 Subiendo a Instagram Reels...")
+            pending = instagram_uploader.upload_async(
+                video_path, description, thumbnail_path, title,
+                on_status=lambda status, elapsed: set_upload_status(
+                    task_id, platform, progress_start,
+                    message=f"Instagram procesando el video ({status or 'sin respuesta'}, {int(elapsed)}s)"
+                ),
+                # Solo en subida directa; el resto hasta 100% es el procesamiento en Instagram
+                on_progress=lambda fraction: set_upload_status(
+                    task_id, platform, progress_start, progress=int(fraction * 90)
+                ),
+                session_scope=task_id
+            )
+            
+            if not wait:
+                def on_done(done):
+                    error = done.exception()
+                    finish_upload(task_id, platform, progress_start, result=None if error else done.result(), error=error)
+                
+                pending.add_done_callback(on_done)
+                return pending
+            
+            result = pending.result()
+    except Exception as e:
+        finish_upload(task_id, platform, progress_start, error=e)
+        raise
+    
+    finish_upload(task_id, platform, progress_start, result=result)
+    return result
+
+def run_upload_job(ctx):
+    task_id = ctx.job_id
+    video_path = ctx.payload['video_path']
+    platforms = pending_platforms(task_id, ctx.payload['platforms'])
+    custom_description = ctx.payload.get('description', '')
+    
+    tasks[task_id]['status'] = 'uploading'
+    
+    def upload_platform(platform):
+        with ctx.stage('upload'):
+            return upload_to_platform(task_id, platform, video_path, custom_description)
+    
+    # Las plataformas son independientes: se suben en paralelo y el fallo de
+    # una no interrumpe a las demás
+    errors = {}
+    if platforms:
+        with ThreadPoolExecutor(max_workers=len(platforms)) as executor:
+            futures = {platform: executor.submit(upload_platform, platform) for platform in platforms}
+            for platform, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[platform] = e
+    
+    if errors:
+        raise BranchError(errors)
+    
+    tasks[task_id].update({
+        'status': 'completed',
+        'progress': 100,
+        'message': 'Subida completada a todas las plataformas'
+    })
+
 @app.route('/api/upload', methods=['POST'])
 def upload_to_platforms():
     try:
@@ -105,50 +355,16 @@ def upload_to_platforms():
         if not video_path or not platforms:
             return jsonify({'error': 'Video path and platforms are required'}), 400
         
-        task_id = str(uuid.uuid4())
-        
-        tasks[task_id] = {
-            'status': 'uploading',
+        task_id = enqueue_task('upload', {
+            'video_path': video_path,
+            'platforms': platforms,
+            'description': custom_description
+        }, {
+            'status': 'queued',
             'progress': 0,
-            'message': 'Iniciando subida a plataformas...',
-            'created_at': datetime.now().isoformat(),
+            'message': 'Subida en cola...',
             'uploads': {}
-        }
-        
-        def upload_task():
-            try:
-                total_platforms = len(platforms)
-                completed = 0
-                
-                for platform in platforms:
-                    tasks[task_id]['message'] = f'Subiendo a {platform}...'
-                    
-                    if platform == 'youtube':
-                        result = youtube_uploader.upload(video_path, custom_description)
-                        tasks[task_id]['uploads']['youtube'] = result
-                    elif platform == 'instagram':
-                        result = instagram_uploader.upload(video_path, custom_description)
-                        tasks[task_id]['uploads']['instagram'] = result
-                    
-                    completed += 1
-                    tasks[task_id]['progress'] = (completed / total_platforms) * 100
-                
-                tasks[task_id].update({
-                    'status': 'completed',
-                    'progress': 100,
-                    'message': 'Subida completada a todas las plataformas'
-                })
-                
-            except Exception as e:
-                tasks[task_id].update({
-                    'status': 'error',
-                    'progress': 0,
-                    'message': f'Error: {str(e)}'
-                })
-        
-        thread = threading.Thread(target=upload_task)
-        thread.daemon = True
-        thread.start()
+        })
         
         return jsonify({
             'task_id': task_id,
@@ -156,6 +372,8 @@ def upload_to_platforms():
             'message': 'Subida iniciada'
         })
         
+    except QueueFullError as e:
+        return queue_full_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -174,12 +392,284 @@ def data_deletion():
 
 @app.route('/api/task/<task_id>', methods=['GET'])
 def get_task_status(task_id):
-    task = tasks.get(task_id)
+    task = load_task(task_id)
     if not task:
         return jsonify({'error': 'Task not found'}), 404
     
     return jsonify(task)
 
+def load_task(task_id):
+    """Estado de la tarea, o el reconstruido de su trabajo si expiró del store o es de antes de un reinicio"""
+    return tasks.snapshot(task_id) or task_from_job(job_queue.get(task_id))
+
+# Eventos de tareas (Server-Sent Events): un snapshot inicial y luego solo
+# las claves que cambian, en lugar de consultar /api/task/<id> cada segundo
+def sse_message(event, data):
+    return f"event: {event}\ndata: {data}\n\n"
+
+def event_stream(subscription, task_ids=None, close_when_done=False):
+    """
+    Genera el stream SSE de una suscripción
+    
+    Args:
+        subscription (Subscription): Suscripción ya registrada en el broker
+        task_ids (list): Tareas para el snapshot inicial y las resincronizaciones
+            (None: las que estén activas en cada momento)
+        close_when_done (bool): Cerrar el stream cuando las tareas terminan
+    """
+    # Estado enviado al cliente: se cierra según lo que ya recibió, no según
+    # el store, para no perder el último evento si la tarea termina mientras
+    # el stream espera
+    finished = set()
+    
+    def track(task_id, status):
+        if status in TERMINAL_STATUSES:
+            finished.add(task_id)
+        elif status is not None:
+            finished.discard(task_id)
+    
+    def snapshots():
+        for task_id in (task_ids or active_task_ids()):
+            task = load_task(task_id)
+            if task:
+                track(task_id, task.get('status'))
+                yield sse_message('snapshot', json.dumps(dict(task, task_id=task_id), default=str))
+    
+    def done():
+        return close_when_done and finished.issuperset(task_ids or [])
+    
+    try:
+        yield f"retry: {config.SSE_RETRY_MS}\n\n"
+        yield from snapshots()
+        if done():
+            return
+        
+        while True:
+            event = subscription.get(timeout=config.SSE_KEEPALIVE_SECONDS)
+            
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            
+            kind, task_id, data = event
+            if kind == 'resync':
+                # El cliente se atrasó y se descartaron eventos: reenviar el estado
+                yield from snapshots()
+            else:
+                if close_when_done:
+                    track(task_id, json.loads(data).get('status'))
+                yield sse_message(kind, data)
+            
+            if done():
+                return
+    finally:
+        task_events.unsubscribe(subscription)
+
+def active_task_ids():
+    return tasks.active_ids()
+
+def sse_response(stream):
+    return Response(stream_with_context(stream), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Evitar buffering en proxies (nginx)
+    })
+
+@app.route('/api/task/<task_id>/events', methods=['GET'])
+def task_events_stream(task_id):
+    if not load_task(task_id):
+        return jsonify({'error': 'Task not found'}), 404
+    
+    subscription = task_events.subscribe([task_id])
+    return sse_response(event_stream(subscription, [task_id], close_when_done=True))
+
+@app.route('/api/events', methods=['GET'])
+def events_stream():
+    """Stream multiplexado: todas las tareas o las indicadas en ?tasks=id1,id2"""
+    task_ids = [task_id for task_id in request.args.get('tasks', '').split(',') if task_id]
+    
+    subscription = task_events.subscribe(task_ids or None)
+    return sse_response(event_stream(subscription, task_ids or None))
+
+# Etapas del pipeline de procesamiento completo
+def stage_download(item):
+    task_id = item.job_id
+    tasks[task_id].update({
+        'status': 'processing',
+        'message': 'Descargando video de TikTok...',
+        'progress': 10
+    })
+    
+    download_result = tiktok_downloader.download(item.data['url'], task_id)
+    item.data['download'] = download_result
+    tasks[task_id]['video_info'] = download_result
+
+def stage_probe(item):
+    task_id = item.job_id
+    tasks[task_id].update({
+        'message': 'Analizando video...',
+        'progress': 25
+    })
+    
+    video_path = item.data['download']['video_path']
+    if not os.path.exists(video_path):
+        raise Exception(f"Video no encontrado: {video_path}")
+    
+    item.data['source_info'] = video_processor.analyze_video(video_path)
+
+def stage_transcode(item):
+    task_id = item.job_id
+    tasks[task_id].update({
+        'message': 'Procesando video...',
+        'progress': 30
+    })
+    
+    video_path = item.data['download']['video_path']
+    print(f"[INFO] Procesando video: {video_path}")
+    
+    def on_progress(progress):
+        # El avance real de FFmpeg se reparte entre el 30% y el 45%
+        eta = f", ETA {int(progress['eta'])}s" if progress['eta'] is not None else ''
+        tasks[task_id].update({
+            'message': f"Procesando video... {int(progress['fraction'] * 100)}% ({progress['speed']}x{eta})",
+            'progress': 30 + int(progress['fraction'] * 15),
+            'encode': progress
+        })
+    
+    item.data['processed'] = video_processor.transcode(
+        video_path,
+        item.data['source_info'],
+        mode=item.data.get('mode'),
+        progress_callback=on_progress
+    )
+
+def stage_thumbnail(item):
+    task_id = item.job_id
+    tasks[task_id].update({
+        'message': 'Generando miniatura...',
+        'progress': 45
+    })
+    
+    processed_video = video_processor.finalize(
+        item.data['download']['video_path'],
+        item.data['source_info'],
+        item.data['processed']
+    )
+    
+    # Miniatura de cada plataforma (recortada y dentro de su límite de bytes);
+    # si falla, las subidas usan la miniatura original
+    thumbnails = metadata_processor.process_thumbnail(processed_video.get('thumbnail'), item.data['platforms'])
+    if thumbnails:
+        processed_video['thumbnails'] = {
+            platform: variant['path'] for platform, variant in thumbnails['variants'].items()
+        }
+        processed_video['thumbnail_timing'] = thumbnails['timing']
+        print(f"[INFO] Miniaturas generadas en {thumbnails['timing']['total_ms']} ms: {list(processed_video['thumbnails'])}")
+    item.data['processed'] = processed_video
+    
+    print(f"[INFO] Video listo para subida: {processed_video.get('path', 'ERROR')}")
+
+def render_text_template(template, values):
+    """Reemplaza {campo} por su valor; los campos desconocidos quedan igual"""
+    return re.sub(
+        r'\{(\w+)\}',
+        lambda match: str(values.get(match.group(1), match.group(0))),
+        template
+    )
+
+def upload_title_and_description(item):
+    metadata = item.data['download']['metadata']
+    
+    # Los títulos y descripciones pueden ser plantillas ({title}, {creator}, {index}...)
+    values = dict(metadata, url=item.data['url'], index=item.data.get('batch_index', ''))
+    title = render_text_template(item.data.get('title') or '', values) or metadata['description']
+    description = render_text_template(item.data.get('description') or '', values) or metadata['description']
+    return title, description
+
+def stage_upload(item, platform):
+    processed_video = item.data['processed']
+    title, description = upload_title_and_description(item)
+    
+    # Si devuelve un Future, el pipeline libera el worker de la etapa mientras
+    # la plataforma procesa el video
+    return upload_to_platform(
+        item.job_id,
+        platform,
+        processed_video['path'],
+        description,
+        processed_video.get('thumbnails', {}).get(platform) or processed_video['thumbnail'],
+        title,
+        progress_start=50,
+        wait=False
+    )
+
+def stage_upload_youtube(item):
+    return stage_upload(item, 'youtube')
+
+def stage_upload_instagram(item):
+    return stage_upload(item, 'instagram')
+
+# Pipeline: cada etapa con su propio pool y cola acotada; los cupos de
+# concurrencia por tipo de etapa se comparten con la cola de trabajos. El
+# cupo 'transcode' es solo para las codificaciones: el probe (ffprobe) no
+# toma cupo y las miniaturas tienen el suyo, para no esperar detrás de una
+# codificación larga
+pipeline = Pipeline(limiter=job_queue)
+pipeline_stages = [
+    ('download', stage_download, 'download'),
+    ('probe', stage_probe, None),
+    ('transcode', stage_transcode, 'transcode'),
+    ('thumbnail', stage_thumbnail, 'thumbnail'),
+    ('upload_youtube', stage_upload_youtube, 'upload'),
+    ('upload_instagram', stage_upload_instagram, 'upload')
+]
+for stage_name, stage_handler, stage_slot in pipeline_stages:
+    pipeline.add_stage(
+        stage_name,
+        stage_handler,
+        workers=config.PIPELINE_STAGE_WORKERS.get(stage_name, 1),
+        queue_size=config.PIPELINE_QUEUE_SIZE,
+        slot=stage_slot
+    )
+
+def run_process_job(ctx):
+    """Procesamiento completo: descargar, procesar y subir a las plataformas"""
+    task_id = ctx.job_id
+    
+    # Un intento anterior que venció puede tener subidas todavía en curso: se
+    # esperan antes de decidir qué falta, para no publicar dos veces
+    if not wait_for_uploads(task_id, ctx.remaining()):
+        raise JobTimeoutError("Subidas del intento anterior todavía en curso")
+    platforms = pending_platforms(task_id, ctx.payload['platforms'])
+    
+    # Las subidas por plataforma forman un grupo paralelo: el tiempo total es
+    # el de la más lenta y el fallo de una no bloquea a las otras
+    uploads = tasks[task_id].setdefault('uploads', {})
+    for platform in platforms:
+        uploads[platform] = {'status': 'pending', 'progress': 0}
+    tasks[task_id]['uploads'] = uploads
+    
+    route = ['download', 'probe', 'transcode', 'thumbnail']
+    route.append([f'upload_{platform}' for platform in platforms])
+    
+    future = pipeline.submit(task_id, dict(ctx.payload), route=route, deadline=ctx.deadline)
+    # El video descargado sigue reservado en la cache hasta que terminan todas
+    # las etapas (el nivel remux puede subir el original sin copiarlo)
+    future.add_done_callback(lambda _: tiktok_downloader.release(task_id))
+    
+    try:
+        future.result(timeout=max(0, ctx.remaining()))
+    except TimeoutError as e:
+        # Las etapas pendientes del item no se ejecutan; las que ya empezaron
+        # (ej. una subida) terminan y el reintento las respeta
+        pipeline.cancel(future)
+        raise JobTimeoutError(f"Tiempo agotado procesando la tarea: {str(e)}")
+    
+    tasks[task_id].update({
+        'status': 'completed',
+        'progress': 100,
+        'message': 'Procesamiento completado exitosamente'
+    })
+
 @app.route('/api/process', methods=['POST'])
 def process_complete():
     """Endpoint para procesar completo: descargar y subir"""
@@ -189,107 +679,420 @@ def process_complete():
         platforms = data.get('platforms', [])
         custom_title = data.get('title', '')
         custom_description = data.get('description', '')
+        mode = data.get('mode') or config.VIDEO_PROCESSING_MODE
         
         if not url or not platforms:
             return jsonify({'error': 'URL and platforms are required'}), 400
         
-        task_id = str(uuid.uuid4())
+        if mode not in video_processor.PROCESSING_MODES:
+            return jsonify({'error': f"mode must be one of: {', '.join(video_processor.PROCESSING_MODES)}"}), 400
         
         # Debug info (opcional - remover en producción)
         title_preview = custom_title[:30] + "..." if custom_title else "Sin título personalizado"
         print(f"[INFO] Procesando: URL={url}, Plataformas={platforms}, Título='{title_preview}'")
         
-        tasks[task_id] = {
-            'status': 'processing',
+        task_id = enqueue_task('process', {
+            'url': url,
+            'platforms': platforms,
+            'title': custom_title,
+            'description': custom_description,
+            'mode': mode
+        }, {
+            'status': 'queued',
             'progress': 0,
-            'message': 'Iniciando procesamiento...',
-            'created_at': datetime.now().isoformat(),
+            'message': 'En cola para procesamiento...',
             'video_info': None,
             'uploads': {}
-        }
+        })
         
-        def complete_process():
+        return jsonify({
+            'task_id': task_id,
+            'status': 'started',
+            'message': 'Procesamiento iniciado'
+        })
+        
+    except QueueFullError as e:
+        return queue_full_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def parse_batch_request():
+    """
+    Lee un lote desde JSON ({"urls": [...]}) o desde un archivo JSONL subido
+    en el campo 'file' (una URL o un objeto {"url", "title", "description"}
+    por línea)
+    
+    Returns:
+        tuple: (opciones compartidas, lista de elementos)
+    """
+    upload = request.files.get('file')
+    
+    if upload:
+        options = request.form.to_dict()
+        platforms = request.form.getlist('platforms')
+        if len(platforms) == 1:
+            platforms = [name.strip() for name in platforms[0].split(',') if name.strip()]
+        options['platforms'] = platforms
+        
+        entries = []
+        for number, line in enumerate(upload.read().decode('utf-8').splitlines(), 1):
+            line = line.strip()
+            if not line:
+                continue
             try:
-                # Paso 1: Descargar
-                tasks[task_id]['message'] = 'Descargando video de TikTok...'
-                tasks[task_id]['progress'] = 10
-                
-                download_result = tiktok_downloader.download(url, task_id)
-                tasks[task_id]['video_info'] = download_result
-                
-                # Paso 2: Procesar video
-                tasks[task_id]['message'] = 'Procesando video...'
-                tasks[task_id]['progress'] = 30
-                
-                print(f"[INFO] Procesando video: {download_result['video_path']}")
-                
-                processed_video = video_processor.process(
-                    download_result['video_path'],
-                    download_result['metadata']
-                )
-                
-                print(f"[INFO] Video listo para subida: {processed_video.get('path', 'ERROR')}")
-                
-                # Paso 3: Preparar título y descripción
-                title = custom_title if custom_title else download_result['metadata']['description']
-                description = custom_description if custom_description else download_result['metadata']['description']
-                
-                # Paso 4: Subir a plataformas
-                total_platforms = len(platforms)
-                upload_progress_start = 50
-                upload_progress_per_platform = 50 / total_platforms
-                
-                for i, platform in enumerate(platforms):
-                    current_progress = upload_progress_start + (i * upload_progress_per_platform)
-                    tasks[task_id]['progress'] = current_progress
-                    tasks[task_id]['message'] = f'Subiendo a {platform}...'
-                    
-                    if platform == 'youtube':
-                        print(f"[INFO] 🎬 Subiendo a YouTube Shorts...")
-                        try:
-                            result = youtube_uploader.upload(processed_video['path'], description, processed_video['thumbnail'], title)
-                            tasks[task_id]['uploads']['youtube'] = result
-                            print(f"[SUCCESS] ✅ YouTube Short subido: {result.get('video_url', 'URL no disponible')}")
-                        except Exception as yt_error:
-                            print(f"[ERROR] ❌ Error en YouTube: {str(yt_error)}")
-                            raise yt_error
-                    elif platform == 'instagram':
-                        print(f"[INFO] 📱 Subiendo a Instagram Reels...")
-                        try:
-                            result = instagram_uploader.upload(processed_video['path'], description, processed_video['thumbnail'], title)
-                            tasks[task_id]['uploads']['instagram'] = result
-                            print(f"[SUCCESS] ✅ Instagram Reel subido: {result.get('permalink', 'URL no disponible')}")
-                        except Exception as ig_error:
-                            print(f"[ERROR] ❌ Error en Instagram: {str(ig_error)}")
-                            raise ig_error
-                
-                tasks[task_id].update({
-                    'status': 'completed',
-                    'progress': 100,
-                    'message': 'Procesamiento completado exitosamente'
-                })
-                
-            except Exception as e:
-                print(f"[ERROR] ❌ Error en procesamiento: {str(e)}")
-                tasks[task_id].update({
-                    'status': 'error',
-                    'progress': 0,
-                    'message': f'Error: {str(e)}'
-                })
-        
-        thread = threading.Thread(target=complete_process)
-        thread.daemon = True
-        thread.start()
+                entries.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"Línea {number} del JSONL no es válida")
+    else:
+        options = request.get_json() or {}
+        entries = options.get('urls') or options.get('items') or []
+    
+    items = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'url': entry}
+        if not isinstance(entry, dict) or not entry.get('url'):
+            raise ValueError("Cada elemento del lote necesita una URL")
+        items.append(entry)
+    
+    return options, items
+
+def enqueue_batch(entries, platforms, options, mode):
+    """
+    Encola un trabajo 'process' por elemento y registra el lote
+    
+    Returns:
+        tuple: (batch_id, elementos con su task_id)
+    """
+    batch_id = str(uuid.uuid4())
+    created_at = datetime.now().isoformat()
+    jobs = []
+    items = []
+    
+    for index, entry in enumerate(entries, 1):
+        task_id = str(uuid.uuid4())
+        jobs.append((task_id, {
+            'url': entry['url'],
+            'platforms': platforms,
+            'title': entry.get('title') or options.get('title', ''),
+            'description': entry.get('description') or options.get('description', ''),
+            'mode': mode,
+            'batch_id': batch_id,
+            'batch_index': index
+        }))
+        items.append({'index': index, 'url': entry['url'], 'task_id': task_id})
+        tasks[task_id] = {
+            'status': 'queued',
+            'progress': 0,
+            'message': 'En cola para procesamiento...',
+            'video_info': None,
+            'uploads': {},
+            'batch_id': batch_id,
+            'created_at': created_at
+        }
+    
+    # Todo el lote entra a la cola en una transacción; los workers de la
+    # cola acotan cuántos elementos se procesan a la vez
+    try:
+        job_queue.submit_many('process', jobs)
+    except QueueFullError:
+        for item in items:
+            tasks.pop(item['task_id'], None)
+        raise
+    
+    print(f"[INFO] Lote {batch_id} encolado: {len(items)} URLs, Plataformas={platforms}")
+    return batch_id, items
+
+@app.route('/api/batch', methods=['POST'])
+def create_batch():
+    """Encola un lote de URLs que comparten plataformas y plantillas de título/descripción"""
+    try:
+        options, entries = parse_batch_request()
+        platforms = options.get('platforms') or []
+        mode = options.get('mode') or config.VIDEO_PROCESSING_MODE
+        
+        if not entries or not platforms:
+            return jsonify({'error': 'URLs and platforms are required'}), 400
+        
+        if mode not in video_processor.PROCESSING_MODES:
+            return jsonify({'error': f"mode must be one of: {', '.join(video_processor.PROCESSING_MODES)}"}), 400
+        
+        # Una URL repetida en el mismo lote se procesa una sola vez
+        unique = {}
+        for entry in entries:
+            unique.setdefault(entry['url'], entry)
+        unique_entries = list(unique.values())
+        
+        if len(unique_entries) > config.BATCH_MAX_ITEMS:
+            return jsonify({'error': f'Batch too large (max {config.BATCH_MAX_ITEMS} URLs)'}), 400
+        
+        invalid = [entry['url'] for entry in unique_entries if not tiktok_downloader.is_valid_tiktok_url(entry['url'])]
+        if invalid:
+            return jsonify({'error': 'Invalid TikTok URLs', 'invalid_urls': invalid}), 400
+        
+        batch_id, items = enqueue_batch(unique_entries, platforms, options, mode)
+        
+        return jsonify({
+            'batch_id': batch_id,
+            'status': 'started',
+            'total': len(items),
+            'duplicates': len(entries) - len(unique_entries),
+            'task_ids': [item['task_id'] for item in items]
+        })
+        
+    except QueueFullError as e:
+        return queue_full_response(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def batch_status(batch_id, jobs):
+    """
+    Estado agregado de un lote a partir de las tareas de sus elementos. Los
+    elementos salen de la cola persistente, así que cualquier worker puede
+    responder por un lote aunque lo haya creado otro.
+    """
+    counts = {}
+    failures = []
+    items = []
+    progress = 0
+    
+    for job in sorted(jobs, key=lambda job: job['payload'].get('batch_index', 0)):
+        item = {'index': job['payload'].get('batch_index'), 'url': job['payload']['url'], 'task_id': job['id']}
+        task = tasks.snapshot(job['id']) or task_from_job(job)
+        status = task['status']
+        counts[status] = counts.get(status, 0) + 1
+        progress += task.get('progress', 0)
+        
+        failed_uploads = {
+            platform: record.get('error') or record.get('message')
+            for platform, record in (task.get('uploads') or {}).items()
+            if record.get('status') == 'error'
+        }
+        if status == 'error' or failed_uploads:
+            failures.append(dict(item, message=task.get('message'), failed_uploads=failed_uploads))
+        
+        items.append(dict(item, status=status, progress=task.get('progress', 0)))
+    
+    total = len(jobs)
+    finished = sum(counts.get(status, 0) for status in TERMINAL_STATUSES)
+    
+    started = min(job['created_at'] for job in jobs)
+    ended = max(job['updated_at'] for job in jobs) if finished == total else time.time()
+    elapsed = ended - started
+    
+    if finished < total:
+        status = 'processing' if counts.get('queued', 0) < total else 'queued'
+    else:
+        status = 'completed' if not failures else 'completed_with_errors'
+    
+    return {
+        'batch_id': batch_id,
+        'status': status,
+        'created_at': jobs[0]['created_at_iso'],
+        'platforms': jobs[0]['payload'].get('platforms', []),
+        'total': total,
+        'finished': finished,
+        'counts': counts,
+        'progress': round(progress / total) if total else 100,
+        'elapsed_seconds': round(elapsed, 1),
+        'throughput_per_min': round(finished * 60 / elapsed, 2) if elapsed > 0 else 0,
+        'failures': failures,
+        'items': items
+    }
+
+@app.route('/api/batch/<batch_id>', methods=['GET'])
+def get_batch_status(batch_id):
+    jobs = job_queue.find_jobs('batch_id', batch_id)
+    if not jobs:
+        return jsonify({'error': 'Batch not found'}), 404
+    
+    return jsonify(batch_status(batch_id, jobs))
+
+def run_import_job(ctx):
+    """Sincroniza un perfil o hashtag: enumera en plano y encola solo los videos nuevos"""
+    task_id = ctx.job_id
+    source_url = ctx.payload['url']
+    tasks[task_id].update({
+        'status': 'processing',
+        'message': 'Listando videos...'
+    })
+    
+    checkpoint = import_tracker.checkpoint(source_url)
+    
+    with ctx.stage('download'):
+        listing = tiktok_downloader.list_entries(
+            source_url,
+            is_known=import_tracker.is_imported,
+            checkpoint_id=checkpoint['last_video_id'] if checkpoint else None,
+            limit=min(ctx.payload.get('limit') or config.IMPORT_MAX_ITEMS, config.IMPORT_MAX_ITEMS)
+        )
+    
+    entries = listing['entries']
+    batch_id = None
+    
+    if entries:
+        # Orden cronológico: el más antiguo de los nuevos se publica primero
+        entries = entries[::-1]
+        batch_id, _ = enqueue_batch(entries, ctx.payload['platforms'], ctx.payload, ctx.payload.get('mode'))
+    
+    import_tracker.record(source_url, [entry['video_id'] for entry in entries], listing['checkpoint_id'])
+    
+    tasks[task_id].update({
+        'status': 'completed',
+        'progress': 100,
+        'message': f"{len(entries)} videos nuevos encolados ({listing['scanned']} revisados)",
+        'result': {
+            'batch_id': batch_id,
+            'imported': len(entries),
+            'scanned': listing['scanned'],
+            'truncated': listing['truncated']
+        }
+    })
+
+@app.route('/api/import', methods=['POST'])
+def import_source():
+    """Importa los videos nuevos de un perfil (@usuario) o hashtag (/tag/...) desde la última sincronización"""
+    try:
+        data = request.get_json() or {}
+        url = data.get('url')
+        platforms = data.get('platforms', [])
+        mode = data.get('mode') or config.VIDEO_PROCESSING_MODE
+        
+        if not url or not platforms:
+            return jsonify({'error': 'URL and platforms are required'}), 400
+        
+        if not tiktok_downloader.is_collection_url(url):
+            return jsonify({'error': 'URL must be a TikTok profile or hashtag'}), 400
+        
+        if mode not in video_processor.PROCESSING_MODES:
+            return jsonify({'error': f"mode must be one of: {', '.join(video_processor.PROCESSING_MODES)}"}), 400
+        
+        # Más videos de los que entran en la cola haría fallar (y reintentar)
+        # la importación con QueueFullError: se limita a IMPORT_MAX_ITEMS
+        limit = data.get('limit')
+        try:
+            limit = int(limit) if limit is not None else config.IMPORT_MAX_ITEMS
+        except (TypeError, ValueError):
+            limit = 0
+        if limit <= 0:
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+        
+        task_id = enqueue_task('import', {
+            'url': url,
+            'platforms': platforms,
+            'title': data.get('title', ''),
+            'description': data.get('description', ''),
+            'mode': mode,
+            'limit': min(limit, config.IMPORT_MAX_ITEMS)
+        }, {
+            'status': 'queued',
+            'progress': 0,
+            'message': 'Importación en cola...'
+        })
         
         return jsonify({
             'task_id': task_id,
             'status': 'started',
-            'message': 'Procesamiento iniciado'
+            'message': 'Importación iniciada'
         })
         
+    except QueueFullError as e:
+        return queue_full_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/import/sources', methods=['GET'])
+def import_sources():
+    return jsonify(import_tracker.sources())
+
+@app.route('/media/<name>', methods=['GET', 'HEAD'])
+def serve_media(name):
+    """
+    Sirve un video publicado para Instagram. send_file responde Range y
+    ETag/If-None-Match, y gunicorn usa sendfile: el archivo no pasa por memoria
+    """
+    path = media_host.resolve(name, request.args.get('expires'), request.args.get('sig'))
+    if not path:
+        return jsonify({'error': 'Not found'}), 404
+    
+    return send_file(path, mimetype='video/mp4', conditional=True, etag=True, max_age=config.MEDIA_URL_TTL)
+
+@app.route('/api/queue', methods=['GET'])
+def queue_status():
+    return jsonify(dict(
+        job_queue.stats(),
+        tasks=tasks.stats(),
+        instagram_containers=instagram_uploader.poller.stats()
+    ))
+
+@app.route('/api/pipeline', methods=['GET'])
+def pipeline_status():
+    return jsonify(pipeline.stats())
+
+@app.route('/api/cache', methods=['GET'])
+def cache_status():
+    return jsonify({
+        'download': tiktok_downloader.cache.stats() if tiktok_downloader.cache else None,
+        'transcode': video_processor.cache.stats() if video_processor.cache else None,
+        'probe': video_probe.stats()
+    })
+
+def task_from_job(job):
+    """Reconstruye un estado de tarea mínimo a partir del trabajo persistido"""
+    if not job:
+        return None
+    
+    state_mapping = {
+        'queued': ('queued', 'En cola...'),
+        'running': ('processing', 'Procesando...'),
+        'completed': ('completed', 'Trabajo completado'),
+        'completed_with_errors': ('completed_with_errors', 'Trabajo completado con errores'),
+        'failed': ('error', f"Error: {job.get('last_error') or 'desconocido'}")
+    }
+    status, message = state_mapping.get(job['state'], ('queued', 'En cola...'))
+    
+    return {
+        'status': status,
+        'progress': 100 if status.startswith('completed') else 0,
+        'message': message,
+        'created_at': job['created_at_iso'],
+        'video_info': None,
+        'uploads': {}
+    }
+
+def restore_pending_tasks():
+    """Restaura el estado de las tareas cuyos trabajos siguen pendientes tras un reinicio"""
+    for job in job_queue.pending_jobs():
+        tasks.setdefault(job['id'], task_from_job(job))
+
+job_queue.register('download', run_download_job, on_error=handle_job_error)
+job_queue.register('upload', run_upload_job, on_error=handle_process_error)
+job_queue.register('process', run_process_job, on_error=handle_process_error)
+job_queue.register('import', run_import_job, on_error=handle_job_error)
+
+_started = False
+
+def init():
+    """
+    Arranca los hilos de fondo (bridge de eventos, pipeline y consumidores de
+    la cola). No se hace al importar el módulo: los procesos del pool de
+    miniaturas (forkserver/spawn) vuelven a importar el script principal como
+    __mp_main__ y cada uno sería otro consumidor de la cola.
+    
+    Returns:
+        Flask: La aplicación (para gunicorn 'app:init()')
+    """
+    global _started
+    if not _started:
+        _started = True
+        task_events.start()
+        restore_pending_tasks()
+        pipeline.start()
+        job_queue.start()
+    return app
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
@@ -306,4 +1109,5 @@ if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
     
+    init()
     app.run(debug=debug, host='0.0.0.0', port=port) 
\ No newline at end of file
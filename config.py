@@ -24,12 +24,50 @@ class Config:
     YOUTUBE_REFRESH_TOKEN = os.environ.get('YOUTUBE_REFRESH_TOKEN')
     YOUTUBE_CREDENTIALS_FILE = os.path.join(BASE_DIR, 'youtube_credentials.json')
     YOUTUBE_TOKEN_FILE = os.path.join(BASE_DIR, 'youtube_token.pickle')
+    # Subida resumible: tamaño de chunk (múltiplo de 256 KB) y reintentos por chunk
+    YOUTUBE_UPLOAD_CHUNK_SIZE = int(os.environ.get('YOUTUBE_UPLOAD_CHUNK_MB', 8)) * 1024 * 1024
+    YOUTUBE_UPLOAD_MAX_RETRIES = int(os.environ.get('YOUTUBE_UPLOAD_MAX_RETRIES', 8))
+    YOUTUBE_UPLOAD_MAX_BACKOFF = int(os.environ.get('YOUTUBE_UPLOAD_MAX_BACKOFF', 60))  # segundos
+    YOUTUBE_HTTP_TIMEOUT = int(os.environ.get('YOUTUBE_HTTP_TIMEOUT', 300))  # segundos por petición/chunk
+    
+    # Sesiones de subida resumible (para retomar tras un reinicio del worker)
+    UPLOAD_SESSIONS_DB = os.environ.get('UPLOAD_SESSIONS_DB', os.path.join(BASE_DIR, 'data', 'upload_sessions.sqlite3'))
     
     # Instagram API
     INSTAGRAM_ACCESS_TOKEN = os.environ.get('INSTAGRAM_ACCESS_TOKEN')
     INSTAGRAM_USER_ID = os.environ.get('INSTAGRAM_USER_ID')
     INSTAGRAM_APP_ID = os.environ.get('INSTAGRAM_APP_ID')
     INSTAGRAM_APP_SECRET = os.environ.get('INSTAGRAM_APP_SECRET')
+    INSTAGRAM_GRAPH_URL = os.environ.get('INSTAGRAM_GRAPH_URL', 'https://graph.instagram.com')
+    # Envío del video: 'url' (Instagram lo descarga de /media) o 'resumable'
+    # (subida directa de bytes en chunks al host de subida)
+    INSTAGRAM_UPLOAD_MODE = os.environ.get('INSTAGRAM_UPLOAD_MODE', 'url').lower()
+    INSTAGRAM_UPLOAD_URL = os.environ.get('INSTAGRAM_UPLOAD_URL', 'https://rupload.facebook.com/ig-api-upload')
+    INSTAGRAM_UPLOAD_CHUNK_SIZE = int(os.environ.get('INSTAGRAM_UPLOAD_CHUNK_MB', 8)) * 1024 * 1024
+    INSTAGRAM_UPLOAD_MAX_RETRIES = int(os.environ.get('INSTAGRAM_UPLOAD_MAX_RETRIES', 5))
+    # Conexiones HTTP a la Graph API: timeouts (segundos), pool y reintentos
+    INSTAGRAM_CONNECT_TIMEOUT = float(os.environ.get('INSTAGRAM_CONNECT_TIMEOUT', 10))
+    INSTAGRAM_READ_TIMEOUT = float(os.environ.get('INSTAGRAM_READ_TIMEOUT', 60))
+    INSTAGRAM_HTTP_POOL_SIZE = int(os.environ.get('INSTAGRAM_HTTP_POOL_SIZE', 10))
+    INSTAGRAM_HTTP_RETRIES = int(os.environ.get('INSTAGRAM_HTTP_RETRIES', 3))
+    INSTAGRAM_HTTP_BACKOFF = float(os.environ.get('INSTAGRAM_HTTP_BACKOFF', 0.5))
+    # Consulta del estado de los containers: intervalo inicial/máximo (segundos),
+    # factor de backoff, espera total y consultas simultáneas
+    INSTAGRAM_POLL_INITIAL_DELAY = float(os.environ.get('INSTAGRAM_POLL_INITIAL_DELAY', 1))
+    INSTAGRAM_POLL_MAX_DELAY = float(os.environ.get('INSTAGRAM_POLL_MAX_DELAY', 15))
+    INSTAGRAM_POLL_BACKOFF = float(os.environ.get('INSTAGRAM_POLL_BACKOFF', 1.5))
+    INSTAGRAM_CONTAINER_TIMEOUT = int(os.environ.get('INSTAGRAM_CONTAINER_TIMEOUT', 300))
+    INSTAGRAM_POLL_WORKERS = int(os.environ.get('INSTAGRAM_POLL_WORKERS', 4))
+    # Publicaciones simultáneas de containers listos (no ocupan hilos del poller)
+    INSTAGRAM_PUBLISH_WORKERS = int(os.environ.get('INSTAGRAM_PUBLISH_WORKERS', 2))
+    
+    # Hosting propio del video para Instagram: URL pública de esta app,
+    # carpeta servida en /media y vigencia de los enlaces firmados
+    PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL') or os.environ.get('RENDER_EXTERNAL_URL')
+    MEDIA_DIR = os.environ.get('MEDIA_DIR', os.path.join(BASE_DIR, 'data', 'media'))
+    # Sin secreto explícito no se publica: el SECRET_KEY por defecto es público
+    MEDIA_URL_SECRET = os.environ.get('MEDIA_URL_SECRET') or os.environ.get('SECRET_KEY')
+    MEDIA_URL_TTL = int(os.environ.get('MEDIA_URL_TTL', 3600))  # segundos
     
     # Redis (para colas de tareas)
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
@@ -57,7 +95,8 @@ class Config:
             'codec': 'h264',
             'title_max_length': 100,
             'description_max_length': 5000,
-            'tags_max_count': 30
+            'tags_max_count': 30,
+            'thumbnail': {'width': 1080, 'height': 1920, 'max_bytes': 2 * 1024 * 1024}  # 2MB (thumbnails.set)
         },
         'instagram_reels': {
             'max_duration': 180,  # 3 minutos en 2025
@@ -69,7 +108,8 @@ class Config:
             'format': 'mp4',
             'codec': 'h264',
             'caption_max_length': 2200,
-            'hashtags_max_count': 30
+            'hashtags_max_count': 30,
+            'thumbnail': {'width': 1080, 'height': 1920, 'max_bytes': 8 * 1024 * 1024}  # 8MB
         }
     }
     
@@ -82,7 +122,7 @@ class Config:
         'writeautomaticsub': False,
         'ignoreerrors': True,
         'no_warnings': False,
-        'extractflat': False,
+        'extract_flat': False,
         'http_headers': {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
@@ -91,6 +131,17 @@ class Config:
         }
     }
     
+    # Cache de descargas de TikTok (índice por ID de video)
+    DOWNLOAD_CACHE_ENABLED = os.environ.get('DOWNLOAD_CACHE_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    DOWNLOAD_CACHE_DB = os.environ.get('DOWNLOAD_CACHE_DB', os.path.join(BASE_DIR, 'data', 'downloads.sqlite3'))
+    DOWNLOAD_CACHE_TTL = int(os.environ.get('DOWNLOAD_CACHE_TTL', 86400))  # 24 horas
+    DOWNLOAD_CACHE_MAX_BYTES = int(os.environ.get('DOWNLOAD_CACHE_MAX_MB', 10240)) * 1024 * 1024  # MB a bytes
+    DOWNLOAD_CACHE_LEASE_TTL = int(os.environ.get('DOWNLOAD_CACHE_LEASE_TTL', 21600))  # segundos que dura la reserva de un trabajo que no la liberó
+    
+    # Importación masiva desde perfiles y hashtags (extracción plana de yt-dlp)
+    IMPORT_DB = os.environ.get('IMPORT_DB', os.path.join(BASE_DIR, 'data', 'imports.sqlite3'))
+    IMPORT_MAX_ITEMS = int(os.environ.get('IMPORT_MAX_ITEMS', 50))  # Videos nuevos por sincronización
+    
     # FFmpeg configuración
     FFMPEG_OPTIONS = {
         'video_codec': 'libx264',
@@ -101,6 +152,46 @@ class Config:
         'movflags': '+faststart'  # Para streaming
     }
     
+    # Preset rápido para el modo 'throughput' (el modo 'quality' usa FFMPEG_OPTIONS)
+    FFMPEG_FAST_OPTIONS = {
+        'preset': os.environ.get('FFMPEG_FAST_PRESET', 'veryfast'),
+        'crf': os.environ.get('FFMPEG_FAST_CRF', '21')
+    }
+    
+    # Timeout de FFmpeg: proporcional a la duración del video, con un mínimo,
+    # y corte si deja de informar avance
+    FFMPEG_TIMEOUT_MIN = int(os.environ.get('FFMPEG_TIMEOUT_MIN', 300))  # segundos
+    FFMPEG_TIMEOUT_FACTOR = float(os.environ.get('FFMPEG_TIMEOUT_FACTOR', 10))  # segundos por segundo de video
+    FFMPEG_STALL_TIMEOUT = int(os.environ.get('FFMPEG_STALL_TIMEOUT', 120))  # segundos
+    FFMPEG_STDERR_LINES = 50  # Líneas de stderr conservadas para errores
+    
+    # Muestreo de fotogramas (keyframes) compartido por los análisis: miniatura,
+    # estadísticas de imagen...
+    FRAME_SAMPLE_MAX_FRAMES = int(os.environ.get('FRAME_SAMPLE_MAX_FRAMES', 48))
+    
+    # Miniaturas por plataforma: procesos del pool (0 = en el mismo proceso),
+    # rango de calidad JPEG para cumplir el límite de bytes y espera máxima
+    THUMBNAIL_RENDER_WORKERS = int(os.environ.get('THUMBNAIL_RENDER_WORKERS', 2))
+    THUMBNAIL_JPEG_QUALITY = int(os.environ.get('THUMBNAIL_JPEG_QUALITY', 95))
+    THUMBNAIL_JPEG_MIN_QUALITY = int(os.environ.get('THUMBNAIL_JPEG_MIN_QUALITY', 60))
+    THUMBNAIL_RENDER_TIMEOUT = int(os.environ.get('THUMBNAIL_RENDER_TIMEOUT', 60))  # segundos
+    
+    # Metadatos: archivo JSON opcional con 'hashtag_mapping' y 'emoji_patterns'
+    # que se agregan a (o reemplazan) los valores por defecto
+    METADATA_MAPPING_FILE = os.environ.get('METADATA_MAPPING_FILE', '')
+    
+    # Modo de procesamiento por defecto: 'throughput' o 'quality' (se puede
+    # elegir por trabajo). Los videos que ya cumplen solo se reempaquetan.
+    VIDEO_PROCESSING_MODE = os.environ.get('VIDEO_PROCESSING_MODE', 'throughput').lower()
+    
+    # Decodificar una sola vez y generar todas las versiones con un filtro split
+    FFMPEG_SINGLE_PASS = os.environ.get('FFMPEG_SINGLE_PASS', 'True').lower() in ['true', '1', 'yes']
+    
+    # Cache de transcodificación (clave: hash del original + parámetros de codificación)
+    TRANSCODE_CACHE_ENABLED = os.environ.get('TRANSCODE_CACHE_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    TRANSCODE_CACHE_DIR = os.environ.get('TRANSCODE_CACHE_DIR', os.path.join(BASE_DIR, 'data', 'transcode_cache'))
+    TRANSCODE_CACHE_MAX_BYTES = int(os.environ.get('TRANSCODE_CACHE_MAX_MB', 5120)) * 1024 * 1024  # MB a bytes
+    
     # Configuración de logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
     LOG_FILE = os.path.join(BASE_DIR, 'logs', 'uploader.log')
@@ -112,6 +203,53 @@ class Config:
     TASK_RETRY_COUNT = 3
     TASK_RETRY_DELAY = 60  # segundos
     
+    # Store de estado de tareas: 'memory', 'sqlite' o 'redis' (usa REDIS_URL)
+    TASK_STORE_BACKEND = os.environ.get('TASK_STORE_BACKEND', 'memory').lower()
+    TASK_STORE_DB = os.environ.get('TASK_STORE_DB', os.path.join(BASE_DIR, 'data', 'tasks.sqlite3'))
+    TASK_STORE_TTL = int(os.environ.get('TASK_STORE_TTL', 3600))  # Segundos que se conserva una tarea terminada
+    TASK_STORE_MAX_TASKS = int(os.environ.get('TASK_STORE_MAX_TASKS', 1000))
+    
+    # Cola de trabajos persistente (reemplaza un hilo por petición). Se
+    # comparte entre los workers de un host; JOB_QUEUE_DB debe estar en disco
+    # local porque la cola no admite varios hosts
+    JOB_QUEUE_DB = os.environ.get('JOB_QUEUE_DB', os.path.join(BASE_DIR, 'data', 'jobs.sqlite3'))
+    JOB_QUEUE_WORKERS = int(os.environ.get('JOB_QUEUE_WORKERS', 4))  # Trabajos en vuelo simultáneos
+    JOB_QUEUE_MAX_SIZE = int(os.environ.get('JOB_QUEUE_MAX_SIZE', 100))
+    JOB_STAGE_CONCURRENCY = {
+        'download': int(os.environ.get('JOB_DOWNLOAD_CONCURRENCY', 2)),
+        'transcode': int(os.environ.get('JOB_TRANSCODE_CONCURRENCY', 1)),  # solo codificaciones de FFmpeg
+        'thumbnail': int(os.environ.get('JOB_THUMBNAIL_CONCURRENCY', 2)),
+        'upload': int(os.environ.get('JOB_UPLOAD_CONCURRENCY', 3))
+    }
+    
+    # Directorio de cupos por etapa compartidos entre workers de gunicorn del
+    # mismo host (vacío = cupos por proceso)
+    JOB_STAGE_SLOT_DIR = os.environ.get('JOB_STAGE_SLOT_DIR', os.path.join(BASE_DIR, 'data', 'stage_slots'))
+    
+    # Dónde se guarda el token OAuth de YouTube: 'file' (pickle local),
+    # 'sqlite' (compartido por los workers del host) o 'redis'
+    CREDENTIALS_BACKEND = os.environ.get('CREDENTIALS_BACKEND', 'file').lower()
+    CREDENTIALS_DB = os.environ.get('CREDENTIALS_DB', os.path.join(BASE_DIR, 'data', 'credentials.sqlite3'))
+    
+    # Máximo de URLs por lote en /api/batch
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 500))
+    
+    # Pipeline por etapas: hilos por etapa y tamaño de las colas de traspaso
+    PIPELINE_STAGE_WORKERS = {
+        'download': 2,
+        'probe': 1,
+        'transcode': 1,
+        'thumbnail': 1,
+        'upload_youtube': 1,
+        'upload_instagram': 1
+    }
+    PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', 4))
+    
+    # Server-Sent Events para el progreso de las tareas
+    SSE_KEEPALIVE_SECONDS = int(os.environ.get('SSE_KEEPALIVE_SECONDS', 15))
+    SSE_RETRY_MS = 3000  # Espera sugerida al navegador antes de reconectar
+    SSE_QUEUE_SIZE = 256  # Eventos pendientes por cliente antes de resincronizar
+    
     # Rate limiting
     RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True').lower() in ['true', '1', 'yes']
     RATE_LIMIT_REQUESTS = int(os.environ.get('RATE_LIMIT_REQUESTS', 100))
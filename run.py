@@ -117,9 +117,12 @@ def main():
     
     # Importar y configurar la aplicación
     try:
-        from app import app
+        from app import app, init
         from config import get_config
         
+        # Arranca la cola de trabajos y el pipeline (no se hace al importar app)
+        init()
+        
         config = get_config()
         app.config.from_object(config)
         
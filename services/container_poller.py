@@ -0,0 +1,163 @@
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class ContainerWatch:
+    """Container de media en espera de que la plataforma termine de procesarlo"""
+
+    def __init__(self, container_id, check, on_status, delay, deadline):
+        self.container_id = container_id
+        self.check = check
+        self.on_status = on_status
+        self.delay = delay
+        self.deadline = deadline
+        self.started = time.time()
+        self.polls = 0
+        self.future = Future()
+
+
+class ContainerStatusPoller:
+    """
+    Planificador central de consultas de estado de containers. En vez de que
+    cada subida duerma en su hilo entre consulta y consulta, un único hilo
+    temporizador mantiene un heap con la próxima consulta de cada container y
+    la despacha a un pool pequeño. El intervalo crece exponencialmente
+    mientras el container sigue en proceso.
+    """
+
+    def __init__(self, initial_delay=1.0, max_delay=15.0, backoff=1.5, timeout=300, workers=4):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix='container-poll')
+        self._thread = None
+
+        self._metrics_lock = threading.Lock()
+        self.metrics = {
+            'watching': 0,
+            'finished': 0,
+            'failed': 0,
+            'timed_out': 0,
+            'polls': 0,
+            'total_in_progress': 0.0,
+            'max_in_progress': 0.0
+        }
+
+    def watch(self, container_id, check, on_status=None):
+        """
+        Empieza a seguir un container
+
+        Args:
+            container_id (str): ID del container
+            check (callable): check() -> estado actual ('FINISHED', 'IN_PROGRESS',
+                'ERROR'...) o None si la consulta falló de forma transitoria
+            on_status (callable): on_status(estado, segundos) en cada consulta (opcional)
+
+        Returns:
+            Future: se resuelve con el ID del container cuando está listo
+                para publicar, o con excepción si falla o vence el timeout
+        """
+        watch = ContainerWatch(
+            container_id, check, on_status,
+            delay=self.initial_delay,
+            deadline=time.time() + self.timeout
+        )
+
+        with self._metrics_lock:
+            self.metrics['watching'] += 1
+
+        self._schedule(watch, 0)
+        return watch.future
+
+    def _schedule(self, watch, delay):
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._timer_loop, name='container-poller')
+                self._thread.daemon = True
+                self._thread.start()
+
+            heapq.heappush(self._heap, (time.time() + delay, next(self._sequence), watch))
+            self._condition.notify()
+
+    def _timer_loop(self):
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.time():
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._condition.wait(timeout)
+                _, _, watch = heapq.heappop(self._heap)
+
+            self._executor.submit(self._poll, watch)
+
+    def _poll(self, watch):
+        watch.polls += 1
+        elapsed = time.time() - watch.started
+
+        with self._metrics_lock:
+            self.metrics['polls'] += 1
+
+        try:
+            status = watch.check()
+        except Exception as e:
+            self._finish(watch, 'failed', error=e)
+            return
+
+        if watch.on_status:
+            try:
+                watch.on_status(status, elapsed)
+            except Exception as e:
+                print(f"[ERROR] ❌ Error notificando estado del container {watch.container_id}: {str(e)}")
+
+        if status == 'FINISHED':
+            self._finish(watch, 'finished')
+            return
+
+        if status in ('ERROR', 'EXPIRED'):
+            self._finish(watch, 'failed', error=Exception(f"Error procesando el video en Instagram (estado {status})"))
+            return
+
+        if time.time() + watch.delay > watch.deadline:
+            self._finish(watch, 'timed_out', error=Exception(
+                f"Timeout esperando que el container esté listo ({watch.polls} consultas en {int(elapsed)}s)"
+            ))
+            return
+
+        delay = watch.delay
+        watch.delay = min(self.max_delay, watch.delay * self.backoff)
+        self._schedule(watch, delay)
+
+    def _finish(self, watch, outcome, error=None):
+        in_progress = time.time() - watch.started
+
+        with self._metrics_lock:
+            self.metrics['watching'] -= 1
+            self.metrics[outcome] += 1
+            self.metrics['total_in_progress'] += in_progress
+            self.metrics['max_in_progress'] = max(self.metrics['max_in_progress'], in_progress)
+
+        if error is not None:
+            watch.future.set_exception(error)
+        else:
+            watch.future.set_result(watch.container_id)
+
+    def stats(self):
+        """Métricas del tiempo que los containers pasan en IN_PROGRESS"""
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+
+        completed = metrics['finished'] + metrics['failed'] + metrics['timed_out']
+        metrics['avg_in_progress'] = round(metrics['total_in_progress'] / completed, 2) if completed else 0
+        metrics['total_in_progress'] = round(metrics['total_in_progress'], 2)
+        metrics['max_in_progress'] = round(metrics['max_in_progress'], 2)
+
+        with self._condition:
+            metrics['scheduled'] = len(self._heap)
+        return metrics
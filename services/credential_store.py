@@ -0,0 +1,94 @@
+import os
+import time
+import sqlite3
+import threading
+
+from config import Config
+
+# Redis es opcional: solo se necesita con CREDENTIALS_BACKEND=redis
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class SQLiteCredentialStore:
+    """
+    Credenciales OAuth serializadas (JSON) en SQLite, compartidas por todos
+    los workers del host: un token refrescado por un proceso lo ven los demás
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection().execute("""
+            CREATE TABLE IF NOT EXISTS credentials (
+                name TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def load(self, name):
+        row = self._connection().execute(
+            'SELECT data FROM credentials WHERE name = ?', (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def save(self, name, data):
+        self._connection().execute(
+            """INSERT INTO credentials (name, data, updated_at) VALUES (?, ?, ?)
+               ON CONFLICT(name) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at""",
+            (name, data, time.time())
+        )
+
+
+class RedisCredentialStore:
+    """Credenciales OAuth serializadas (JSON) en Redis, compartidas entre hosts"""
+
+    name = 'redis'
+    PREFIX = 'credentials:'
+
+    def __init__(self, url):
+        if not REDIS_AVAILABLE:
+            raise Exception("El paquete 'redis' no está instalado")
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def load(self, name):
+        return self.client.get(self.PREFIX + name)
+
+    def save(self, name, data):
+        self.client.set(self.PREFIX + name, data)
+
+
+def create_credential_store():
+    """
+    Crea el store configurado en CREDENTIALS_BACKEND
+
+    Returns:
+        Store con load(name)/save(name, data), o None para el archivo local
+    """
+    backend_name = Config.CREDENTIALS_BACKEND
+
+    if backend_name == 'sqlite':
+        return SQLiteCredentialStore(Config.CREDENTIALS_DB)
+    if backend_name == 'redis':
+        # Sin redis instalado falla: el archivo local no se comparte entre hosts
+        return RedisCredentialStore(Config.REDIS_URL)
+    if backend_name != 'file':
+        raise Exception(f"Backend de credenciales no soportado: {backend_name}")
+    return None
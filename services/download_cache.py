@@ -0,0 +1,335 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+
+class DownloadCache:
+    """
+    Índice de videos descargados de TikTok (id -> archivos, checksum y fecha)
+    con expiración por TTL, cuota de disco y coalescencia de descargas en curso:
+    dos trabajos que piden el mismo video comparten una única descarga.
+
+    Los archivos que un trabajo tiene en uso quedan reservados (lease) hasta
+    que llama a release(): la cuota no los expulsa y, si la entrada vence, se
+    saca del índice pero sus archivos se borran recién al liberarse. Las
+    reservas viven en la base para valer entre procesos; las que superan
+    lease_ttl (un proceso que murió sin liberar) dejan de contar.
+    """
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, db_path, ttl_seconds, max_bytes, lease_ttl=21600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.lease_ttl = lease_ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._init_db()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS videos (
+                video_id TEXT PRIMARY KEY,
+                video_path TEXT NOT NULL,
+                info_path TEXT,
+                thumbnail_path TEXT,
+                checksum TEXT NOT NULL,
+                total_size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                result TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                video_id TEXT NOT NULL
+            )
+        """)
+        # Archivos en uso por un trabajo (holder) y archivos ya fuera del
+        # índice que esperan a que se liberen para borrarse
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                holder TEXT NOT NULL,
+                path TEXT NOT NULL,
+                acquired_at REAL NOT NULL,
+                PRIMARY KEY (holder, path)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS orphans (
+                path TEXT PRIMARY KEY
+            )
+        """)
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def lookup(self, url, video_id=None, holder=None):
+        """
+        Busca un video ya descargado por URL o por ID
+
+        Args:
+            url (str): URL pedida
+            video_id (str): ID del video si se conoce
+            holder (str): Trabajo que reserva los archivos hasta release()
+
+        Returns:
+            dict: Resultado de la descarga original (con 'cached': True) o None
+        """
+        if not video_id:
+            row = self._connection().execute('SELECT video_id FROM urls WHERE url = ?', (url,)).fetchone()
+            video_id = row[0] if row else None
+
+        result, found = self._checkout(video_id, holder) if video_id else (None, False)
+
+        if result:
+            with self._lock:
+                self.hits += 1
+            return result
+
+        if found:
+            self._remove(video_id)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def checkout(self, video_id, holder):
+        """
+        Reserva los archivos de una entrada vigente para un trabajo (sin contar
+        como acierto ni fallo)
+
+        Returns:
+            dict: Resultado de la descarga (con 'cached': True) o None si la
+                entrada ya no está
+        """
+        return self._checkout(video_id, holder)[0]
+
+    def _checkout(self, video_id, holder):
+        """
+        Lee la entrada y, si sigue vigente, la reserva en la misma transacción
+        (una expulsión concurrente no puede colarse entre ambas)
+
+        Returns:
+            tuple: (resultado o None, si la entrada existía en el índice)
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT video_path, fetched_at, result FROM videos WHERE video_id = ?', (video_id,)
+            ).fetchone()
+            if not row or time.time() - row[1] > self.ttl_seconds or not os.path.exists(row[0]):
+                return None, row is not None
+
+            result = json.loads(row[2])
+            if holder:
+                self._lease(conn, holder, result)
+
+        result['cached'] = True
+        return result, True
+
+    def _lease(self, conn, holder, result):
+        now = time.time()
+        for key in ('video_path', 'info_path', 'thumbnail_path'):
+            if result.get(key):
+                conn.execute(
+                    'INSERT OR REPLACE INTO leases (holder, path, acquired_at) VALUES (?, ?, ?)',
+                    (holder, result[key], now)
+                )
+
+    def release(self, holder):
+        """Libera los archivos reservados por un trabajo y borra los que ya salieron del índice"""
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM leases WHERE holder = ?', (holder,))
+        self._purge_orphans()
+
+    def store(self, url, result, holder=None):
+        """Registra una descarga completada (reservada para holder) y aplica TTL y cuota de disco"""
+        paths = [result.get('video_path'), result.get('info_path'), result.get('thumbnail_path')]
+        total_size = sum(os.path.getsize(path) for path in paths if path and os.path.exists(path))
+
+        with self._transaction() as conn:
+            # Si otro proceso ya registró el mismo video, sus archivos salen del índice
+            previous = conn.execute(
+                'SELECT video_path, info_path, thumbnail_path FROM videos WHERE video_id = ?', (result['video_id'],)
+            ).fetchone()
+            conn.executemany(
+                'INSERT OR IGNORE INTO orphans (path) VALUES (?)',
+                [(path,) for path in previous or () if path and path not in paths]
+            )
+            conn.execute(
+                """INSERT OR REPLACE INTO videos
+                   (video_id, video_path, info_path, thumbnail_path, checksum, total_size, fetched_at, result)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    result['video_id'],
+                    result['video_path'],
+                    result.get('info_path'),
+                    result.get('thumbnail_path'),
+                    self.checksum(result['video_path']),
+                    total_size,
+                    time.time(),
+                    json.dumps(result)
+                )
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO urls (url, video_id) VALUES (?, ?)', (url, result['video_id'])
+            )
+            if holder:
+                self._lease(conn, holder, result)
+
+        self.evict()
+
+    def coalesce(self, key, fetch):
+        """
+        Ejecuta fetch() una sola vez por clave aunque lo pidan varios hilos a
+        la vez; los demás esperan y reciben el mismo resultado (o excepción)
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = fetch()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def evict(self):
+        """
+        Elimina entradas vencidas y, si se supera la cuota, las más antiguas
+        que no estén en uso
+        """
+        conn = self._connection()
+        # Reservas de procesos que terminaron sin liberarlas
+        conn.execute('DELETE FROM leases WHERE acquired_at < ?', (time.time() - self.lease_ttl,))
+        self._purge_orphans()
+
+        expired = conn.execute(
+            'SELECT video_id FROM videos WHERE fetched_at < ?', (time.time() - self.ttl_seconds,)
+        ).fetchall()
+        for (video_id,) in expired:
+            self._remove(video_id)
+
+        total = conn.execute('SELECT COALESCE(SUM(total_size), 0) FROM videos').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Expulsar una entrada en uso no libera espacio: se salta
+        for video_id, size in conn.execute(
+            """SELECT video_id, total_size FROM videos
+               WHERE video_path NOT IN (SELECT path FROM leases)
+               ORDER BY fetched_at"""
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._remove(video_id)
+            total -= size
+
+    def stats(self):
+        row = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(total_size), 0) FROM videos'
+        ).fetchone()
+        leased = self._connection().execute('SELECT COUNT(DISTINCT holder) FROM leases').fetchone()[0]
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'in_flight': len(self._inflight),
+                'leased': leased,
+                'entries': row[0],
+                'size_bytes': row[1],
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+    def checksum(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _remove(self, video_id):
+        """
+        Saca una entrada del índice y borra sus archivos; los que estén en uso
+        quedan pendientes hasta que se liberen
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT video_path, info_path, thumbnail_path FROM videos WHERE video_id = ?', (video_id,)
+            ).fetchone()
+            conn.execute('DELETE FROM videos WHERE video_id = ?', (video_id,))
+            conn.execute('DELETE FROM urls WHERE video_id = ?', (video_id,))
+
+            if not row:
+                return
+
+            paths = [path for path in row if path]
+            conn.executemany('INSERT OR IGNORE INTO orphans (path) VALUES (?)', [(path,) for path in paths])
+
+        self._purge_orphans()
+
+        with self._lock:
+            self.evictions += 1
+
+    def _purge_orphans(self):
+        """Borra los archivos fuera del índice que ya nadie tiene reservados"""
+        with self._transaction() as conn:
+            paths = [path for (path,) in conn.execute(
+                'SELECT path FROM orphans WHERE path NOT IN (SELECT path FROM leases)'
+            ).fetchall()]
+            conn.executemany('DELETE FROM orphans WHERE path = ?', [(path,) for path in paths])
+
+        for path in paths:
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,234 @@
+import os
+import re
+import time
+import tempfile
+import threading
+import subprocess
+
+from config import Config
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# OpenCV es opcional: solo decodifica si FFmpeg falla
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+
+PTS_TIME_PATTERN = re.compile(r'pts_time:\s*(-?[\d.]+)')
+# Línea "Duration: ..., start: 1.400000, ..." de la entrada (el start_time de ffprobe)
+START_TIME_PATTERN = re.compile(r'Duration:.*?, start:\s*(-?[\d.]+)')
+
+
+class FrameSet:
+    """Fotogramas muestreados de un video: (N, alto, ancho) en grises uint8 y su timestamp"""
+
+    def __init__(self, frames, timestamps, backend, elapsed):
+        self.frames = frames
+        self.timestamps = timestamps
+        self.backend = backend
+        self.elapsed = elapsed
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+class FrameSampler:
+    """
+    Decodifica cada video una sola vez a baja resolución y escala de grises
+    en un buffer NumPy mapeado a disco (memmap), y entrega los mismos
+    fotogramas a todos los analizadores suscritos. El costo de decodificación
+    por video es fijo sin importar cuántos análisis estén habilitados.
+
+    Por defecto se decodifican solo los keyframes (-skip_frame nokey); si hay
+    muy pocos se muestrea por tiempo. Si FFmpeg falla se usa OpenCV en una
+    sola pasada secuencial.
+    """
+
+    def __init__(self, width=144, height=256, max_frames=48, timeout=60, temp_dir=None):
+        self.width = width
+        self.height = height
+        self.max_frames = max_frames
+        self.timeout = timeout
+        self.temp_dir = temp_dir
+        self._analyzers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, name, analyzer):
+        """
+        Registra un analizador
+
+        Args:
+            name (str): Clave del resultado
+            analyzer (callable): analyzer(frame_set) -> resultado
+        """
+        with self._lock:
+            self._analyzers[name] = analyzer
+
+    def analyze(self, video_path, duration=None, names=None):
+        """
+        Decodifica el video una vez y ejecuta los analizadores sobre los mismos fotogramas
+
+        Args:
+            video_path (str): Ruta al video
+            duration (float): Duración, para muestrear por tiempo si hay pocos keyframes (opcional)
+            names (list): Analizadores a ejecutar (todos por defecto)
+
+        Returns:
+            dict: Resultado por analizador (None si falló), más 'sampling' con
+                el costo de la decodificación; None si no se pudo decodificar
+        """
+        if not NUMPY_AVAILABLE:
+            return None
+
+        with self._lock:
+            analyzers = {
+                name: analyzer for name, analyzer in self._analyzers.items()
+                if names is None or name in names
+            }
+
+        buffer_path = self._buffer_path()
+        try:
+            frame_set = self.sample(video_path, buffer_path, duration)
+            if not len(frame_set):
+                return None
+
+            results = {
+                'sampling': {
+                    'frames': len(frame_set),
+                    'backend': frame_set.backend,
+                    'elapsed': round(frame_set.elapsed, 3)
+                }
+            }
+            for name, analyzer in analyzers.items():
+                try:
+                    results[name] = analyzer(frame_set)
+                except Exception as e:
+                    print(f"[ERROR] ❌ Analizador de fotogramas '{name}' falló: {str(e)}")
+                    results[name] = None
+            return results
+
+        except Exception as e:
+            print(f"Error muestreando fotogramas: {str(e)}")
+            return None
+
+        finally:
+            if os.path.exists(buffer_path):
+                os.remove(buffer_path)
+
+    def sample(self, video_path, buffer_path, duration=None):
+        """Decodifica los fotogramas muestreados en buffer_path y los expone como memmap"""
+        started = time.time()
+
+        try:
+            timestamps = self._decode_ffmpeg(video_path, buffer_path, ['-skip_frame', 'nokey'], [])
+
+            # Videos con un GOP muy largo: pocos keyframes, se muestrea por tiempo
+            if len(timestamps) < 3 and duration:
+                rate = self.max_frames / max(duration, 0.1)
+                timestamps = self._decode_ffmpeg(video_path, buffer_path, [], [f'fps={rate:.4f}'])
+            backend = 'ffmpeg'
+
+        except Exception as e:
+            if not CV2_AVAILABLE:
+                raise
+            print(f"[INFO] FFmpeg no pudo muestrear fotogramas, se usa OpenCV: {str(e)}")
+            timestamps = self._decode_opencv(video_path, buffer_path)
+            backend = 'opencv'
+
+        frames = self._open_buffer(buffer_path, len(timestamps))
+
+        # Acotar a max_frames fotogramas repartidos en todo el video
+        if len(timestamps) > self.max_frames:
+            keep = np.linspace(0, len(timestamps) - 1, self.max_frames).astype(int)
+            frames = frames[keep]
+            timestamps = [timestamps[i] for i in keep]
+
+        return FrameSet(frames, timestamps, backend, time.time() - started)
+
+    def _buffer_path(self):
+        handle, path = tempfile.mkstemp(suffix='.gray', dir=self.temp_dir)
+        os.close(handle)
+        return path
+
+    def _open_buffer(self, buffer_path, count):
+        frame_size = self.width * self.height
+        count = min(count, os.path.getsize(buffer_path) // frame_size)
+        if not count:
+            return np.zeros((0, self.height, self.width), dtype=np.uint8)
+        return np.memmap(buffer_path, dtype=np.uint8, mode='r', shape=(count, self.height, self.width))
+
+    def _decode_ffmpeg(self, video_path, buffer_path, input_options, filters):
+        video_filter = ','.join(filters + [
+            f'scale={self.width}:{self.height}',
+            'format=gray',
+            'showinfo'
+        ])
+        # -copyts: showinfo informa el pts original del archivo, sin el
+        # desplazamiento implícito que FFmpeg aplica a la entrada
+        cmd = ['ffmpeg', '-hide_banner', '-nostats', '-copyts'] + input_options + [
+            '-i', video_path,
+            '-an', '-sn',
+            '-vf', video_filter,
+            '-fps_mode', 'passthrough',
+            '-f', 'rawvideo', '-pix_fmt', 'gray',
+            '-y', buffer_path
+        ]
+
+        # Los fotogramas van directo al archivo del buffer; por el pipe solo
+        # pasa el log de showinfo
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=self.timeout)
+        stderr = result.stderr.decode('utf-8', 'replace')
+        if result.returncode != 0:
+            raise Exception(f"Error decodificando fotogramas: {stderr[-300:]}")
+
+        # showinfo informa el pts de cada fotograma, en el mismo orden que la
+        # salida. Se resta el inicio del archivo (MPEG-TS, cortes con edit
+        # list) para que sirva en -ss, que cuenta desde el inicio
+        start = START_TIME_PATTERN.search(stderr)
+        offset = float(start.group(1)) if start else 0.0
+        return [
+            max(0.0, float(match.group(1)) - offset)
+            for line in stderr.splitlines()
+            if 'Parsed_showinfo' in line
+            for match in [PTS_TIME_PATTERN.search(line)] if match
+        ]
+
+    def _decode_opencv(self, video_path, buffer_path):
+        """Una pasada secuencial: grab() en todos los fotogramas, retrieve() solo en los muestreados"""
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise Exception("No se pudo abrir el video con OpenCV")
+
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or self.max_frames
+            step = max(1, total // self.max_frames)
+
+            frames = np.memmap(buffer_path, dtype=np.uint8, mode='w+', shape=(self.max_frames, self.height, self.width))
+            timestamps = []
+            index = 0
+
+            while len(timestamps) < self.max_frames and cap.grab():
+                if index % step == 0:
+                    ok, frame = cap.retrieve()
+                    if ok:
+                        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                        frames[len(timestamps)] = cv2.resize(gray, (self.width, self.height), interpolation=cv2.INTER_AREA)
+                        timestamps.append(index / fps)
+                index += 1
+
+            frames.flush()
+            del frames
+            return timestamps
+        finally:
+            cap.release()
+
+
+frame_sampler = FrameSampler(max_frames=Config.FRAME_SAMPLE_MAX_FRAMES)
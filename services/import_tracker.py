@@ -0,0 +1,128 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ImportTracker:
+    """
+    Registro de importaciones masivas desde perfiles y hashtags de TikTok:
+    qué IDs de video ya se encolaron (para no volver a procesarlos) y un punto
+    de control por fuente con el video más reciente visto en la última
+    sincronización.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._init_db()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sources (
+                source_url TEXT PRIMARY KEY,
+                last_video_id TEXT,
+                last_synced_at REAL NOT NULL,
+                imported_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS imported (
+                video_id TEXT PRIMARY KEY,
+                source_url TEXT NOT NULL,
+                imported_at REAL NOT NULL
+            )
+        """)
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def checkpoint(self, source_url):
+        """
+        Punto de control de una fuente
+
+        Returns:
+            dict: last_video_id, last_synced_at e imported_count (None si nunca se sincronizó)
+        """
+        row = self._connection().execute(
+            'SELECT last_video_id, last_synced_at, imported_count FROM sources WHERE source_url = ?',
+            (source_url,)
+        ).fetchone()
+
+        if not row:
+            return None
+
+        return {
+            'last_video_id': row[0],
+            'last_synced_at': row[1],
+            'imported_count': row[2]
+        }
+
+    def is_imported(self, video_id):
+        row = self._connection().execute(
+            'SELECT 1 FROM imported WHERE video_id = ?', (video_id,)
+        ).fetchone()
+        return row is not None
+
+    def record(self, source_url, video_ids, checkpoint_id=None):
+        """
+        Marca los videos como importados y avanza el punto de control
+
+        Args:
+            source_url (str): Perfil o hashtag sincronizado
+            video_ids (list): IDs encolados en esta sincronización
+            checkpoint_id (str): Video más reciente visto (se conserva el anterior si es None)
+        """
+        now = time.time()
+
+        with self._transaction() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO imported (video_id, source_url, imported_at) VALUES (?, ?, ?)',
+                [(video_id, source_url, now) for video_id in video_ids]
+            )
+            conn.execute(
+                """INSERT INTO sources (source_url, last_video_id, last_synced_at, imported_count)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(source_url) DO UPDATE SET
+                       last_video_id = COALESCE(excluded.last_video_id, last_video_id),
+                       last_synced_at = excluded.last_synced_at,
+                       imported_count = imported_count + excluded.imported_count""",
+                (source_url, checkpoint_id, now, len(video_ids))
+            )
+
+    def sources(self):
+        """Fuentes sincronizadas con su punto de control"""
+        rows = self._connection().execute(
+            """SELECT source_url, last_video_id, last_synced_at, imported_count
+               FROM sources ORDER BY last_synced_at DESC"""
+        ).fetchall()
+
+        return [
+            {
+                'source_url': row[0],
+                'last_video_id': row[1],
+                'last_synced_at': row[2],
+                'imported_count': row[3]
+            }
+            for row in rows
+        ]
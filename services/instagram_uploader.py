@@ -1,10 +1,23 @@
 # services/instagram_uploader.py
 
 import os
+import time
+import random
 import requests
 import json
 from datetime import datetime
 import logging
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import Config
+from services.container_poller import ContainerStatusPoller
+from services.media_host import media_host
+from services.upload_sessions import UploadSessionStore
+
+# Modos de envío del video: 'url' (Instagram lo descarga de /media) o
+# 'resumable' (los bytes se suben directo al host de subida de Meta)
+UPLOAD_MODES = ('url', 'resumable')
 
 class InstagramUploader:
     def __init__(self):
@@ -18,8 +31,15 @@ class InstagramUploader:
         self.user_id = os.getenv('INSTAGRAM_USER_ID')
         
         # URLs para Instagram API with Instagram Login
-        self.base_url = 'https://graph.instagram.com'
+        self.base_url = Config.INSTAGRAM_GRAPH_URL.rstrip('/')
         self.graph_url = 'https://graph.facebook.com'
+        self.upload_url = Config.INSTAGRAM_UPLOAD_URL.rstrip('/')
+        
+        if Config.INSTAGRAM_UPLOAD_MODE not in UPLOAD_MODES:
+            raise Exception(f"Modo de subida de Instagram no soportado: {Config.INSTAGRAM_UPLOAD_MODE}")
+        self.upload_mode = Config.INSTAGRAM_UPLOAD_MODE
+        self.chunk_size = Config.INSTAGRAM_UPLOAD_CHUNK_SIZE
+        self.upload_sessions = UploadSessionStore(Config.UPLOAD_SESSIONS_DB)
         
         # Configuración específica para Reels
         self.reels_config = {
@@ -29,8 +49,59 @@ class InstagramUploader:
             'recommended_aspect_ratio': '9:16'
         }
         
+        # Sesión compartida por todas las subidas: reutiliza conexiones TLS
+        # (keep-alive) en vez de abrir una por cada llamada a la API
+        self.timeout = (Config.INSTAGRAM_CONNECT_TIMEOUT, Config.INSTAGRAM_READ_TIMEOUT)
+        self.session = self._create_session()
+        
+        # Las consultas de estado de los containers las agenda un poller
+        # central: ninguna subida bloquea un hilo esperando a Instagram
+        self.poller = ContainerStatusPoller(
+            initial_delay=Config.INSTAGRAM_POLL_INITIAL_DELAY,
+            max_delay=Config.INSTAGRAM_POLL_MAX_DELAY,
+            backoff=Config.INSTAGRAM_POLL_BACKOFF,
+            timeout=Config.INSTAGRAM_CONTAINER_TIMEOUT,
+            workers=Config.INSTAGRAM_POLL_WORKERS
+        )
+        
+        # La publicación es un POST bloqueante: va a su propio pool para no
+        # retener a los workers del poller mientras Instagram responde
+        self.publish_executor = ThreadPoolExecutor(
+            max_workers=max(1, Config.INSTAGRAM_PUBLISH_WORKERS),
+            thread_name_prefix='instagram-publish'
+        )
+        
         self.initialized = self._check_credentials()
         
+    def _create_session(self):
+        """Crea la sesión HTTP con pool de conexiones y política de reintentos"""
+        # Los GET (consultas de estado) se reintentan ante errores transitorios;
+        # los POST solo si la conexión no llegó a establecerse, para no crear
+        # containers ni publicar dos veces
+        retry = Retry(
+            total=Config.INSTAGRAM_HTTP_RETRIES,
+            backoff_factor=Config.INSTAGRAM_HTTP_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=Config.INSTAGRAM_HTTP_POOL_SIZE,
+            pool_maxsize=Config.INSTAGRAM_HTTP_POOL_SIZE,
+            max_retries=retry
+        )
+        
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    def _request(self, method, url, **kwargs):
+        """Petición por la sesión compartida con el timeout configurado"""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+    
     def _check_credentials(self):
         """Verifica si las credenciales están configuradas"""
         if not all([self.client_id, self.client_secret, self.access_token, self.user_id]):
@@ -38,7 +109,7 @@ class InstagramUploader:
             return False
         return True
         
-    def upload(self, video_path, description, thumbnail_path=None, custom_title=None):
+    def upload(self, video_path, description, thumbnail_path=None, custom_title=None, session_scope=None):
         """
         Sube un video a Instagram como Reel usando Instagram API with Instagram Login
         
@@ -47,10 +118,32 @@ class InstagramUploader:
             description (str): Descripción del video
             thumbnail_path (str): Ruta a la miniatura (opcional)
             custom_title (str): Título personalizado (opcional)
+            session_scope (str): Identificador estable de la subida (p. ej. el ID
+                del trabajo) para retomar la sesión resumible tras un reinicio
             
         Returns:
             dict: Información del video subido
         """
+        return self.upload_async(video_path, description, thumbnail_path, custom_title, session_scope=session_scope).result()
+    
+    def upload_async(self, video_path, description, thumbnail_path=None, custom_title=None, on_status=None, on_progress=None, session_scope=None):
+        """
+        Crea el container y devuelve sin esperar a que Instagram lo procese: el
+        poller central consulta su estado y la publicación se hace al quedar listo
+        
+        Args:
+            video_path (str): Ruta al archivo de video
+            description (str): Descripción del video
+            thumbnail_path (str): Ruta a la miniatura (opcional)
+            custom_title (str): Título personalizado (opcional)
+            on_status (callable): on_status(estado, segundos) en cada consulta (opcional)
+            on_progress (callable): Fracción enviada (0-1) por chunk, solo en modo 'resumable'
+            session_scope (str): Identificador estable de la subida (p. ej. el ID
+                del trabajo) para retomar la sesión resumible tras un reinicio
+            
+        Returns:
+            Future: se resuelve con la información del Reel publicado
+        """
         if not self.initialized:
             raise Exception("Credenciales de Instagram no configuradas")
         
@@ -68,22 +161,52 @@ class InstagramUploader:
             if file_size > self.reels_config['max_file_size']:
                 raise Exception(f"Archivo muy grande: {file_size} bytes. Máximo: {self.reels_config['max_file_size']} bytes")
             
-            # Paso 1: Subir video y crear container
-            container_result = self._create_media_container(video_path, description, custom_title)
-            container_id = container_result['id']
+            # Paso 1: Crear container y enviar el video
+            media_name = None
+            session_key = None
+            if self.upload_mode == 'resumable':
+                session_key = UploadSessionStore.file_key(video_path, session_scope)
+                container_id = self._upload_resumable(video_path, session_key, description, custom_title, on_progress)
+            else:
+                media_name, video_url = self._get_public_video_url(video_path)
+                try:
+                    container_result = self._create_media_container(video_url, description, custom_title)
+                except Exception:
+                    media_host.release(media_name)
+                    raise
+                container_id = container_result['id']
             
             print(f"[DEBUG] Container creado: {container_id}")
             
-            # Paso 2: Verificar estado del container
-            status = self._check_container_status(container_id)
-            print(f"[DEBUG] Estado del container: {status}")
-            
-            # Paso 3: Publicar el container
-            if status == 'FINISHED':
+        except Exception as e:
+            print(f"[ERROR] Error en subida a Instagram: {str(e)}")
+            raise e
+        
+        # Paso 2: El poller sigue el estado del container
+        ready = self.poller.watch(
+            container_id,
+            lambda: self._get_container_status(container_id),
+            on_status=on_status
+        )
+        
+        # Paso 3: Publicar el container cuando esté listo
+        result = Future()
+        
+        def release():
+            # Instagram ya tiene el video (o falló): el enlace y la sesión no se necesitan más
+            if media_name:
+                media_host.release(media_name)
+            if session_key:
+                self.upload_sessions.delete('instagram', session_key)
+        
+        def publish(ready_future):
+            try:
+                ready_future.result()
+                print("[DEBUG] Estado del container: FINISHED")
                 publish_result = self._publish_container(container_id)
                 
                 # Construir resultado
-                result = {
+                published = {
                     'success': True,
                     'media_id': publish_result['id'],
                     'container_id': container_id,
@@ -95,23 +218,21 @@ class InstagramUploader:
                     'api_version': 'Instagram API with Instagram Login'
                 }
                 
-                print(f"[DEBUG] Instagram Reel subido exitosamente: {result}")
-                return result
-            else:
-                raise Exception(f"Container no está listo para publicar. Estado: {status}")
-                
-        except Exception as e:
-            print(f"[ERROR] Error en subida a Instagram: {str(e)}")
-            raise e
-    
-    def _create_media_container(self, video_path, description, custom_title=None):
-        """Crea un container de media para Instagram Reels"""
-        
-        # Para videos, necesitamos subir a un hosting temporal o usar URL pública
-        # Por simplicidad, asumimos que el video ya está en una URL pública
-        # En implementación real, subirías a S3, Cloudinary, etc.
+                print(f"[DEBUG] Instagram Reel subido exitosamente: {published}")
+            except Exception as e:
+                print(f"[ERROR] Error en subida a Instagram: {str(e)}")
+                release()
+                result.set_exception(e)
+                return
+            
+            release()
+            result.set_result(published)
         
-        video_url = self._get_public_video_url(video_path)
+        ready.add_done_callback(lambda ready_future: self.publish_executor.submit(publish, ready_future))
+        return result
+    
+    def _create_media_container(self, video_url, description, custom_title=None):
+        """Crea un container de media para Instagram Reels a partir de una URL pública"""
         
         # Preparar título y descripción para Reels
         title = custom_title or self._generate_title(description)
@@ -127,7 +248,7 @@ class InstagramUploader:
             'access_token': self.access_token
         }
         
-        response = requests.post(url, data=params)
+        response = self._request('POST', url, data=params)
         
         if response.status_code == 200:
             return response.json()
@@ -135,37 +256,158 @@ class InstagramUploader:
             error_data = response.json() if response.content else {}
             raise Exception(f"Error creando container: {response.status_code} - {error_data}")
     
-    def _check_container_status(self, container_id, max_retries=30, delay=2):
-        """Verifica el estado del container hasta que esté listo"""
-        import time
-        
-        for attempt in range(max_retries):
-            url = f"{self.base_url}/{container_id}"
-            params = {
-                'fields': 'status_code',
-                'access_token': self.access_token
-            }
-            
-            response = requests.get(url, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                status = data.get('status_code')
+    def _upload_resumable(self, video_path, session_key, description, custom_title=None, on_progress=None):
+        """
+        Sube el video por el flujo resumible: crea el container con
+        upload_type=resumable y envía los bytes al host de subida en chunks.
+        La sesión se persiste para que un reinicio retome desde el último
+        byte confirmado en vez de reenviar todo.
+        
+        Returns:
+            str: ID del container
+        """
+        session = None
+        offset = 0
+        
+        saved = self.upload_sessions.get('instagram', session_key)
+        if saved:
+            session = json.loads(saved)
+            status, offset = self._get_upload_offset(session['container_id'])
+            if offset is None or status in ('ERROR', 'EXPIRED', 'PUBLISHED'):
+                self.upload_sessions.delete('instagram', session_key)
+                session = None
+            else:
+                print(f"[INFO] Reanudando subida a Instagram desde el byte {offset}")
+        
+        if session is None:
+            session = self._create_resumable_container(description, custom_title)
+            self.upload_sessions.save('instagram', session_key, json.dumps(session))
+            offset = 0
+            print(f"[DEBUG] Container resumible creado: {session['container_id']}")
+        
+        self._upload_binary(session, video_path, offset, on_progress)
+        return session['container_id']
+    
+    def _create_resumable_container(self, description, custom_title=None):
+        """Crea un container de Reels que recibirá el video por subida directa"""
+        title = custom_title or self._generate_title(description)
+        
+        url = f"{self.base_url}/{self.user_id}/media"
+        params = {
+            'media_type': 'REELS',
+            'upload_type': 'resumable',
+            'caption': self._format_description_for_reels(description, title),
+            'share_to_feed': 'true',
+            'access_token': self.access_token
+        }
+        
+        response = self._request('POST', url, data=params)
+        
+        if response.status_code != 200:
+            error_data = response.json() if response.content else {}
+            raise Exception(f"Error creando container: {response.status_code} - {error_data}")
+        
+        data = response.json()
+        return {
+            'container_id': data['id'],
+            'upload_uri': data.get('uri') or f"{self.upload_url}/{data['id']}"
+        }
+    
+    def _get_upload_offset(self, container_id):
+        """
+        Consulta cuántos bytes del video recibió Instagram
+        
+        Returns:
+            tuple: (status_code del container, bytes confirmados), (None, None) si falló
+        """
+        url = f"{self.base_url}/{container_id}"
+        params = {
+            'fields': 'status_code,video_status',
+            'access_token': self.access_token
+        }
+        
+        try:
+            response = self._request('GET', url, params=params)
+        except requests.RequestException as e:
+            print(f"[DEBUG] Error consultando la subida: {str(e)}")
+            return None, None
+        
+        if response.status_code != 200:
+            return None, None
+        
+        data = response.json()
+        uploading = (data.get('video_status') or {}).get('uploading_phase') or {}
+        return data.get('status_code'), int(uploading.get('bytes_transferred') or 0)
+    
+    def _upload_binary(self, session, video_path, offset=0, on_progress=None):
+        """Envía el archivo desde offset en chunks leídos del disco"""
+        file_size = os.path.getsize(video_path)
+        retry = 0
+        
+        with open(video_path, 'rb') as video:
+            while offset < file_size:
+                video.seek(offset)
+                chunk = video.read(self.chunk_size)
+                headers = {
+                    'Authorization': f"OAuth {self.access_token}",
+                    'offset': str(offset),
+                    'file_size': str(file_size),
+                    'Content-Type': 'application/octet-stream'
+                }
                 
-                if status == 'FINISHED':
-                    return status
-                elif status == 'ERROR':
-                    raise Exception("Error procesando el video en Instagram")
-                elif status in ['IN_PROGRESS', 'PUBLISHED']:
-                    print(f"[DEBUG] Container en progreso... ({attempt + 1}/{max_retries})")
-                    time.sleep(delay)
+                try:
+                    response = self._request('POST', session['upload_uri'], data=chunk, headers=headers)
+                except requests.RequestException as e:
+                    error = e
                 else:
-                    time.sleep(delay)
-            else:
-                print(f"[DEBUG] Error verificando estado: {response.status_code}")
+                    if response.status_code == 200:
+                        offset += len(chunk)
+                        retry = 0
+                        if on_progress:
+                            on_progress(offset / file_size)
+                        continue
+                    
+                    if response.status_code < 500 and response.status_code != 429:
+                        raise Exception(f"Error subiendo el video: {response.status_code} - {response.text[:200]}")
+                    error = f"HTTP {response.status_code}"
+                
+                retry += 1
+                if retry > Config.INSTAGRAM_UPLOAD_MAX_RETRIES:
+                    raise Exception(f"Error después de {Config.INSTAGRAM_UPLOAD_MAX_RETRIES} intentos: {error}")
+                
+                delay = random.uniform(0, min(30, 2 ** retry))
+                print(f"[INFO] Reintentando chunk de Instagram en {delay:.1f}s ({retry}/{Config.INSTAGRAM_UPLOAD_MAX_RETRIES}): {error}")
                 time.sleep(delay)
+                
+                # Parte del chunk pudo haber llegado: se retoma desde lo confirmado
+                _, confirmed = self._get_upload_offset(session['container_id'])
+                if confirmed is not None:
+                    offset = confirmed
+    
+    def _get_container_status(self, container_id):
+        """
+        Consulta una vez el estado del container
+        
+        Returns:
+            str: status_code del container, o None si la consulta falló
+        """
+        url = f"{self.base_url}/{container_id}"
+        params = {
+            'fields': 'status_code',
+            'access_token': self.access_token
+        }
+        
+        try:
+            response = self._request('GET', url, params=params)
+        except requests.RequestException as e:
+            print(f"[DEBUG] Error verificando estado: {str(e)}")
+            return None
+        
+        if response.status_code != 200:
+            print(f"[DEBUG] Error verificando estado: {response.status_code}")
+            return None
         
-        raise Exception("Timeout esperando que el container esté listo")
+        return response.json().get('status_code')
     
     def _publish_container(self, container_id):
         """Publica el container como Instagram Reel"""
@@ -176,7 +418,7 @@ class InstagramUploader:
             'access_token': self.access_token
         }
         
-        response = requests.post(url, data=params)
+        response = self._request('POST', url, data=params)
         
         if response.status_code == 200:
             return response.json()
@@ -186,18 +428,13 @@ class InstagramUploader:
     
     def _get_public_video_url(self, video_path):
         """
-        Convierte el video local a una URL pública
-        En implementación real, subirías a S3, Cloudinary, etc.
-        """
-        # IMPLEMENTACIÓN TEMPORAL - En producción, subir a cloud storage
-        # Por ahora, simulamos una URL pública
-        filename = os.path.basename(video_path)
+        Expone el video en el endpoint /media de la app con una URL firmada
+        y con vencimiento; Instagram lo descarga desde ahí
         
-        # TODO: Implementar subida real a cloud storage
-        # Opciones: AWS S3, Cloudinary, Azure Blob, etc.
-        
-        # Temporal: usar servidor local (solo para desarrollo)
-        return f"http://your-domain.com/temp-videos/{filename}"
+        Returns:
+            tuple: (nombre publicado, URL pública)
+        """
+        return media_host.publish(video_path)
     
     def _generate_title(self, description):
         """Genera un título atractivo basado en la descripción"""
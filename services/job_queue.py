@@ -0,0 +1,580 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# fcntl solo existe en POSIX: sin él los cupos por etapa son por proceso
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+class QueueFullError(Exception):
+    """La cola alcanzó su capacidad máxima (backpressure)"""
+
+    def __init__(self, depth, capacity):
+        self.depth = depth
+        self.capacity = capacity
+        super().__init__(f"Cola llena: {depth}/{capacity} trabajos pendientes")
+
+
+class JobTimeoutError(Exception):
+    """El trabajo superó el tiempo máximo permitido (TASK_TIMEOUT)"""
+
+
+class QueueHostError(Exception):
+    """La base de la cola está en uso por otro host (la cola es de un solo host)"""
+
+
+class JobContext:
+    """Contexto entregado a cada handler mientras se ejecuta un trabajo"""
+
+    def __init__(self, queue, job_id, kind, payload, attempt, max_attempts, deadline):
+        self.queue = queue
+        self.job_id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.attempt = attempt
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+
+    def remaining(self):
+        """Segundos restantes antes de alcanzar el timeout del trabajo"""
+        return self.deadline - time.time()
+
+    def check_deadline(self):
+        if self.remaining() <= 0:
+            raise JobTimeoutError(f"Trabajo {self.job_id} excedió el tiempo máximo")
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Reserva un cupo de la etapa indicada (download, transcode, upload)
+        respetando el límite de concurrencia y el timeout del trabajo
+        """
+        with self.queue.stage_slot(name, timeout=self.remaining()):
+            yield
+        self.check_deadline()
+
+
+class JobQueue:
+    """
+    Cola de trabajos persistente en SQLite con pool de workers acotado.
+
+    - Los trabajos sobreviven a reinicios: un trabajo 'running' cuyo lease
+      expiró (worker caído) vuelve a ser tomado por otro worker.
+    - Límites de concurrencia por etapa (descarga, transcodificación, subida).
+    - Backpressure: submit() lanza QueueFullError cuando la cola está llena.
+    - Respeta TASK_TIMEOUT, TASK_RETRY_COUNT y TASK_RETRY_DELAY.
+
+    Escala a varios procesos (workers de gunicorn) de un mismo host, no a
+    varios hosts: SQLite sobre un disco de red no es seguro y los cupos por
+    etapa usan flock local. La base queda reservada para el host que la usa
+    y otro host solo puede tomarla cuando el primero deja de renovar la
+    reserva (LEASE_SECONDS); si no, se lanza QueueHostError.
+    """
+
+    LEASE_SECONDS = 60
+    HEARTBEAT_INTERVAL = 20
+
+    def __init__(self, db_path, workers=2, max_queue_size=100, stage_limits=None,
+                 timeout=1800, retry_count=3, retry_delay=60, poll_interval=1.0,
+                 slot_dir=None):
+        self.db_path = db_path
+        self.workers = max(1, int(workers))
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.timeout = timeout
+        self.retry_count = retry_count
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.host = socket.gethostname()
+        self.owner = f"{self.host}:{os.getpid()}"
+
+        self.handlers = {}
+        self.stage_capacity = {
+            name: max(1, int(limit)) for name, limit in (stage_limits or {}).items()
+        }
+        self.stage_limits = {
+            name: threading.BoundedSemaphore(limit) for name, limit in self.stage_capacity.items()
+        }
+        self._stage_busy = {name: 0 for name in self.stage_capacity}
+        self._stage_lock = threading.Lock()
+
+        # Con varios workers de gunicorn en el mismo host, los cupos por etapa
+        # se comparten mediante archivos bloqueados con flock (el sistema
+        # operativo los libera si el proceso muere)
+        self.slot_dir = slot_dir if slot_dir and FCNTL_AVAILABLE else None
+        if self.slot_dir:
+            os.makedirs(self.slot_dir, exist_ok=True)
+
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._running_jobs = set()
+        self._running_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self._init_db()
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def _connection(self):
+        """Conexión SQLite por hilo (sqlite3 no comparte conexiones entre hilos)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                not_before REAL NOT NULL,
+                lease_until REAL,
+                owner TEXT,
+                started_at REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                last_error TEXT
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, not_before)')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (json_extract(payload, '$.batch_id'))")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS queue_host (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                host TEXT NOT NULL,
+                seen_at REAL NOT NULL
+            )
+        """)
+        self._claim_host()
+
+    def _claim_host(self):
+        """Reserva la base para este host (o renueva la reserva)"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT host, seen_at FROM queue_host WHERE id = 1').fetchone()
+            if row and row['host'] != self.host and row['seen_at'] >= now - self.LEASE_SECONDS:
+                raise QueueHostError(
+                    f"La cola {self.db_path} está en uso por el host {row['host']}: "
+                    f"la cola de trabajos no admite varios hosts"
+                )
+            conn.execute(
+                'INSERT OR REPLACE INTO queue_host (id, host, seen_at) VALUES (1, ?, ?)',
+                (self.host, now)
+            )
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def register(self, kind, handler, on_error=None):
+        """
+        Registra el handler de un tipo de trabajo
+
+        Args:
+            kind (str): Tipo de trabajo (ej: 'download', 'upload', 'process')
+            handler (callable): handler(ctx) que ejecuta el trabajo
+            on_error (callable): on_error(ctx, error, will_retry) opcional.
+                Sin reintento puede devolver el estado final del trabajo (ej.
+                'completed_with_errors' si parte del trabajo se hizo)
+        """
+        self.handlers[kind] = {'handler': handler, 'on_error': on_error}
+
+    def submit(self, kind, payload, job_id=None):
+        """
+        Encola un trabajo nuevo
+
+        Returns:
+            str: ID del trabajo
+
+        Raises:
+            QueueFullError: si la cola alcanzó max_queue_size
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Tipo de trabajo no registrado: {kind}")
+
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+
+        with self._transaction() as conn:
+            depth = self._pending_count(conn)
+            if depth >= self.max_queue_size:
+                raise QueueFullError(depth, self.max_queue_size)
+
+            conn.execute(
+                """INSERT INTO jobs (id, kind, payload, state, attempts, max_attempts,
+                                     not_before, created_at, updated_at)
+                   VALUES (?, ?, ?, 'queued', 0, ?, ?, ?, ?)""",
+                (job_id, kind, json.dumps(payload), self.retry_count + 1, now, now, now)
+            )
+
+        with self._wakeup:
+            self._wakeup.notify()
+
+        return job_id
+
+    def submit_many(self, kind, jobs):
+        """
+        Encola varios trabajos en una sola transacción (todos o ninguno)
+
+        Args:
+            kind (str): Tipo de trabajo
+            jobs (list): [(job_id, payload)]
+
+        Raises:
+            QueueFullError: si no hay lugar para todos los trabajos
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Tipo de trabajo no registrado: {kind}")
+
+        now = time.time()
+
+        with self._transaction() as conn:
+            depth = self._pending_count(conn)
+            if depth + len(jobs) > self.max_queue_size:
+                raise QueueFullError(depth, self.max_queue_size)
+
+            conn.executemany(
+                """INSERT INTO jobs (id, kind, payload, state, attempts, max_attempts,
+                                     not_before, created_at, updated_at)
+                   VALUES (?, ?, ?, 'queued', 0, ?, ?, ?, ?)""",
+                [
+                    (job_id, kind, json.dumps(payload), self.retry_count + 1, now, now, now)
+                    for job_id, payload in jobs
+                ]
+            )
+
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+        return [job_id for job_id, _ in jobs]
+
+    def depth(self):
+        """Cantidad de trabajos pendientes (en cola o ejecutándose)"""
+        return self._pending_count(self._connection())
+
+    def _pending_count(self, conn):
+        row = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')"
+        ).fetchone()
+        return row[0]
+
+    def get(self, job_id):
+        """Devuelve el estado persistido de un trabajo o None"""
+        row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def pending_jobs(self):
+        """Trabajos que todavía no terminaron (útil para restaurar estado tras reinicio)"""
+        rows = self._connection().execute(
+            "SELECT * FROM jobs WHERE state IN ('queued', 'running') ORDER BY created_at"
+        ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def find_jobs(self, field, value):
+        """Trabajos cuyo payload tiene field == value (ej. todos los de un lote)"""
+        if not field.isidentifier():
+            raise Exception(f"Campo de payload inválido: {field}")
+
+        # La ruta va literal en la consulta para que SQLite use idx_jobs_batch
+        rows = self._connection().execute(
+            f"SELECT * FROM jobs WHERE json_extract(payload, '$.{field}') = ? ORDER BY created_at",
+            (value,)
+        ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def stats(self):
+        """Resumen de la cola para monitoreo"""
+        rows = self._connection().execute(
+            'SELECT state, COUNT(*) FROM jobs GROUP BY state'
+        ).fetchall()
+        by_state = {row[0]: row[1] for row in rows}
+        return {
+            'workers': self.workers,
+            'max_queue_size': self.max_queue_size,
+            'depth': by_state.get('queued', 0) + by_state.get('running', 0),
+            'by_state': by_state,
+            'stages': {
+                name: {'limit': limit, 'busy': self._stage_busy[name]}
+                for name, limit in self.stage_capacity.items()
+            }
+        }
+
+    @contextmanager
+    def stage_slot(self, name, timeout=None):
+        """Reserva un cupo de concurrencia para la etapa indicada"""
+        semaphore = self.stage_limits.get(name)
+        if semaphore is None:
+            yield
+            return
+
+        if timeout is not None and timeout <= 0:
+            raise JobTimeoutError(f"Sin tiempo restante para la etapa '{name}'")
+
+        if not semaphore.acquire(timeout=timeout):
+            raise JobTimeoutError(f"Timeout esperando cupo en la etapa '{name}'")
+
+        try:
+            slot_file = self._acquire_host_slot(name, timeout) if self.slot_dir else None
+        except Exception:
+            semaphore.release()
+            raise
+
+        with self._stage_lock:
+            self._stage_busy[name] += 1
+        try:
+            yield
+        finally:
+            with self._stage_lock:
+                self._stage_busy[name] -= 1
+            if slot_file:
+                fcntl.flock(slot_file, fcntl.LOCK_UN)
+                slot_file.close()
+            semaphore.release()
+
+    def _acquire_host_slot(self, name, timeout=None):
+        """Toma uno de los cupos de la etapa compartidos por todos los procesos del host"""
+        deadline = time.time() + timeout if timeout is not None else None
+
+        while True:
+            for index in range(self.stage_capacity[name]):
+                slot_file = open(os.path.join(self.slot_dir, f"{name}.{index}.lock"), 'a')
+                try:
+                    fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return slot_file
+                except OSError:
+                    slot_file.close()
+
+            if deadline is not None and time.time() >= deadline:
+                raise JobTimeoutError(f"Timeout esperando cupo en la etapa '{name}'")
+            if self._stop_event.wait(0.2):
+                raise JobTimeoutError(f"Cola detenida esperando cupo en la etapa '{name}'")
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Inicia el pool de workers y el heartbeat de leases"""
+        if self._threads:
+            return
+
+        self._stop_event.clear()
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}')
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat')
+        heartbeat.daemon = True
+        heartbeat.start()
+        self._threads.append(heartbeat)
+
+        print(f"[INFO] Cola de trabajos iniciada: {self.workers} workers, capacidad {self.max_queue_size}")
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def _worker_loop(self):
+        while not self._stop_event.is_set():
+            job = self._claim_next()
+
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=self.poll_interval)
+                continue
+
+            self._execute(job)
+
+    def _claim_next(self):
+        """Toma atómicamente el próximo trabajo ejecutable (o con lease vencido)"""
+        now = time.time()
+
+        with self._transaction() as conn:
+            row = conn.execute(
+                """SELECT * FROM jobs
+                   WHERE (state = 'queued' AND not_before <= ?)
+                      OR (state = 'running' AND lease_until < ?)
+                   ORDER BY not_before, created_at
+                   LIMIT 1""",
+                (now, now)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            job = self._row_to_dict(row)
+
+            if job['state'] == 'running':
+                print(f"[INFO] Retomando trabajo interrumpido: {job['id']}")
+
+            if job['attempts'] >= job['max_attempts']:
+                # Un worker cayó durante el último intento permitido
+                conn.execute(
+                    """UPDATE jobs SET state = 'failed', lease_until = NULL, updated_at = ?,
+                       last_error = COALESCE(last_error, 'Reintentos agotados')
+                       WHERE id = ?""",
+                    (now, job['id'])
+                )
+                job['exhausted'] = True
+                return job
+
+            conn.execute(
+                """UPDATE jobs SET state = 'running', attempts = attempts + 1,
+                   lease_until = ?, owner = ?, started_at = ?, updated_at = ?
+                   WHERE id = ?""",
+                (now + self.LEASE_SECONDS, self.owner, now, now, job['id'])
+            )
+
+        job['attempts'] += 1
+        job['started_at'] = now
+        return job
+
+    def _execute(self, job):
+        entry = self.handlers.get(job['kind'])
+        if entry is None:
+            self._finish(job['id'], 'failed', f"Tipo de trabajo no registrado: {job['kind']}")
+            return
+
+        ctx = JobContext(
+            queue=self,
+            job_id=job['id'],
+            kind=job['kind'],
+            payload=job['payload'],
+            attempt=job['attempts'],
+            max_attempts=job['max_attempts'],
+            deadline=job['started_at'] + self.timeout
+        )
+
+        if job.get('exhausted'):
+            error = Exception(job.get('last_error') or 'Reintentos agotados')
+            print(f"[ERROR] ❌ Trabajo {job['id']} sin reintentos disponibles: {str(error)}")
+            state = self._notify_error(entry, ctx, error, False)
+            if state:
+                self._finish(job['id'], state, str(error))
+            return
+
+        with self._running_lock:
+            self._running_jobs.add(job['id'])
+
+        try:
+            entry['handler'](ctx)
+            ctx.check_deadline()
+            self._finish(job['id'], 'completed')
+
+        except Exception as e:
+            will_retry = (
+                not isinstance(e, JobTimeoutError)
+                and job['attempts'] < job['max_attempts']
+            )
+
+            if will_retry:
+                print(f"[INFO] Trabajo {job['id']} falló (intento {job['attempts']}/{job['max_attempts']}), "
+                      f"reintentando en {self.retry_delay}s: {str(e)}")
+                self._reschedule(job['id'], str(e))
+                self._notify_error(entry, ctx, e, will_retry)
+            else:
+                print(f"[ERROR] ❌ Trabajo {job['id']} falló definitivamente: {str(e)}")
+                state = self._notify_error(entry, ctx, e, will_retry)
+                self._finish(job['id'], state or 'failed', str(e))
+
+        finally:
+            with self._running_lock:
+                self._running_jobs.discard(job['id'])
+
+    def _notify_error(self, entry, ctx, error, will_retry):
+        if not entry['on_error']:
+            return None
+        try:
+            return entry['on_error'](ctx, error, will_retry)
+        except Exception as hook_error:
+            print(f"[ERROR] Error en on_error de {ctx.kind}: {str(hook_error)}")
+            return None
+
+    def _finish(self, job_id, state, error=None):
+        with self._transaction() as conn:
+            conn.execute(
+                """UPDATE jobs SET state = ?, lease_until = NULL, updated_at = ?, last_error = ?
+                   WHERE id = ?""",
+                (state, time.time(), error, job_id)
+            )
+
+    def _reschedule(self, job_id, error):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                """UPDATE jobs SET state = 'queued', lease_until = NULL, not_before = ?,
+                   updated_at = ?, last_error = ?
+                   WHERE id = ?""",
+                (now + self.retry_delay, now, error, job_id)
+            )
+
+    def _heartbeat_loop(self):
+        """Renueva la reserva del host y el lease de los trabajos en ejecución de este proceso"""
+        while not self._stop_event.wait(self.HEARTBEAT_INTERVAL):
+            try:
+                self._claim_host()
+            except Exception as e:
+                print(f"[ERROR] Error renovando la reserva de la cola: {str(e)}")
+
+            with self._running_lock:
+                running = list(self._running_jobs)
+
+            if not running:
+                continue
+
+            try:
+                lease_until = time.time() + self.LEASE_SECONDS
+                with self._transaction() as conn:
+                    conn.executemany(
+                        "UPDATE jobs SET lease_until = ? WHERE id = ? AND state = 'running'",
+                        [(lease_until, job_id) for job_id in running]
+                    )
+            except Exception as e:
+                print(f"[ERROR] Error renovando leases: {str(e)}")
+
+    def _row_to_dict(self, row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['created_at_iso'] = datetime.fromtimestamp(job['created_at']).isoformat()
+        return job
@@ -0,0 +1,119 @@
+import os
+import hmac
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+
+from config import Config
+
+
+class MediaHost:
+    """
+    Publica videos procesados en una carpeta servida por la propia app para
+    que Instagram los descargue desde una URL pública. Los archivos se
+    enlazan (hard link) en vez de copiarse, los nombres son aleatorios y cada
+    URL lleva una firma HMAC con vencimiento.
+    """
+
+    def __init__(self, media_dir, secret, base_url=None, ttl_seconds=3600):
+        self.media_dir = media_dir
+        self.secret = secret.encode('utf-8') if secret else None
+        self.base_url = (base_url or '').rstrip('/')
+        self.ttl_seconds = ttl_seconds
+        self._cleanup_lock = threading.Lock()
+        self._last_cleanup = 0
+
+        os.makedirs(self.media_dir, exist_ok=True)
+
+    def sign(self, name, expires):
+        message = f"{name}:{expires}".encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def publish(self, video_path):
+        """
+        Expone un archivo y genera su URL firmada
+
+        Args:
+            video_path (str): Video a exponer
+
+        Returns:
+            tuple: (nombre publicado, URL firmada)
+        """
+        if not self.base_url:
+            raise Exception("PUBLIC_BASE_URL no está configurada: Instagram necesita una URL pública para descargar el video")
+        if not self.secret:
+            raise Exception("MEDIA_URL_SECRET no está configurada: sin un secreto propio cualquiera podría firmar URLs de /media")
+
+        self.cleanup_expired()
+
+        # El momento de publicación va en el nombre: un hard link comparte
+        # el mtime del original y no sirve para saber cuándo expira
+        name = f"{int(time.time())}-{uuid.uuid4().hex}{os.path.splitext(video_path)[1].lower()}"
+        target = os.path.join(self.media_dir, name)
+
+        try:
+            # Mismo sistema de archivos: sin copiar un solo byte
+            os.link(video_path, target)
+        except OSError:
+            shutil.copyfile(video_path, target)
+
+        expires = int(time.time()) + self.ttl_seconds
+        url = f"{self.base_url}/media/{name}?expires={expires}&sig={self.sign(name, expires)}"
+        return name, url
+
+    def resolve(self, name, expires, signature):
+        """
+        Valida una URL firmada
+
+        Returns:
+            str: Ruta del archivo, o None si la firma es inválida, venció o
+                el archivo ya no existe
+        """
+        if not self.secret or not name or os.path.basename(name) != name or name.startswith('.'):
+            return None
+
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return None
+
+        if expires < time.time() or not hmac.compare_digest(self.sign(name, expires), signature or ''):
+            return None
+
+        path = os.path.join(self.media_dir, name)
+        return path if os.path.isfile(path) else None
+
+    def release(self, name):
+        """Retira un archivo publicado (tras publicar o fallar la subida)"""
+        try:
+            os.remove(os.path.join(self.media_dir, os.path.basename(name)))
+        except FileNotFoundError:
+            pass
+
+    def cleanup_expired(self):
+        """Borra los archivos cuyo enlace ya venció (como máximo una vez por minuto)"""
+        now = time.time()
+        with self._cleanup_lock:
+            if now - self._last_cleanup < 60:
+                return
+            self._last_cleanup = now
+
+        for entry in os.scandir(self.media_dir):
+            published = entry.name.split('-', 1)[0]
+            if not published.isdigit() or now - int(published) <= self.ttl_seconds:
+                continue
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+
+
+# Instancia compartida por el uploader de Instagram y la ruta /media
+media_host = MediaHost(
+    Config.MEDIA_DIR,
+    Config.MEDIA_URL_SECRET,
+    base_url=Config.PUBLIC_BASE_URL,
+    ttl_seconds=Config.MEDIA_URL_TTL
+)
@@ -1,27 +1,181 @@
 import os
 import json
 import re
+from collections import deque
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
 import hashlib
 
+from config import Config
+from services.thumbnail_renderer import thumbnail_renderer
+
+# Patrones compilados una sola vez para todo el proceso
+TIKTOK_URL_PATTERN = re.compile(r'https?://(?:www\.)?tiktok\.com/\S+')
+MENTION_PATTERN = re.compile(r'@[\w.]+')
+HASHTAG_PATTERN = re.compile(r'#\w+')
+WORD_PATTERN = re.compile(r'\b\w+\b')
+
+# Equivalencias de hashtags de TikTok para otras plataformas
+HASHTAG_MAPPING = {
+    '#fyp': ['#viral', '#trending'],
+    '#foryou': ['#parati', '#viral'],
+    '#foryoupage': ['#explore', '#trending'],
+    '#tiktokviral': ['#viral', '#trending'],
+    '#viralvideo': ['#viral'],
+    '#trending': ['#trending', '#viral'],
+    '#parati': ['#parati', '#fyp'],
+    '#viral': ['#viral', '#trending']
+}
+
+# Palabra clave -> emoji (el orden define el orden de inserción)
+EMOJI_PATTERNS = {
+    'fire': '🔥',
+    'heart': '❤️',
+    'laugh': '😂',
+    'wow': '😱',
+    'think': '🤔',
+    'music': '🎵',
+    'dance': '💃',
+    'fun': '🤩'
+}
+
+# Palabras clave cuyo emoji va al inicio de la descripción (el resto al final)
+EMOJI_PREFIX_KEYWORDS = ('fire', 'wow')
+
+
+class KeywordMatcher:
+    """
+    Busca muchas palabras clave en un texto con una sola pasada (autómata
+    Aho-Corasick: trie con enlaces de fallo). El autómata se construye una
+    vez; buscar cuesta lo mismo con 10 que con 10.000 palabras clave.
+
+    Con pocas palabras clave, `in` de Python (implementado en C) es más
+    rápido que recorrer el autómata carácter a carácter, así que por debajo
+    de SCAN_THRESHOLD se usa directamente.
+    """
+
+    # Medido con descripciones de 100 a 900 caracteres: con las 8 palabras
+    # por defecto `in` es ~10 veces más rápido y el autómata recién gana
+    # entre 192 y 256 palabras clave
+    SCAN_THRESHOLD = 192
+
+    def __init__(self, keywords):
+        self.keywords = [keyword for keyword in dict.fromkeys(keywords) if keyword]
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+
+        if len(self.keywords) > self.SCAN_THRESHOLD:
+            self._build()
+
+    def _build(self):
+        goto, fail, output = self._goto, self._fail, self._output
+
+        # Trie de las palabras clave
+        for keyword in self.keywords:
+            node = 0
+            for char in keyword:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    fail.append(0)
+                    output.append(())
+                node = next_node
+            output[node] += (keyword,)
+
+        # Enlaces de fallo por niveles (BFS): el sufijo propio más largo que
+        # también es prefijo en el trie
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, next_node in goto[node].items():
+                queue.append(next_node)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[next_node] = goto[state].get(char, 0)
+                output[next_node] += output[fail[next_node]]
+
+    def find(self, text):
+        """
+        Palabras clave que aparecen en el texto (como subcadena)
+
+        Args:
+            text (str): Texto donde buscar
+
+        Returns:
+            set: Palabras clave encontradas
+        """
+        if len(self.keywords) <= self.SCAN_THRESHOLD:
+            return {keyword for keyword in self.keywords if keyword in text}
+
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+
+        return found
+
+
+def load_metadata_mapping(path):
+    """
+    Carga el archivo de equivalencias de metadatos (JSON)
+
+    Args:
+        path (str): Ruta al archivo; vacío para usar solo los valores por defecto
+
+    Returns:
+        tuple: (hashtag_mapping, emoji_patterns)
+    """
+    hashtag_mapping = dict(HASHTAG_MAPPING)
+    emoji_patterns = dict(EMOJI_PATTERNS)
+
+    if not path:
+        return hashtag_mapping, emoji_patterns
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        for hashtag, equivalents in data.get('hashtag_mapping', {}).items():
+            hashtag = hashtag.lower()
+            if not hashtag.startswith('#'):
+                hashtag = f"#{hashtag}"
+            hashtag_mapping[hashtag] = list(equivalents)
+
+        for keyword, emoji in data.get('emoji_patterns', {}).items():
+            emoji_patterns[keyword.lower()] = emoji
+
+        print(f"[INFO] Equivalencias de metadatos cargadas desde {path}: "
+              f"{len(hashtag_mapping)} hashtags, {len(emoji_patterns)} palabras clave")
+
+    except Exception as e:
+        print(f"Warning: No se pudo cargar {path}, se usan las equivalencias por defecto: {str(e)}")
+        return dict(HASHTAG_MAPPING), dict(EMOJI_PATTERNS)
+
+    return hashtag_mapping, emoji_patterns
+
+
 class MetadataProcessor:
-    def __init__(self):
+    def __init__(self, mapping_file=None):
         self.default_hashtags = {
             'youtube': ['#Shorts', '#YouTubeShorts', '#Viral', '#Trending'],
             'instagram': ['#reels', '#instagram', '#viral', '#fyp', '#parati']
         }
         
-        self.emoji_patterns = {
-            'fire': '🔥',
-            'heart': '❤️',
-            'laugh': '😂',
-            'wow': '😱',
-            'think': '🤔',
-            'music': '🎵',
-            'dance': '💃',
-            'fun': '🤩'
-        }
+        # Equivalencias cargadas una sola vez: el autómata de palabras clave
+        # se reutiliza en todas las descripciones
+        self.hashtag_mapping, self.emoji_patterns = load_metadata_mapping(
+            mapping_file if mapping_file is not None else Config.METADATA_MAPPING_FILE
+        )
+        self.keyword_matcher = KeywordMatcher(self.emoji_patterns)
     
     def process_description(self, original_description, platform='both', custom_hashtags=None):
         """
@@ -70,60 +224,75 @@ class MetadataProcessor:
                 'instagram': original_description
             }
     
+    def process_descriptions(self, descriptions, platform='both', custom_hashtags=None):
+        """
+        Procesa un lote de descripciones (p. ej. al regenerar un catálogo)
+        
+        Las descripciones repetidas dentro del lote se procesan una sola vez.
+        
+        Args:
+            descriptions (list): Descripciones originales
+            platform (str): 'youtube', 'instagram' o 'both'
+            custom_hashtags (list): Hashtags personalizados para todo el lote
+            
+        Returns:
+            list: Un dict por descripción, en el mismo orden de entrada
+        """
+        processed = {}
+        results = []
+        
+        for description in descriptions:
+            result = processed.get(description)
+            if result is None:
+                result = processed[description] = self.process_description(description, platform, custom_hashtags)
+            results.append(dict(result))
+        
+        return results
+    
     def clean_description(self, description):
         """Limpia la descripción eliminando elementos no deseados"""
         if not description:
             return ""
         
         # Eliminar URLs de TikTok
-        description = re.sub(r'https?://(?:www\.)?tiktok\.com/\S+', '', description)
+        if 'tiktok.com' in description:
+            description = TIKTOK_URL_PATTERN.sub('', description)
         
         # Eliminar menciones de usuarios específicas de TikTok
-        description = re.sub(r'@[\w.]+', '', description)
-        
-        # Limpiar espacios múltiples
-        description = re.sub(r'\s+', ' ', description).strip()
+        if '@' in description:
+            description = MENTION_PATTERN.sub('', description)
         
-        return description
+        # Limpiar espacios múltiples (split() usa los mismos espacios que \s)
+        return ' '.join(description.split())
     
     def convert_tiktok_hashtags(self, description):
         """Convierte hashtags de TikTok a equivalentes para otras plataformas"""
-        hashtag_mapping = {
-            '#fyp': ['#viral', '#trending'],
-            '#foryou': ['#parati', '#viral'],
-            '#foryoupage': ['#explore', '#trending'],
-            '#tiktokviral': ['#viral', '#trending'],
-            '#viralvideo': ['#viral'],
-            '#trending': ['#trending', '#viral'],
-            '#parati': ['#parati', '#fyp'],
-            '#viral': ['#viral', '#trending']
-        }
+        if '#' not in description:
+            return []
         
         converted = []
         
         # Extraer hashtags existentes
-        existing_hashtags = re.findall(r'#\w+', description.lower())
+        for hashtag in HASHTAG_PATTERN.findall(description.lower()):
+            converted.extend(self.hashtag_mapping.get(hashtag, (hashtag,)))
         
-        for hashtag in existing_hashtags:
-            if hashtag in hashtag_mapping:
-                converted.extend(hashtag_mapping[hashtag])
-            else:
-                converted.append(hashtag)
-        
-        return list(set(converted))  # Eliminar duplicados
+        # Eliminar duplicados conservando el orden de aparición
+        return list(dict.fromkeys(converted))
     
     def enhance_with_emojis(self, description):
         """Agrega emojis relevantes basados en el contenido"""
         if not description:
             return description
         
-        description_lower = description.lower()
+        found = self.keyword_matcher.find(description.lower())
+        if not found:
+            return description
         
         # Detectar palabras clave y agregar emojis
         for keyword, emoji in self.emoji_patterns.items():
-            if keyword in description_lower and emoji not in description:
+            if keyword in found and emoji not in description:
                 # Agregar emoji al inicio si es relevante
-                if keyword in ['fire', 'wow']:
+                if keyword in EMOJI_PREFIX_KEYWORDS:
                     description = f"{emoji} {description}"
                 # Agregar emoji al final para otros casos
                 else:
@@ -143,8 +312,8 @@ class MetadataProcessor:
         if custom_hashtags:
             youtube_hashtags.extend(custom_hashtags)
         
-        # Eliminar duplicados y limitar cantidad
-        youtube_hashtags = list(set(youtube_hashtags))[:15]
+        # Eliminar duplicados (conservando el orden) y limitar cantidad
+        youtube_hashtags = list(dict.fromkeys(youtube_hashtags))[:15]
         
         # Construir descripción
         formatted = description
@@ -179,8 +348,8 @@ class MetadataProcessor:
         if custom_hashtags:
             instagram_hashtags.extend(custom_hashtags)
         
-        # Eliminar duplicados y limitar cantidad
-        instagram_hashtags = list(set(instagram_hashtags))[:30]
+        # Eliminar duplicados (conservando el orden) y limitar cantidad
+        instagram_hashtags = list(dict.fromkeys(instagram_hashtags))[:30]
         
         # Construir descripción
         formatted = description
@@ -215,7 +384,7 @@ class MetadataProcessor:
         }
         
         # Extraer palabras
-        words = re.findall(r'\b\w+\b', description.lower())
+        words = WORD_PATTERN.findall(description.lower())
         
         # Filtrar palabras relevantes
         keywords = [word for word in words if len(word) > 3 and word not in stop_words]
@@ -252,25 +421,35 @@ class MetadataProcessor:
         return alternatives[:count]
     
     def process_thumbnail(self, thumbnail_path, platform='both'):
-        """Procesa miniatura para optimizarla según la plataforma"""
+        """
+        Genera la miniatura de cada plataforma (recorte a su proporción y
+        límite de bytes) a partir de una sola decodificación, en el pool de
+        procesos de miniaturas
+        
+        Args:
+            thumbnail_path (str): Miniatura original
+            platform (str|list): 'youtube', 'instagram', 'both' o lista de plataformas
+            
+        Returns:
+            dict: Ruta por plataforma, más 'variants' (tamaño, bytes, calidad)
+                y 'timing' (ms); None si no se pudo generar
+        """
         if not thumbnail_path or not os.path.exists(thumbnail_path):
             return None
         
+        if platform == 'both':
+            platforms = ['youtube', 'instagram']
+        elif isinstance(platform, str):
+            platforms = [platform]
+        else:
+            platforms = list(platform)
+        
         try:
-            # Abrir imagen
-            img = Image.open(thumbnail_path)
-            
-            result = {}
-            
-            if platform in ['youtube', 'both']:
-                # YouTube prefiere 16:9 pero acepta 9:16 para Shorts
-                youtube_thumb = self.optimize_thumbnail_for_youtube(img)
-                result['youtube'] = youtube_thumb
+            rendered = thumbnail_renderer.render(thumbnail_path, platforms)
             
-            if platform in ['instagram', 'both']:
-                # Instagram Reels prefiere 9:16
-                instagram_thumb = self.optimize_thumbnail_for_instagram(img)
-                result['instagram'] = instagram_thumb
+            result = {name: variant['path'] for name, variant in rendered['variants'].items()}
+            result['variants'] = rendered['variants']
+            result['timing'] = rendered['timing']
             
             return result
             
@@ -278,34 +457,6 @@ class MetadataProcessor:
             print(f"Error procesando miniatura: {str(e)}")
             return None
     
-    def optimize_thumbnail_for_youtube(self, img):
-        """Optimiza miniatura para YouTube"""
-        # YouTube Shorts: 1080x1920 (9:16) o 1280x720 (16:9)
-        target_size = (1080, 1920)  # Para Shorts verticales
-        
-        # Redimensionar manteniendo proporción
-        img_resized = img.resize(target_size, Image.Resampling.LANCZOS)
-        
-        # Guardar versión optimizada
-        output_path = thumbnail_path.replace('.jpg', '_youtube.jpg')
-        img_resized.save(output_path, 'JPEG', quality=95)
-        
-        return output_path
-    
-    def optimize_thumbnail_for_instagram(self, img):
-        """Optimiza miniatura para Instagram"""
-        # Instagram Reels: 1080x1920 (9:16)
-        target_size = (1080, 1920)
-        
-        # Redimensionar manteniendo proporción
-        img_resized = img.resize(target_size, Image.Resampling.LANCZOS)
-        
-        # Guardar versión optimizada
-        output_path = thumbnail_path.replace('.jpg', '_instagram.jpg')
-        img_resized.save(output_path, 'JPEG', quality=95)
-        
-        return output_path
-    
     def create_metadata_report(self, original_description, processed_descriptions, video_info=None):
         """Crea un reporte detallado del procesamiento de metadatos"""
         report = {
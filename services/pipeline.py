@@ -0,0 +1,336 @@
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class BranchError(Exception):
+    """Una o más ramas paralelas fallaron (las demás terminaron igualmente)"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        detail = '; '.join(f"{name}: {str(error)}" for name, error in errors.items())
+        super().__init__(f"Fallaron {len(errors)} etapa(s) paralelas: {detail}")
+
+
+class ItemCancelledError(Exception):
+    """El item se canceló (ej. su trabajo venció) antes de llegar a una etapa"""
+
+
+class PipelineItem:
+    """Unidad de trabajo que avanza por las etapas del pipeline"""
+
+    def __init__(self, job_id, data, route, deadline=None):
+        self.job_id = job_id
+        self.data = data
+        self.route = route
+        self.position = 0
+        self.deadline = deadline
+        self.future = Future()
+        self.enqueued_at = {}
+        self.pending_branches = 0
+        self.branch_errors = {}
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    @property
+    def current_stages(self):
+        """Etapas del paso actual (más de una si es un grupo paralelo)"""
+        if self.position >= len(self.route):
+            return []
+        step = self.route[self.position]
+        return list(step) if isinstance(step, (list, tuple)) else [step]
+
+    @property
+    def is_parallel_step(self):
+        return self.position < len(self.route) and isinstance(self.route[self.position], (list, tuple))
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+
+class StageMetrics:
+    """Contadores de throughput y latencia de una etapa"""
+
+    WINDOW_SECONDS = 300
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_wait = 0.0
+        self._completions = deque()
+
+    def started(self, wait):
+        with self._lock:
+            self.in_flight += 1
+            self.total_wait += wait
+
+    def finished(self, latency, success):
+        now = time.time()
+        with self._lock:
+            self.in_flight -= 1
+            if success:
+                self.processed += 1
+            else:
+                self.failed += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self._completions.append(now)
+            while self._completions and self._completions[0] < now - self.WINDOW_SECONDS:
+                self._completions.popleft()
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            while self._completions and self._completions[0] < now - self.WINDOW_SECONDS:
+                self._completions.popleft()
+            total = self.processed + self.failed
+            return {
+                'processed': self.processed,
+                'failed': self.failed,
+                'in_flight': self.in_flight,
+                'avg_latency': round(self.total_latency / total, 3) if total else 0,
+                'max_latency': round(self.max_latency, 3),
+                'avg_queue_wait': round(self.total_wait / total, 3) if total else 0,
+                'throughput_per_min': round(len(self._completions) * 60 / self.WINDOW_SECONDS, 2)
+            }
+
+
+class Stage:
+    """Etapa del pipeline con su propio pool de workers y cola de entrada acotada"""
+
+    def __init__(self, name, handler, workers=1, queue_size=4, slot=None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.slot = slot
+        self.inbox = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.metrics = StageMetrics()
+
+
+class Pipeline:
+    """
+    Motor de ejecución por etapas: cada etapa (descarga, análisis,
+    transcodificación, miniatura, subida por plataforma) tiene su propio
+    executor y una cola de traspaso acotada, de modo que mientras el trabajo N
+    se transcodifica el N+1 ya se descarga y el N-1 se sube.
+
+    Las colas acotadas aplican backpressure: si una etapa está saturada, la
+    anterior se bloquea al entregarle trabajo en lugar de acumular memoria.
+    """
+
+    def __init__(self, limiter=None):
+        self.limiter = limiter
+        self.stages = {}
+        self.order = []
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._items = {}
+        self._items_lock = threading.Lock()
+
+    def add_stage(self, name, handler, workers=1, queue_size=4, slot=None):
+        """
+        Registra una etapa
+
+        Args:
+            name (str): Nombre de la etapa
+            handler (callable): handler(item) que procesa el item in-place. Si
+                devuelve un Future, el hilo (y el cupo) de la etapa se libera
+                y la etapa termina cuando el Future se resuelve
+            workers (int): Hilos dedicados a la etapa
+            queue_size (int): Capacidad de la cola de entrada
+            slot (str): Cupo de concurrencia del limitador compartido (opcional)
+        """
+        self.stages[name] = Stage(name, handler, workers, queue_size, slot)
+        self.order.append(name)
+
+    def submit(self, job_id, data, route=None, deadline=None):
+        """
+        Ingresa un item al pipeline
+
+        Args:
+            job_id (str): ID del trabajo
+            data (dict): Datos compartidos entre etapas
+            route (list): Etapas a recorrer; una lista anidada es un grupo
+                de etapas que se ejecutan en paralelo (fan-out / join)
+            deadline (float): Timestamp límite para el item (opcional)
+
+        Returns:
+            Future: se resuelve con item.data al completar todas sus etapas.
+                Si falla alguna rama paralela se resuelve con BranchError
+                una vez que terminaron todas las ramas del grupo.
+        """
+        route = self._normalize_route(route or self.order)
+        item = PipelineItem(job_id, data, route, deadline)
+
+        if not route:
+            item.future.set_result(item.data)
+            return item.future
+
+        with self._items_lock:
+            self._items[item.future] = item
+        item.future.add_done_callback(self._forget)
+
+        self._dispatch(item)
+        return item.future
+
+    def cancel(self, future):
+        """
+        Cancela el item de un Future devuelto por submit(): las etapas que no
+        empezaron fallan con ItemCancelledError; las que están en curso
+        terminan igual (una subida a medias no se puede interrumpir)
+
+        Returns:
+            bool: True si el item seguía en el pipeline
+        """
+        with self._items_lock:
+            item = self._items.get(future)
+        if item is None:
+            return False
+        item.cancelled = True
+        return True
+
+    def _forget(self, future):
+        with self._items_lock:
+            self._items.pop(future, None)
+
+    def start(self):
+        if self._threads:
+            return
+
+        self._stop_event.clear()
+
+        for stage in self.stages.values():
+            for i in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._stage_loop,
+                    args=(stage,),
+                    name=f'pipeline-{stage.name}-{i}'
+                )
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+        summary = ', '.join(f"{name}={self.stages[name].workers}" for name in self.order)
+        print(f"[INFO] Pipeline iniciado: {summary}")
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def stats(self):
+        """Métricas por etapa para dimensionar cada pool"""
+        return {
+            name: dict(
+                self.stages[name].metrics.snapshot(),
+                workers=self.stages[name].workers,
+                queue_depth=self.stages[name].inbox.qsize(),
+                queue_size=self.stages[name].inbox.maxsize
+            )
+            for name in self.order
+        }
+
+    def _normalize_route(self, route):
+        normalized = []
+        for step in route:
+            if isinstance(step, (list, tuple)):
+                group = [name for name in step if name in self.stages]
+                if len(group) > 1:
+                    normalized.append(group)
+                elif group:
+                    normalized.append(group[0])
+            elif step in self.stages:
+                normalized.append(step)
+        return normalized
+
+    def _dispatch(self, item):
+        """Entrega el item a su(s) etapa(s) actual(es) (bloquea si la cola está llena)"""
+        stage_names = item.current_stages
+        item.pending_branches = len(stage_names)
+        item.branch_errors = {}
+
+        for name in stage_names:
+            item.enqueued_at[name] = time.time()
+            self.stages[name].inbox.put(item)
+
+    def _stage_loop(self, stage):
+        while not self._stop_event.is_set():
+            try:
+                item = stage.inbox.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            self._run_stage(stage, item)
+
+    def _run_stage(self, stage, item):
+        started = time.time()
+        stage.metrics.started(started - item.enqueued_at.get(stage.name, started))
+        pending = None
+
+        try:
+            if item.cancelled:
+                raise ItemCancelledError(f"Item cancelado antes de la etapa '{stage.name}'")
+
+            remaining = item.remaining()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f"Tiempo agotado antes de la etapa '{stage.name}'")
+
+            if stage.slot and self.limiter is not None:
+                with self.limiter.stage_slot(stage.slot, timeout=remaining):
+                    pending = stage.handler(item)
+            else:
+                pending = stage.handler(item)
+
+        except Exception as e:
+            self._stage_finished(stage, item, started, e)
+            return
+
+        if isinstance(pending, Future):
+            # Espera externa (ej. la plataforma procesando el video): la etapa
+            # se completa desde el callback sin ocupar un worker
+            pending.add_done_callback(
+                lambda future: self._stage_finished(stage, item, started, future.exception())
+            )
+        else:
+            self._stage_finished(stage, item, started, None)
+
+    def _stage_finished(self, stage, item, started, error):
+        stage.metrics.finished(time.time() - started, error is None)
+
+        if item.is_parallel_step:
+            self._branch_finished(stage, item, error)
+        elif error is not None:
+            item.future.set_exception(error)
+        else:
+            self._advance(item)
+
+    def _branch_finished(self, stage, item, error):
+        """Join de un grupo paralelo: avanza cuando terminaron todas las ramas"""
+        with item._lock:
+            if error is not None:
+                item.branch_errors[stage.name] = error
+            item.pending_branches -= 1
+            if item.pending_branches > 0:
+                return
+
+        if item.branch_errors:
+            item.future.set_exception(BranchError(dict(item.branch_errors)))
+        else:
+            self._advance(item)
+
+    def _advance(self, item):
+        item.position += 1
+
+        if not item.current_stages:
+            item.future.set_result(item.data)
+        else:
+            self._dispatch(item)
@@ -0,0 +1,208 @@
+import os
+import json
+import subprocess
+import threading
+from collections import OrderedDict
+
+# OpenCV es opcional: solo se usa si ffprobe no está disponible
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+
+class VideoInfo(dict):
+    """
+    Información técnica normalizada de un video. Es un dict (serializable a
+    JSON y compatible con el código existente) con siempre las mismas claves.
+    """
+
+    FIELDS = (
+        'duration', 'width', 'height', 'fps', 'bitrate', 'codec',
+        'has_audio', 'audio_codec', 'file_size', 'aspect_ratio'
+    )
+
+    @classmethod
+    def default(cls):
+        """Información por defecto en caso de error"""
+        return cls(
+            duration=0,
+            width=1080,
+            height=1920,
+            fps=30,
+            bitrate=0,
+            codec='unknown',
+            has_audio=True,
+            audio_codec='unknown',
+            file_size=0,
+            aspect_ratio=9/16
+        )
+
+    @classmethod
+    def from_ffprobe(cls, data):
+        """Construye la información a partir de la salida JSON de ffprobe"""
+        video_stream = None
+        audio_stream = None
+
+        for stream in data.get('streams', []):
+            if stream.get('codec_type') == 'video' and not video_stream:
+                video_stream = stream
+            elif stream.get('codec_type') == 'audio' and not audio_stream:
+                audio_stream = stream
+
+        format_info = data.get('format', {})
+        width = int(video_stream.get('width', 0)) if video_stream else 0
+        height = int(video_stream.get('height', 0)) if video_stream else 0
+
+        return cls(
+            duration=float(format_info.get('duration', 0)),
+            width=width,
+            height=height,
+            fps=parse_fps(video_stream.get('r_frame_rate', '30/1')) if video_stream else 30,
+            bitrate=int(format_info.get('bit_rate', 0)),
+            codec=video_stream.get('codec_name', 'unknown') if video_stream else 'unknown',
+            has_audio=audio_stream is not None,
+            audio_codec=audio_stream.get('codec_name', 'none') if audio_stream else 'none',
+            file_size=int(format_info.get('size', 0)),
+            aspect_ratio=calculate_aspect_ratio(width, height)
+        )
+
+
+def parse_fps(fps_string):
+    """Parsea string de FPS (ej: '30/1') a número"""
+    try:
+        if '/' in fps_string:
+            numerator, denominator = fps_string.split('/')
+            return float(numerator) / float(denominator)
+        return float(fps_string)
+    except:
+        return 30.0  # Default
+
+
+def calculate_aspect_ratio(width, height):
+    """Calcula la proporción de aspecto"""
+    if height == 0:
+        return 0
+    return width / height
+
+
+class VideoProbe:
+    """
+    Servicio de análisis de videos compartido por el descargador y el
+    procesador. Cada archivo se analiza con ffprobe una sola vez: el resultado
+    queda en una cache en memoria con clave (ruta, tamaño, mtime), de modo que
+    un archivo modificado se vuelve a analizar.
+    """
+
+    MAX_ENTRIES = 256
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def probe(self, video_path):
+        """
+        Obtiene la información técnica del video
+
+        Args:
+            video_path (str): Ruta al video
+
+        Returns:
+            VideoInfo: Copia de la información (se puede modificar libremente)
+        """
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return self.analyze(video_path)
+
+        key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            info = self._cache.get(key)
+            if info is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return VideoInfo(info)
+            self.misses += 1
+
+        info = self.analyze(video_path)
+
+        with self._lock:
+            self._cache[key] = info
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        return VideoInfo(info)
+
+    def analyze(self, video_path):
+        """Analiza el video con ffprobe (sin cache), con OpenCV como fallback"""
+        try:
+            cmd = [
+                'ffprobe', '-v', 'quiet', '-print_format', 'json',
+                '-show_format', '-show_streams', video_path
+            ]
+
+            result = subprocess.run(cmd, capture_output=True, text=True)
+
+            if result.returncode != 0:
+                return self.analyze_with_opencv(video_path)
+
+            return VideoInfo.from_ffprobe(json.loads(result.stdout))
+
+        except Exception as e:
+            print(f"Error analizando video con ffprobe: {str(e)}")
+            return self.analyze_with_opencv(video_path)
+
+    def analyze_with_opencv(self, video_path):
+        """Analizar video usando OpenCV como fallback"""
+        try:
+            if not CV2_AVAILABLE:
+                raise Exception("OpenCV no está disponible")
+
+            cap = cv2.VideoCapture(video_path)
+
+            if not cap.isOpened():
+                raise Exception("No se pudo abrir el video con OpenCV")
+
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            duration = frame_count / fps if fps > 0 else 0
+
+            cap.release()
+
+            return VideoInfo(
+                duration=duration,
+                width=width,
+                height=height,
+                fps=fps,
+                bitrate=0,  # No disponible con OpenCV
+                codec='unknown',
+                has_audio=True,  # Asumimos que tiene audio
+                audio_codec='unknown',
+                file_size=os.path.getsize(video_path),
+                aspect_ratio=calculate_aspect_ratio(width, height)
+            )
+
+        except Exception as e:
+            print(f"Error analizando video con OpenCV: {str(e)}")
+            return VideoInfo.default()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'entries': len(self._cache)
+            }
+
+
+# Instancia compartida por todos los servicios del proceso
+video_probe = VideoProbe()
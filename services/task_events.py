@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import threading
+
+from config import Config
+
+# Redis es opcional: solo se necesita con TASK_STORE_BACKEND=redis
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class Subscription:
+    """Suscriptor de eventos de tareas (una conexión SSE)"""
+
+    def __init__(self, task_ids=None, queue_size=256):
+        self.task_ids = set(task_ids) if task_ids else None
+        self.events = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def matches(self, task_id):
+        return self.task_ids is None or task_id in self.task_ids
+
+    def get(self, timeout=None):
+        """
+        Espera el próximo evento
+
+        Returns:
+            tuple: (tipo, task_id, datos JSON), ('resync', None, None) si se
+                perdieron eventos por lentitud del cliente, o None al vencer
+                el timeout
+        """
+        if self.overflowed:
+            # Los eventos pendientes quedan cubiertos por el snapshot de la resincronización
+            self.overflowed = False
+            while not self.events.empty():
+                try:
+                    self.events.get_nowait()
+                except queue.Empty:
+                    break
+            return ('resync', None, None)
+
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class TaskEventBroker:
+    """
+    Difunde los cambios de estado de las tareas a los suscriptores. Cada
+    evento se serializa una sola vez y se reparte sin bloquear: si la cola de
+    un cliente lento se llena, el cliente recibe una resincronización en vez
+    de frenar a los workers que publican.
+
+    Con un bridge los eventos también se reenvían a los demás procesos
+    (workers de gunicorn u otros hosts), cuyos clientes SSE los reciben igual.
+    """
+
+    def __init__(self, queue_size=256, bridge=None):
+        self.queue_size = queue_size
+        self.published = 0
+        self.origin = uuid.uuid4().hex
+        self.bridge = bridge
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Empieza a recibir los eventos del bridge (una sola vez por proceso)"""
+        with self._lock:
+            if self._started or not self.bridge:
+                return
+            self._started = True
+        self.bridge.start(self._receive)
+
+    def subscribe(self, task_ids=None):
+        subscription = Subscription(task_ids, self.queue_size)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def publish(self, task_id, data, event='update'):
+        """
+        Publica un evento de una tarea
+
+        Args:
+            task_id (str): ID de la tarea
+            data (dict): Claves modificadas ('update') o estado completo ('snapshot')
+            event (str): Tipo de evento
+        """
+        with self._lock:
+            self.published += 1
+
+        message = (event, task_id, json.dumps(dict(data, task_id=task_id), default=str))
+        self._deliver(message)
+
+        if self.bridge:
+            self.bridge.send(self.origin, message)
+
+    def _receive(self, origin, message):
+        """Evento recibido de otro proceso a través del bridge"""
+        if origin != self.origin:
+            self._deliver(message)
+
+    def _deliver(self, message):
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s.matches(message[1])]
+
+        for subscription in subscribers:
+            try:
+                subscription.events.put_nowait(message)
+            except queue.Full:
+                subscription.overflowed = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'bridge': self.bridge.name if self.bridge else None
+            }
+
+
+class SQLiteEventBridge:
+    """
+    Reenvía eventos entre los procesos de un mismo host mediante una tabla
+    SQLite que cada proceso consulta periódicamente
+    """
+
+    name = 'sqlite'
+    RETENTION_SECONDS = 60
+
+    def __init__(self, db_path, poll_interval=0.5):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection().execute("""
+            CREATE TABLE IF NOT EXISTS task_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                origin TEXT NOT NULL,
+                event TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def send(self, origin, message):
+        event, task_id, data = message
+        self._connection().execute(
+            'INSERT INTO task_events (origin, event, task_id, data, created_at) VALUES (?, ?, ?, ?, ?)',
+            (origin, event, task_id, data, time.time())
+        )
+
+    def start(self, receive):
+        thread = threading.Thread(target=self._poll_loop, args=(receive,), name='task-events-bridge')
+        thread.daemon = True
+        thread.start()
+
+    def _poll_loop(self, receive):
+        conn = self._connection()
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM task_events').fetchone()[0]
+        last_prune = time.time()
+
+        while True:
+            try:
+                rows = conn.execute(
+                    'SELECT id, origin, event, task_id, data FROM task_events WHERE id > ? ORDER BY id',
+                    (last_id,)
+                ).fetchall()
+                for row_id, origin, event, task_id, data in rows:
+                    last_id = row_id
+                    receive(origin, (event, task_id, data))
+
+                if time.time() - last_prune > self.RETENTION_SECONDS:
+                    conn.execute(
+                        'DELETE FROM task_events WHERE created_at < ?',
+                        (time.time() - self.RETENTION_SECONDS,)
+                    )
+                    last_prune = time.time()
+            except Exception as e:
+                print(f"[ERROR] ❌ Error leyendo eventos de otros workers: {str(e)}")
+
+            time.sleep(self.poll_interval)
+
+
+class RedisEventBridge:
+    """Reenvía eventos entre procesos y hosts con pub/sub de Redis"""
+
+    name = 'redis'
+    CHANNEL = 'task-events'
+
+    def __init__(self, url):
+        if not REDIS_AVAILABLE:
+            raise Exception("El paquete 'redis' no está instalado")
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def send(self, origin, message):
+        self.client.publish(self.CHANNEL, json.dumps([origin, list(message)]))
+
+    def start(self, receive):
+        thread = threading.Thread(target=self._listen_loop, args=(receive,), name='task-events-bridge')
+        thread.daemon = True
+        thread.start()
+
+    def _listen_loop(self, receive):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                for item in pubsub.listen():
+                    origin, message = json.loads(item['data'])
+                    receive(origin, tuple(message))
+            except Exception as e:
+                print(f"[ERROR] ❌ Error en pub/sub de eventos: {str(e)}")
+                time.sleep(1)
+
+
+def create_event_bridge():
+    """Bridge entre procesos acorde al backend del store de tareas (None si es 'memory')"""
+    if Config.TASK_STORE_BACKEND == 'sqlite':
+        return SQLiteEventBridge(Config.TASK_STORE_DB)
+    if Config.TASK_STORE_BACKEND == 'redis':
+        return RedisEventBridge(Config.REDIS_URL)
+    return None
+
@@ -0,0 +1,541 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+from config import Config
+
+# Redis es opcional: solo se necesita con TASK_STORE_BACKEND=redis
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+TERMINAL_STATUSES = ('completed', 'completed_with_errors', 'error')
+
+_MISSING = object()
+
+
+def _fingerprint(value):
+    """Huella compacta de un valor para detectar cambios (incluso en dicts anidados)"""
+    return hash(json.dumps(value, sort_keys=True, default=str))
+
+
+class TaskRecord(MutableMapping):
+    """
+    Estado de una tarea con interfaz de dict. Los campos más usados viven en
+    __slots__ y el resto en 'extra'. Cada modificación se informa al store,
+    que la persiste y publica solo las claves cuyo valor cambió. Los dicts
+    anidados deben reasignarse para notificar el cambio.
+    """
+
+    HOT_FIELDS = ('status', 'progress', 'message', 'created_at', 'uploads', 'video_info', 'result', 'batch_id')
+
+    __slots__ = ('task_id', 'extra', '_store', '_lock', '_sent', '_version') + HOT_FIELDS
+
+    def __init__(self, task_id, store, fields=None, version=0):
+        self.task_id = task_id
+        self._store = store
+        self._lock = threading.Lock()
+        self._version = version
+        self._load(fields or {})
+
+    def _load(self, fields):
+        for name in self.HOT_FIELDS:
+            setattr(self, name, fields.get(name, _MISSING))
+        self.extra = {key: value for key, value in fields.items() if key not in self.HOT_FIELDS}
+        self._sent = {key: _fingerprint(value) for key, value in fields.items()}
+
+    def __getitem__(self, key):
+        value = getattr(self, key, _MISSING) if key in self.HOT_FIELDS else self.extra.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.update({key: None})
+
+    def __iter__(self):
+        for name in self.HOT_FIELDS:
+            if getattr(self, name) is not _MISSING:
+                yield name
+        yield from list(self.extra)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def update(self, *args, **kwargs):
+        fields = dict(*args, **kwargs)
+        delta = {}
+
+        with self._lock:
+            for key, value in fields.items():
+                if key in self.HOT_FIELDS:
+                    setattr(self, key, value)
+                else:
+                    self.extra[key] = value
+
+                fingerprint = _fingerprint(value)
+                if self._sent.get(key) != fingerprint:
+                    self._sent[key] = fingerprint
+                    delta[key] = value
+
+        if delta:
+            self._store._record_changed(self, delta)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.update({key: default})
+        return self[key]
+
+    def to_dict(self):
+        with self._lock:
+            return {key: self[key] for key in self}
+
+
+class TaskStore:
+    """
+    Almacén de estado de tareas seguro entre hilos, con expulsión por TTL de
+    las tareas terminadas y un máximo de tareas en memoria.
+
+    Sin backend todo vive en este proceso. Con un backend compartido (SQLite
+    o Redis) cada cambio se escribe en él para que otros workers de gunicorn
+    lean el mismo estado; los registros locales se recargan cuando el backend
+    tiene una versión más nueva.
+    """
+
+    def __init__(self, broker=None, backend=None, ttl_seconds=3600, max_tasks=1000):
+        self.broker = broker
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_tasks = max_tasks
+        self.evictions = 0
+
+        self._records = {}
+        self._finished = OrderedDict()  # task_id -> momento en que terminó
+        self._lock = threading.RLock()
+        self._cap_warned = False
+
+    def __setitem__(self, task_id, fields):
+        fields = dict(fields or {})
+        version = self.backend.create(task_id, fields) if self.backend else 0
+        record = TaskRecord(task_id, self, fields, version)
+
+        with self._lock:
+            self._records[task_id] = record
+            self._track_finished(task_id, fields.get('status'))
+
+        if self.broker:
+            self.broker.publish(task_id, fields, event='snapshot')
+
+        self.evict()
+
+    def __getitem__(self, task_id):
+        record = self.get(task_id)
+        if record is None:
+            raise KeyError(task_id)
+        return record
+
+    def __contains__(self, task_id):
+        return self.get(task_id) is not None
+
+    def get(self, task_id, default=None):
+        """Registro de la tarea para modificarlo (se recarga si otro worker lo cambió)"""
+        with self._lock:
+            record = self._records.get(task_id)
+
+        if not self.backend:
+            return record if record is not None else default
+
+        version = self.backend.version(task_id)
+        if version is None:
+            with self._lock:
+                self._records.pop(task_id, None)
+            return default
+
+        if record is not None and record._version == version:
+            return record
+
+        loaded = self.backend.load(task_id)
+        if loaded is None:
+            return default
+
+        fields, version = loaded
+        with self._lock:
+            record = self._records.get(task_id)
+            if record is None:
+                record = TaskRecord(task_id, self, fields, version)
+                self._records[task_id] = record
+            else:
+                with record._lock:
+                    record._load(fields)
+                    record._version = version
+            self._track_finished(task_id, fields.get('status'))
+
+        return record
+
+    def setdefault(self, task_id, fields=None):
+        record = self.get(task_id)
+        if record is None:
+            self[task_id] = fields
+            record = self.get(task_id)
+        return record
+
+    def pop(self, task_id, default=None):
+        record = self.get(task_id)
+
+        with self._lock:
+            self._records.pop(task_id, None)
+            self._finished.pop(task_id, None)
+
+        if self.backend:
+            self.backend.delete(task_id)
+
+        return record if record is not None else default
+
+    def snapshot(self, task_id):
+        """Copia del estado de la tarea para leer o serializar (None si no existe)"""
+        if self.backend:
+            loaded = self.backend.load(task_id)
+            return loaded[0] if loaded else None
+
+        record = self.get(task_id)
+        return record.to_dict() if record is not None else None
+
+    def active_ids(self):
+        """IDs de las tareas que todavía no terminaron"""
+        if self.backend:
+            return self.backend.active_ids()
+
+        with self._lock:
+            return [
+                task_id for task_id, record in self._records.items()
+                if record.get('status') not in TERMINAL_STATUSES
+            ]
+
+    def evict(self):
+        """Expulsa tareas terminadas vencidas y, si se supera el máximo, las más antiguas"""
+        now = time.time()
+        evicted = []
+
+        with self._lock:
+            while self._finished:
+                task_id, finished_at = next(iter(self._finished.items()))
+                if now - finished_at <= self.ttl_seconds and len(self._records) <= self.max_tasks:
+                    break
+                self._finished.popitem(last=False)
+                self._records.pop(task_id, None)
+                evicted.append(task_id)
+
+            over_cap = len(self._records) > self.max_tasks
+
+        if evicted:
+            with self._lock:
+                self.evictions += len(evicted)
+
+        if over_cap and not self._cap_warned:
+            # Solo se expulsan tareas terminadas: las activas siguen en uso
+            self._cap_warned = True
+            print(f"[ERROR] ❌ Hay más de {self.max_tasks} tareas activas en memoria")
+
+        if self.backend:
+            self.backend.evict(self.ttl_seconds, self.max_tasks)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'backend': self.backend.name if self.backend else 'memory',
+                'local_records': len(self._records),
+                'finished_local': len(self._finished),
+                'evictions': self.evictions,
+                'ttl_seconds': self.ttl_seconds,
+                'max_tasks': self.max_tasks
+            }
+        if self.backend:
+            stats['active'] = len(self.backend.active_ids())
+        return stats
+
+    def _track_finished(self, task_id, status):
+        if status in TERMINAL_STATUSES:
+            self._finished.setdefault(task_id, time.time())
+        elif status is not None:
+            # Una tarea reintentada vuelve a estar activa
+            self._finished.pop(task_id, None)
+
+    def _record_changed(self, record, delta):
+        if self.backend:
+            version = self.backend.write(record.task_id, delta)
+            record._version = max(record._version, version)
+
+        if 'status' in delta:
+            with self._lock:
+                self._track_finished(record.task_id, delta['status'])
+
+        if self.broker:
+            self.broker.publish(record.task_id, delta)
+
+        if delta.get('status') in TERMINAL_STATUSES:
+            self.evict()
+
+
+class SQLiteTaskBackend:
+    """Backend compartido en SQLite: un registro por tarea y una fila por campo"""
+
+    name = 'sqlite'
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._init_db()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                status TEXT,
+                updated_at REAL NOT NULL,
+                finished_at REAL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS task_fields (
+                task_id TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (task_id, field)
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_finished ON tasks (finished_at)')
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def create(self, task_id, fields):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM task_fields WHERE task_id = ?', (task_id,))
+            conn.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+            conn.execute(
+                'INSERT INTO tasks (task_id, version, updated_at) VALUES (?, 0, ?)',
+                (task_id, time.time())
+            )
+            return self._write_fields(conn, task_id, fields)
+
+    def write(self, task_id, fields):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO tasks (task_id, version, updated_at) VALUES (?, 0, ?)',
+                (task_id, time.time())
+            )
+            return self._write_fields(conn, task_id, fields)
+
+    def _write_fields(self, conn, task_id, fields):
+        now = time.time()
+        conn.executemany(
+            'INSERT OR REPLACE INTO task_fields (task_id, field, value) VALUES (?, ?, ?)',
+            [(task_id, key, json.dumps(value, default=str)) for key, value in fields.items()]
+        )
+
+        if 'status' in fields:
+            finished_at = now if fields['status'] in TERMINAL_STATUSES else None
+            conn.execute(
+                """UPDATE tasks SET version = version + 1, status = ?, updated_at = ?,
+                       finished_at = CASE WHEN ? IS NULL THEN NULL ELSE COALESCE(finished_at, ?) END
+                   WHERE task_id = ?""",
+                (fields['status'], now, finished_at, finished_at, task_id)
+            )
+        else:
+            conn.execute(
+                'UPDATE tasks SET version = version + 1, updated_at = ? WHERE task_id = ?',
+                (now, task_id)
+            )
+
+        return conn.execute('SELECT version FROM tasks WHERE task_id = ?', (task_id,)).fetchone()[0]
+
+    def version(self, task_id):
+        row = self._connection().execute(
+            'SELECT version FROM tasks WHERE task_id = ?', (task_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def load(self, task_id):
+        conn = self._connection()
+        row = conn.execute('SELECT version FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+        if not row:
+            return None
+
+        fields = {
+            field: json.loads(value)
+            for field, value in conn.execute(
+                'SELECT field, value FROM task_fields WHERE task_id = ?', (task_id,)
+            ).fetchall()
+        }
+        return fields, row[0]
+
+    def delete(self, task_id):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM task_fields WHERE task_id = ?', (task_id,))
+            conn.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+
+    def active_ids(self):
+        rows = self._connection().execute(
+            'SELECT task_id FROM tasks WHERE finished_at IS NULL ORDER BY updated_at'
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def evict(self, ttl_seconds, max_tasks):
+        with self._transaction() as conn:
+            expired = [row[0] for row in conn.execute(
+                'SELECT task_id FROM tasks WHERE finished_at < ?', (time.time() - ttl_seconds,)
+            ).fetchall()]
+
+            total = conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0] - len(expired)
+            if total > max_tasks:
+                expired += [row[0] for row in conn.execute(
+                    """SELECT task_id FROM tasks WHERE finished_at >= ?
+                       ORDER BY finished_at LIMIT ?""",
+                    (time.time() - ttl_seconds, total - max_tasks)
+                ).fetchall()]
+
+            for task_id in expired:
+                conn.execute('DELETE FROM task_fields WHERE task_id = ?', (task_id,))
+                conn.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+
+
+class RedisTaskBackend:
+    """
+    Backend compartido en Redis: un hash por tarea (un campo JSON por clave),
+    un set con las tareas activas y un sorted set de las terminadas por
+    momento de fin. Las terminadas expiran por TTL y, si se supera el máximo,
+    se expulsan las más antiguas.
+    """
+
+    name = 'redis'
+    VERSION_FIELD = '__version'
+    ACTIVE_KEY = 'tasks:active'
+    FINISHED_KEY = 'tasks:finished'
+
+    def __init__(self, url, ttl_seconds=3600):
+        if not REDIS_AVAILABLE:
+            raise Exception("El paquete 'redis' no está instalado")
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl_seconds = ttl_seconds
+
+    def _key(self, task_id):
+        return f"task:{task_id}"
+
+    def create(self, task_id, fields):
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(task_id))
+        pipe.sadd(self.ACTIVE_KEY, task_id)
+        pipe.zrem(self.FINISHED_KEY, task_id)
+        pipe.execute()
+        return self.write(task_id, fields)
+
+    def write(self, task_id, fields):
+        key = self._key(task_id)
+        pipe = self.client.pipeline()
+
+        if fields:
+            pipe.hset(key, mapping={name: json.dumps(value, default=str) for name, value in fields.items()})
+        pipe.hincrby(key, self.VERSION_FIELD, 1)
+
+        if fields.get('status') in TERMINAL_STATUSES:
+            pipe.srem(self.ACTIVE_KEY, task_id)
+            pipe.zadd(self.FINISHED_KEY, {task_id: time.time()}, nx=True)
+            pipe.expire(key, self.ttl_seconds)
+        elif 'status' in fields:
+            pipe.sadd(self.ACTIVE_KEY, task_id)
+            pipe.zrem(self.FINISHED_KEY, task_id)
+            pipe.persist(key)
+
+        results = pipe.execute()
+        return int(results[1 if fields else 0])
+
+    def version(self, task_id):
+        value = self.client.hget(self._key(task_id), self.VERSION_FIELD)
+        return int(value) if value is not None else None
+
+    def load(self, task_id):
+        data = self.client.hgetall(self._key(task_id))
+        if not data:
+            return None
+
+        version = int(data.pop(self.VERSION_FIELD, 0))
+        return {name: json.loads(value) for name, value in data.items()}, version
+
+    def delete(self, task_id):
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(task_id))
+        pipe.srem(self.ACTIVE_KEY, task_id)
+        pipe.zrem(self.FINISHED_KEY, task_id)
+        pipe.execute()
+
+    def active_ids(self):
+        return list(self.client.smembers(self.ACTIVE_KEY))
+
+    def evict(self, ttl_seconds, max_tasks):
+        # Los hashes de las tareas vencidas ya expiraron solos (EXPIRE); aquí
+        # se limpian del sorted set y se aplica el máximo de tareas
+        expired = self.client.zrangebyscore(self.FINISHED_KEY, '-inf', time.time() - ttl_seconds)
+
+        total = self.client.scard(self.ACTIVE_KEY) + self.client.zcard(self.FINISHED_KEY) - len(expired)
+        if total > max_tasks:
+            expired += self.client.zrange(self.FINISHED_KEY, len(expired), len(expired) + total - max_tasks - 1)
+
+        if expired:
+            pipe = self.client.pipeline()
+            pipe.delete(*[self._key(task_id) for task_id in expired])
+            pipe.zrem(self.FINISHED_KEY, *expired)
+            pipe.execute()
+
+
+def create_task_store(broker=None):
+    """Crea el store de tareas con el backend configurado en TASK_STORE_BACKEND"""
+    backend_name = Config.TASK_STORE_BACKEND
+    backend = None
+
+    if backend_name == 'sqlite':
+        backend = SQLiteTaskBackend(Config.TASK_STORE_DB)
+    elif backend_name == 'redis':
+        # Sin redis instalado falla: un store en memoria no se comparte entre workers
+        backend = RedisTaskBackend(Config.REDIS_URL, Config.TASK_STORE_TTL)
+    elif backend_name != 'memory':
+        raise Exception(f"Backend de tareas no soportado: {backend_name}")
+
+    return TaskStore(
+        broker=broker,
+        backend=backend,
+        ttl_seconds=Config.TASK_STORE_TTL,
+        max_tasks=Config.TASK_STORE_MAX_TASKS
+    )
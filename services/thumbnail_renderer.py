@@ -0,0 +1,329 @@
+import io
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import Config
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# Nombre de plataforma de las tareas -> clave en Config.PLATFORM_CONFIGS
+PLATFORM_CONFIG_KEYS = {
+    'youtube': 'youtube_shorts',
+    'instagram': 'instagram_reels'
+}
+
+
+def crop_box(size, target_size):
+    """
+    Recorte centrado con la proporción del destino (sin deformar la imagen)
+
+    Args:
+        size (tuple): (ancho, alto) de la imagen
+        target_size (tuple): (ancho, alto) del destino
+
+    Returns:
+        tuple: Caja (izquierda, arriba, derecha, abajo) sobre la imagen
+    """
+    width, height = size
+    target_width, target_height = target_size
+    target_ratio = target_width / target_height
+
+    if width / height > target_ratio:
+        crop_width = height * target_ratio
+        left = (width - crop_width) / 2
+        return (left, 0, left + crop_width, height)
+
+    crop_height = width / target_ratio
+    top = (height - crop_height) / 2
+    return (0, top, width, top + crop_height)
+
+
+def encode_jpeg(img, max_bytes, quality_max, quality_min):
+    """
+    Codifica en JPEG con la mayor calidad que entra en max_bytes (búsqueda binaria)
+
+    Returns:
+        tuple: (bytes, calidad, intentos)
+    """
+    def encode(quality):
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=quality, optimize=True)
+        return buffer.getvalue()
+
+    # Caso habitual: la calidad máxima ya entra en el límite
+    data = encode(quality_max)
+    attempts = 1
+    if not max_bytes or len(data) <= max_bytes:
+        return data, quality_max, attempts
+
+    best = None
+    low, high = quality_min, quality_max - 1
+    while low <= high:
+        quality = (low + high) // 2
+        candidate = encode(quality)
+        attempts += 1
+        if len(candidate) <= max_bytes:
+            best = (candidate, quality)
+            low = quality + 1
+        else:
+            high = quality - 1
+
+    if best is None:
+        # Ni la calidad mínima entra: se entrega igual y se marca
+        return encode(quality_min), quality_min, attempts + 1
+    return best[0], best[1], attempts
+
+
+def render_variants(source_path, variants, quality_max=95, quality_min=60):
+    """
+    Genera todas las versiones de una miniatura a partir de una sola
+    decodificación. Se ejecuta en un proceso del pool (función de módulo
+    para poder serializarla).
+
+    Args:
+        source_path (str): Miniatura original
+        variants (dict): nombre -> {'width', 'height', 'max_bytes', 'path'}
+        quality_max (int): Calidad JPEG inicial
+        quality_min (int): Calidad JPEG mínima aceptable
+
+    Returns:
+        dict: 'variants' con ruta, tamaño, bytes, calidad y tiempos de cada
+            versión, y 'timing' con los tiempos de decodificación (ms)
+    """
+    started = time.time()
+
+    # Tamaño mínimo que debe conservar la imagen para cubrir todos los destinos
+    needed = (
+        max(variant['width'] for variant in variants.values()),
+        max(variant['height'] for variant in variants.values())
+    )
+
+    with Image.open(source_path) as img:
+        source_size = img.size
+
+        # JPEG: el decodificador escala por 1/2, 1/4 o 1/8 sin decodificar
+        # la resolución completa
+        if img.format == 'JPEG':
+            img.draft('RGB', needed)
+        img = img.convert('RGB')
+
+    # Reducción entera (por promedio de bloques) de lo que draft no alcanzó
+    factor = min(img.width // needed[0], img.height // needed[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+
+    decoded = time.time()
+    results = {}
+    # Por tamaño de destino: la imagen redimensionada y su última codificación
+    rendered = {}
+
+    for name, variant in variants.items():
+        variant_started = time.time()
+        target_size = (variant['width'], variant['height'])
+        max_bytes = variant.get('max_bytes')
+
+        if target_size in rendered:
+            resized, data, quality, attempts = rendered[target_size]
+        else:
+            box = crop_box(img.size, target_size)
+            if img.size == target_size and box == (0, 0) + img.size:
+                resized = img
+            else:
+                resized = img.resize(target_size, Image.Resampling.LANCZOS, box=box, reducing_gap=3.0)
+            data = None
+        resize_done = time.time()
+
+        # Plataformas con el mismo tamaño comparten el JPEG si ya cumple el
+        # límite con la calidad máxima
+        if data is None or quality != quality_max or (max_bytes and len(data) > max_bytes):
+            data, quality, attempts = encode_jpeg(resized, max_bytes, quality_max, quality_min)
+            rendered[target_size] = (resized, data, quality, attempts)
+        else:
+            attempts = 0
+        with open(variant['path'], 'wb') as f:
+            f.write(data)
+
+        results[name] = {
+            'path': variant['path'],
+            'width': target_size[0],
+            'height': target_size[1],
+            'bytes': len(data),
+            'quality': quality,
+            'within_limit': not max_bytes or len(data) <= max_bytes,
+            'attempts': attempts,
+            'resize_ms': round((resize_done - variant_started) * 1000, 1),
+            'encode_ms': round((time.time() - resize_done) * 1000, 1)
+        }
+
+    return {
+        'variants': results,
+        'source_size': list(source_size),
+        'decoded_size': list(img.size),
+        'timing': {
+            'started_at': started,
+            'decode_ms': round((decoded - started) * 1000, 1),
+            'render_ms': round((time.time() - started) * 1000, 1)
+        }
+    }
+
+
+class ThumbnailRenderer:
+    """
+    Genera las miniaturas de cada plataforma en un pool de procesos (la
+    decodificación y codificación JPEG de Pillow no libera del todo el GIL
+    y competiría con los hilos de la app). La imagen se decodifica una vez
+    y de ella salen todas las versiones, recortadas a la proporción de cada
+    destino y codificadas con la mayor calidad que cumple su límite de bytes.
+
+    Con workers=0 se genera en el mismo proceso.
+    """
+
+    def __init__(self, workers=2, quality_max=95, quality_min=60):
+        self.workers = max(0, int(workers))
+        self.quality_max = quality_max
+        self.quality_min = quality_min
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def targets(self, platforms):
+        """Tamaño y límite de bytes de la miniatura de cada plataforma"""
+        targets = {}
+        for platform in platforms:
+            platform_config = Config.PLATFORM_CONFIGS.get(PLATFORM_CONFIG_KEYS.get(platform, platform))
+            if not platform_config or 'thumbnail' not in platform_config:
+                print(f"Warning: Plataforma sin configuración de miniatura: {platform}")
+                continue
+            targets[platform] = dict(platform_config['thumbnail'])
+        return targets
+
+    def submit(self, source_path, platforms=('youtube', 'instagram'), output_dir=None):
+        """
+        Encola la generación de las miniaturas
+
+        Args:
+            source_path (str): Miniatura original
+            platforms (list): Plataformas destino ('youtube', 'instagram')
+            output_dir (str): Carpeta de salida (la del original por defecto)
+
+        Returns:
+            Future: se resuelve con el mismo resultado que render()
+        """
+        if not PIL_AVAILABLE:
+            raise Exception("Pillow no está instalado: no se pueden generar miniaturas")
+
+        if not source_path or not os.path.exists(source_path):
+            raise Exception(f"Miniatura no encontrada: {source_path}")
+
+        base, _ = os.path.splitext(source_path)
+        if output_dir:
+            base = os.path.join(output_dir, os.path.basename(base))
+
+        variants = self.targets(platforms)
+        for platform, variant in variants.items():
+            variant['path'] = f"{base}_{platform}.jpg"
+        if not variants:
+            raise Exception(f"Ninguna plataforma válida para la miniatura: {list(platforms)}")
+
+        submitted = time.time()
+        result = Future()
+        args = (source_path, variants, self.quality_max, self.quality_min)
+
+        def finish(rendered, backend):
+            timing = rendered['timing']
+            timing['queue_ms'] = round(max(0, timing.pop('started_at') - submitted) * 1000, 1)
+            timing['total_ms'] = round((time.time() - submitted) * 1000, 1)
+            rendered['backend'] = backend
+
+            for name, variant in rendered['variants'].items():
+                if not variant['within_limit']:
+                    print(f"Warning: Miniatura de {name} excede el límite de bytes ({variant['bytes']} bytes)")
+            result.set_result(rendered)
+
+        def run_inline():
+            try:
+                finish(render_variants(*args), 'inline')
+            except Exception as e:
+                result.set_exception(e)
+
+        executor = self._get_executor()
+        if executor is None:
+            run_inline()
+            return result
+
+        def on_done(future):
+            try:
+                finish(future.result(), 'process')
+            except BrokenProcessPool as e:
+                # Un worker murió (memoria, señal): se rehace el pool y esta
+                # miniatura se genera aquí mismo
+                print(f"[ERROR] ❌ Pool de miniaturas caído, se genera en el proceso: {str(e)}")
+                self._reset_executor(executor)
+                # El callback corre en el hilo de gestión del pool: el render
+                # va en un hilo propio para no bloquearlo
+                threading.Thread(target=run_inline, name='thumbnail-inline', daemon=True).start()
+            except Exception as e:
+                result.set_exception(e)
+
+        try:
+            executor.submit(render_variants, *args).add_done_callback(on_done)
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            run_inline()
+        return result
+
+    def render(self, source_path, platforms=('youtube', 'instagram'), output_dir=None, timeout=None):
+        """
+        Genera las miniaturas y espera el resultado
+
+        Returns:
+            dict: 'variants' (por plataforma: path, width, height, bytes,
+                quality, within_limit, attempts, resize_ms, encode_ms),
+                'timing' (queue_ms, decode_ms, render_ms, total_ms),
+                'source_size', 'decoded_size' y 'backend'
+        """
+        timeout = timeout if timeout is not None else Config.THUMBNAIL_RENDER_TIMEOUT
+        return self.submit(source_path, platforms, output_dir).result(timeout=timeout)
+
+    def _get_executor(self):
+        if not self.workers:
+            return None
+        with self._lock:
+            if self._executor is None:
+                # Sin fork: el proceso de la app tiene hilos (cola, pipeline,
+                # subidas) y un fork copiaría sus locks tomados
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                if context.get_start_method() == 'forkserver':
+                    # El servidor precarga solo este módulo (sin efectos al
+                    # importarse) en vez del script principal de la app
+                    context.set_forkserver_preload([__name__])
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._executor
+
+    def _reset_executor(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+
+thumbnail_renderer = ThumbnailRenderer(
+    workers=Config.THUMBNAIL_RENDER_WORKERS,
+    quality_max=Config.THUMBNAIL_JPEG_QUALITY,
+    quality_min=Config.THUMBNAIL_JPEG_MIN_QUALITY
+)
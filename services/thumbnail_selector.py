@@ -0,0 +1,89 @@
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+class ThumbnailSelector:
+    """
+    Analizador del muestreo de fotogramas que elige el mejor para la
+    miniatura: todos los candidatos se puntúan juntos por nitidez (varianza
+    del laplaciano), exposición y contraste, descartando fotogramas negros o
+    vacíos.
+    """
+
+    def __call__(self, frame_set):
+        """
+        Args:
+            frame_set (FrameSet): Fotogramas muestreados por el FrameSampler
+
+        Returns:
+            dict: timestamp, score y candidates del mejor fotograma
+        """
+        scores = self.score_frames(frame_set.frames)
+        best = int(np.argmax(scores))
+
+        return {
+            'timestamp': frame_set.timestamps[best],
+            'score': round(float(scores[best]), 4),
+            'candidates': len(frame_set)
+        }
+
+    def score_frames(self, frames):
+        """
+        Puntúa todos los fotogramas a la vez
+
+        Args:
+            frames (ndarray): (N, alto, ancho) en escala de grises uint8
+
+        Returns:
+            ndarray: Puntaje por fotograma (-inf para los negros o vacíos)
+        """
+        pixels = frames.astype(np.float32)
+
+        # Nitidez: varianza del laplaciano (4 vecinos)
+        laplacian = (
+            pixels[:, :-2, 1:-1] + pixels[:, 2:, 1:-1] +
+            pixels[:, 1:-1, :-2] + pixels[:, 1:-1, 2:] -
+            4 * pixels[:, 1:-1, 1:-1]
+        )
+        sharpness = laplacian.var(axis=(1, 2))
+
+        brightness = pixels.mean(axis=(1, 2))
+        contrast = pixels.std(axis=(1, 2))
+        clipped = ((pixels < 8) | (pixels > 247)).mean(axis=(1, 2))
+
+        exposure = 1 - np.abs(brightness - 128) / 128
+        scores = (
+            0.6 * sharpness / max(float(sharpness.max()), 1e-6) +
+            0.25 * exposure +
+            0.15 * contrast / max(float(contrast.max()), 1e-6) -
+            0.5 * clipped
+        )
+
+        # Fotogramas negros, quemados o de un solo color (fundidos, cortinillas)
+        blank = (contrast < 10) | (brightness < 16) | (brightness > 240)
+        if not blank.all():
+            scores[blank] = -np.inf
+        return scores
+
+
+def frame_statistics(frame_set):
+    """
+    Analizador con estadísticas de imagen del video para el reporte de
+    procesamiento (brillo, contraste y proporción de fotogramas vacíos)
+    """
+    pixels = frame_set.frames.astype(np.float32)
+    brightness = pixels.mean(axis=(1, 2))
+    contrast = pixels.std(axis=(1, 2))
+    blank = (contrast < 10) | (brightness < 16) | (brightness > 240)
+
+    return {
+        'mean_brightness': round(float(brightness.mean()), 1),
+        'mean_contrast': round(float(contrast.mean()), 1),
+        'blank_ratio': round(float(blank.mean()), 3)
+    }
+
+
+thumbnail_selector = ThumbnailSelector()
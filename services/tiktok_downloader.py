@@ -1,6 +1,5 @@
 import yt_dlp
 import os
-import json
 import requests
 from urllib.parse import urlparse
 import re
@@ -8,11 +7,28 @@ from datetime import datetime
 import tempfile
 import shutil
 
+from config import Config
+from services.download_cache import DownloadCache
+from services.probe import video_probe
+
 class TikTokDownloader:
+    # Un perfil puede mostrar hasta 3 videos fijados antes de los más recientes
+    PINNED_ENTRIES = 3
+    
     def __init__(self):
         self.download_folder = 'downloads'
         os.makedirs(self.download_folder, exist_ok=True)
         
+        # Índice de descargas con TTL, cuota de disco y coalescencia
+        self.cache = None
+        if Config.DOWNLOAD_CACHE_ENABLED:
+            self.cache = DownloadCache(
+                Config.DOWNLOAD_CACHE_DB,
+                Config.DOWNLOAD_CACHE_TTL,
+                Config.DOWNLOAD_CACHE_MAX_BYTES,
+                Config.DOWNLOAD_CACHE_LEASE_TTL
+            )
+        
         # Configuración optimizada para TikTok sin marca de agua
         self.ydl_opts = {
             'format': 'best[ext=mp4]',  # Mejor calidad en MP4
@@ -23,7 +39,7 @@ class TikTokDownloader:
             'writeautomaticsub': False,
             'ignoreerrors': True,
             'no_warnings': False,
-            'extractflat': False,
+            'extract_flat': False,
             'writethumbnail': True,
             'writeinfojson': True,
             # Headers para evitar detección
@@ -51,9 +67,59 @@ class TikTokDownloader:
         
         return None
     
+    def canonical_video_id(self, url):
+        """ID numérico del video si la URL lo contiene (las URLs cortas no lo tienen)"""
+        match = re.search(r'tiktok\.com/@[^/]+/video/(\d+)', url)
+        return match.group(1) if match else None
+    
     def download(self, url, task_id=None):
         """
-        Descarga un video de TikTok sin marca de agua
+        Descarga un video de TikTok sin marca de agua, reutilizando una descarga
+        reciente del mismo video si existe
+        
+        Args:
+            url (str): URL del video de TikTok
+            task_id (str): ID de la tarea para seguimiento; los archivos quedan
+                reservados para ella hasta release(task_id)
+            
+        Returns:
+            dict: Información del video descargado
+        """
+        if not self.cache:
+            return self.fetch(url, task_id)
+        
+        video_id = self.canonical_video_id(url)
+        
+        cached = self.cache.lookup(url, video_id, holder=task_id)
+        if cached:
+            print(f"[INFO] Video {cached['video_id']} reutilizado desde la cache de descargas")
+            return cached
+        
+        def fetch_and_store():
+            # Otro hilo pudo completar la descarga mientras esperábamos
+            cached = self.cache.lookup(url, video_id, holder=task_id)
+            if cached:
+                return cached
+            
+            result = self.fetch(url, task_id)
+            self.cache.store(url, result, holder=task_id)
+            return result
+        
+        # Dos trabajos con el mismo video comparten una única descarga; los que
+        # esperaron reservan los archivos para sí
+        result = self.cache.coalesce(video_id or url, fetch_and_store)
+        if task_id:
+            self.cache.checkout(result['video_id'], task_id)
+        return result
+    
+    def release(self, task_id):
+        """Libera los archivos descargados que la tarea tenía en uso"""
+        if self.cache and task_id:
+            self.cache.release(task_id)
+    
+    def fetch(self, url, task_id=None):
+        """
+        Descarga el video desde TikTok (sin pasar por la cache)
         
         Args:
             url (str): URL del video de TikTok
@@ -76,11 +142,15 @@ class TikTokDownloader:
             
             # Ejecutar descarga
             with yt_dlp.YoutubeDL(temp_opts) as ydl:
-                # Extraer información primero
-                info_dict = ydl.extract_info(url, download=False)
+                # Extraer información una sola vez (sin procesar formatos)
+                ie_result = ydl.extract_info(url, download=False, process=False)
+                if not ie_result:
+                    raise Exception("No se pudo extraer la información del video")
                 
-                # Descargar video
-                ydl.download([url])
+                # Descargar reutilizando la información ya extraída
+                info_dict = ydl.process_ie_result(ie_result, download=True)
+                if not info_dict:
+                    raise Exception("No se pudo descargar el video")
                 
                 # Procesar archivos descargados
                 video_id = info_dict.get('id', 'unknown')
@@ -88,18 +158,8 @@ class TikTokDownloader:
                 description = info_dict.get('description', '')
                 creator = info_dict.get('uploader', '')
                 
-                # Buscar archivos descargados
-                video_file = None
-                thumbnail_file = None
-                info_file = None
-                
-                for file in os.listdir(temp_dir):
-                    if file.endswith('.mp4'):
-                        video_file = os.path.join(temp_dir, file)
-                    elif file.endswith('.jpg') or file.endswith('.jpeg') or file.endswith('.png'):
-                        thumbnail_file = os.path.join(temp_dir, file)
-                    elif file.endswith('.info.json'):
-                        info_file = os.path.join(temp_dir, file)
+                # Rutas finales informadas por yt-dlp
+                video_file, thumbnail_file, info_file = self.downloaded_files(info_dict)
                 
                 if not video_file:
                     raise Exception("No se pudo descargar el video")
@@ -164,6 +224,134 @@ class TikTokDownloader:
             
             raise Exception(f"Error descargando video: {str(e)}")
     
+    def downloaded_files(self, info_dict):
+        """
+        Obtiene las rutas de video, miniatura e info.json desde el resultado de
+        yt-dlp (sin recorrer el directorio temporal)
+        
+        Returns:
+            tuple: (video, miniatura, info.json); None si no se generó
+        """
+        # process_ie_result escribe las rutas en cada formato descargado, no
+        # en el info_dict de nivel superior
+        video_file = None
+        info_file = None
+        for requested in info_dict.get('requested_downloads') or []:
+            video_file = video_file or requested.get('filepath')
+            info_file = info_file or requested.get('infojson_filename')
+        video_file = video_file or info_dict.get('filepath')
+        info_file = info_file or info_dict.get('infojson_filename') or info_dict.get('__infojson_filename')
+        
+        thumbnail_file = None
+        for thumbnail in reversed(info_dict.get('thumbnails') or []):
+            if thumbnail.get('filepath'):
+                thumbnail_file = thumbnail['filepath']
+                break
+        
+        return tuple(
+            path if path and os.path.exists(path) else None
+            for path in (video_file, thumbnail_file, info_file)
+        )
+    
+    def is_collection_url(self, url):
+        """Indica si la URL es un perfil (@usuario) o un hashtag (/tag/...) de TikTok"""
+        return bool(re.search(r'tiktok\.com/(@[^/?#]+|tag/[^/?#]+)/?(?:[?#].*)?$', url))
+    
+    def is_profile_url(self, url):
+        """Indica si la URL es un perfil (@usuario): su listado va del más reciente al más antiguo"""
+        return bool(re.search(r'tiktok\.com/@[^/?#]+/?(?:[?#].*)?$', url))
+    
+    def list_entries(self, source_url, is_known=None, checkpoint_id=None, limit=None):
+        """
+        Enumera los videos de un perfil o hashtag con extracción plana: solo se
+        leen las páginas del listado, sin resolver los metadatos de cada video
+        
+        En un perfil (del más reciente al más antiguo) la enumeración se
+        detiene al llegar al punto de control de la sincronización anterior.
+        Si se corta antes por el límite, el punto de control no avanza y la
+        próxima sincronización continúa con los videos que quedaron
+        pendientes. Un hashtag se ordena por relevancia, no por fecha: no usa
+        punto de control y los videos ya importados se saltan con is_known.
+        
+        Args:
+            source_url (str): URL del perfil o hashtag
+            is_known (callable): is_known(video_id) -> True si ya se importó
+            checkpoint_id (str): Video más reciente de la última sincronización
+                (solo perfiles)
+            limit (int): Máximo de videos nuevos a devolver
+            
+        Returns:
+            dict: entries (video_id, url), checkpoint_id (None si no
+                debe avanzar), scanned y truncated
+        """
+        if not self.is_collection_url(source_url):
+            raise ValueError("URL de perfil o hashtag de TikTok no válida")
+        
+        flat_opts = self.ydl_opts.copy()
+        flat_opts.update({
+            'extract_flat': 'in_playlist',
+            'skip_download': True,
+            'writeinfojson': False,
+            'writethumbnail': False
+        })
+        
+        entries = []
+        newest_id = None
+        scanned = 0
+        truncated = False
+        chronological = self.is_profile_url(source_url)
+        
+        try:
+            with yt_dlp.YoutubeDL(flat_opts) as ydl:
+                # process=False: las entradas se obtienen página a página a medida que se recorren
+                ie_result = ydl.extract_info(source_url, download=False, process=False)
+                if not ie_result:
+                    raise Exception("No se pudo obtener el listado de videos")
+                
+                for position, entry in enumerate(ie_result.get('entries') or []):
+                    if not entry:
+                        continue
+                    
+                    scanned += 1
+                    url = entry.get('url') or entry.get('webpage_url') or ''
+                    video_id = str(entry.get('id') or self.canonical_video_id(url) or '')
+                    if not video_id:
+                        continue
+                    
+                    # Los fijados no indican hasta dónde llegó la sincronización anterior
+                    if chronological and position >= self.PINNED_ENTRIES:
+                        if video_id == checkpoint_id:
+                            break
+                        newest_id = newest_id or video_id
+                    
+                    if is_known and is_known(video_id):
+                        continue
+                    
+                    if not url.startswith('http'):
+                        url = f"https://www.tiktok.com/@{entry.get('uploader') or '_'}/video/{video_id}"
+                    
+                    # Sin el título del listado (es el caption de TikTok): el
+                    # título lo fijan las opciones de la importación o, si no
+                    # hay, los metadatos del video descargado
+                    entries.append({
+                        'video_id': video_id,
+                        'url': url
+                    })
+                    
+                    if limit and len(entries) >= limit:
+                        truncated = True
+                        break
+            
+        except Exception as e:
+            raise Exception(f"Error listando videos: {str(e)}")
+        
+        return {
+            'entries': entries,
+            'checkpoint_id': None if truncated else newest_id,
+            'scanned': scanned,
+            'truncated': truncated
+        }
+    
     def is_valid_tiktok_url(self, url):
         """Valida si la URL es de TikTok"""
         tiktok_domains = ['tiktok.com', 'vm.tiktok.com', 'www.tiktok.com']
@@ -174,51 +362,8 @@ class TikTokDownloader:
             return False
     
     def get_video_info(self, video_path):
-        """Obtiene información técnica del video usando ffprobe"""
-        try:
-            import subprocess
-            
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                '-show_format', '-show_streams', video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                data = json.loads(result.stdout)
-                
-                video_stream = None
-                for stream in data.get('streams', []):
-                    if stream.get('codec_type') == 'video':
-                        video_stream = stream
-                        break
-                
-                if video_stream:
-                    return {
-                        'duration': float(data.get('format', {}).get('duration', 0)),
-                        'width': int(video_stream.get('width', 0)),
-                        'height': int(video_stream.get('height', 0)),
-                        'fps': eval(video_stream.get('r_frame_rate', '30/1')),
-                        'file_size': int(data.get('format', {}).get('size', 0)),
-                        'codec': video_stream.get('codec_name', 'unknown')
-                    }
-            
-            return {}
-            
-        except Exception:
-            # Si ffprobe no está disponible, obtener info básica
-            try:
-                stat = os.stat(video_path)
-                return {
-                    'file_size': stat.st_size,
-                    'duration': 0,
-                    'width': 0,
-                    'height': 0,
-                    'fps': 30
-                }
-            except:
-                return {}
+        """Obtiene información técnica del video (servicio de probe compartido)"""
+        return video_probe.probe(video_path)
     
     def get_alternative_download_methods(self, url):
         """Métodos alternativos si yt-dlp falla"""
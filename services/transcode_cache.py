@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+
+class TranscodeCache:
+    """
+    Cache en disco de videos transcodificados y miniaturas, direccionado por
+    contenido: la clave combina el hash del video original con los parámetros
+    de codificación (configuración de plataforma y opciones de FFmpeg).
+
+    El índice vive en SQLite junto a los archivos y se expulsan las entradas
+    menos usadas (LRU) cuando se supera el tamaño máximo.
+    """
+
+    CACHE_VERSION = 1
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.db_path = os.path.join(cache_dir, 'index.sqlite3')
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hash_memo = {}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._init_db()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        self._connection().execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT NOT NULL,
+                name TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (key, name)
+            )
+        """)
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def hash_file(self, path):
+        """SHA-256 del contenido (memorizado por ruta, tamaño y mtime)"""
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            if memo_key in self._hash_memo:
+                return self._hash_memo[memo_key]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+        with self._lock:
+            self._hash_memo[memo_key] = digest.hexdigest()
+        return digest.hexdigest()
+
+    def make_key(self, source_hash, params):
+        """Clave de cache a partir del hash del original y los parámetros de codificación"""
+        payload = json.dumps([self.CACHE_VERSION, source_hash, params], sort_keys=True, default=list)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key, name):
+        """
+        Busca un archivo en la cache
+
+        Args:
+            key (str): Clave de la entrada
+            name (str): Archivo dentro de la entrada ('video', 'thumbnail', ...)
+
+        Returns:
+            str: Ruta del archivo cacheado o None
+        """
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT path FROM entries WHERE key = ? AND name = ?', (key, name)
+        ).fetchone()
+
+        if row and os.path.exists(row[0]):
+            conn.execute(
+                'UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key)
+            )
+            with self._lock:
+                self.hits += 1
+            return row[0]
+
+        if row:
+            # El archivo desapareció del disco: limpiar el índice
+            conn.execute('DELETE FROM entries WHERE key = ? AND name = ?', (key, name))
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, name, source_path):
+        """
+        Guarda una copia del archivo en la cache (hard link si es posible)
+
+        Returns:
+            str: Ruta del archivo dentro de la cache
+        """
+        entry_dir = os.path.join(self.cache_dir, key[:2], key)
+        os.makedirs(entry_dir, exist_ok=True)
+
+        extension = os.path.splitext(source_path)[1]
+        cached_path = os.path.join(entry_dir, f"{name}{extension}")
+        self._link_or_copy(source_path, cached_path)
+
+        with self._transaction() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO entries (key, name, path, size, last_used)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (key, name, cached_path, os.path.getsize(cached_path), time.time())
+            )
+
+        self._evict()
+        return cached_path
+
+    def checkout(self, cached_path, destination_path):
+        """
+        Expone un archivo cacheado en una ruta de trabajo. Se usa hard link para
+        que la expulsión de la entrada no afecte a quien lo esté usando.
+        """
+        self._link_or_copy(cached_path, destination_path)
+        return destination_path
+
+    def stats(self):
+        row = self._connection().execute(
+            'SELECT COUNT(DISTINCT key), COALESCE(SUM(size), 0) FROM entries'
+        ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'entries': row[0],
+                'size_bytes': row[1],
+                'max_bytes': self.max_bytes
+            }
+
+    def _evict(self):
+        """Expulsa entradas completas, de la menos a la más recientemente usada"""
+        conn = self._connection()
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        candidates = conn.execute(
+            """SELECT key, SUM(size), MAX(last_used) AS used FROM entries
+               GROUP BY key ORDER BY used"""
+        ).fetchall()
+
+        for key, size, _ in candidates:
+            if total <= self.max_bytes:
+                break
+
+            with self._transaction() as tx:
+                tx.execute('DELETE FROM entries WHERE key = ?', (key,))
+            shutil.rmtree(os.path.join(self.cache_dir, key[:2], key), ignore_errors=True)
+
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def _link_or_copy(self, source_path, destination_path):
+        if os.path.exists(destination_path):
+            os.remove(destination_path)
+        try:
+            os.link(source_path, destination_path)
+        except OSError:
+            shutil.copy2(source_path, destination_path)
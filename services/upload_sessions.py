@@ -0,0 +1,98 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+
+class UploadSessionStore:
+    """
+    Sesiones de subida resumible persistidas en SQLite. Si el worker se cae o
+    se reinicia a mitad de una subida, el siguiente intento retoma la misma
+    sesión desde el último byte confirmado por el servidor en vez de volver a
+    empezar.
+    """
+
+    # Las sesiones resumibles de Google caducan a la semana
+    MAX_AGE_SECONDS = 6 * 24 * 3600
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection().execute("""
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                platform TEXT NOT NULL,
+                file_key TEXT NOT NULL,
+                session_uri TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (platform, file_key)
+            )
+        """)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def file_key(path, scope=None):
+        """
+        Identifica el archivo por su contenido (SHA-256 y tamaño), no por su
+        ruta: el pipeline deja cada video en un directorio temporal nuevo, y
+        tras un reinicio o un reintento del trabajo la misma subida tiene otra
+        ruta. Si el video regenerado difiere en un solo byte, la sesión vieja
+        no se reutiliza.
+
+        Args:
+            path (str): Archivo a subir
+            scope (str): Prefijo que separa subidas del mismo contenido (p. ej.
+                el ID del trabajo), para que dos trabajos no compartan sesión
+
+        Returns:
+            str: Clave de la sesión
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+
+        key = f"{os.path.getsize(path)}:{digest.hexdigest()}"
+        return f"{scope}:{key}" if scope else key
+
+    def get(self, platform, file_key):
+        """
+        Sesión guardada para el archivo
+
+        Returns:
+            str: URI de la sesión, o None si no hay una vigente
+        """
+        row = self._connection().execute(
+            'SELECT session_uri, created_at FROM upload_sessions WHERE platform = ? AND file_key = ?',
+            (platform, file_key)
+        ).fetchone()
+
+        if not row:
+            return None
+        if time.time() - row[1] > self.MAX_AGE_SECONDS:
+            self.delete(platform, file_key)
+            return None
+        return row[0]
+
+    def save(self, platform, file_key, session_uri):
+        self._connection().execute(
+            """INSERT INTO upload_sessions (platform, file_key, session_uri, created_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(platform, file_key) DO UPDATE SET
+                   session_uri = excluded.session_uri, created_at = excluded.created_at""",
+            (platform, file_key, session_uri, time.time())
+        )
+
+    def delete(self, platform, file_key):
+        self._connection().execute(
+            'DELETE FROM upload_sessions WHERE platform = ? AND file_key = ?',
+            (platform, file_key)
+        )
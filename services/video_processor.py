@@ -1,11 +1,20 @@
 import os
 import subprocess
-import json
 import shutil
 from datetime import datetime
 import tempfile
+import uuid
+import time
+import threading
+from collections import deque
 from PIL import Image
 
+from config import Config
+from services.transcode_cache import TranscodeCache
+from services.probe import video_probe
+from services.frame_sampler import frame_sampler
+from services.thumbnail_selector import thumbnail_selector, frame_statistics
+
 # Importaciones opcionales para manejo de errores en producción
 try:
     import cv2
@@ -22,9 +31,26 @@ except ImportError:
     print("Warning: NumPy not available. Some video processing features will be limited.")
 
 class VideoProcessor:
+    PROCESSING_MODES = ('throughput', 'quality')
+    
     def __init__(self):
         self.temp_dir = tempfile.mkdtemp(prefix='video_processor_')
         
+        # Transcodificar todas las plataformas en una sola pasada de FFmpeg
+        self.single_pass = Config.FFMPEG_SINGLE_PASS
+        
+        # Modo por defecto: 'throughput' (preset rápido) o 'quality' (preset lento)
+        self.default_mode = self.resolve_mode(Config.VIDEO_PROCESSING_MODE)
+        
+        # Cache de versiones transcodificadas (None si está deshabilitada)
+        self.cache = None
+        if Config.TRANSCODE_CACHE_ENABLED:
+            self.cache = TranscodeCache(Config.TRANSCODE_CACHE_DIR, Config.TRANSCODE_CACHE_MAX_BYTES)
+        
+        # Análisis por fotograma: todos comparten una única decodificación del video
+        frame_sampler.subscribe('thumbnail', thumbnail_selector)
+        frame_sampler.subscribe('frame_stats', frame_statistics)
+        
         # Configuraciones de calidad para cada plataforma (2025)
         self.platform_configs = {
             'youtube_shorts': {
@@ -47,7 +73,7 @@ class VideoProcessor:
             }
         }
     
-    def process(self, video_path, metadata, target_platforms=['youtube_shorts', 'instagram_reels']):
+    def process(self, video_path, metadata, target_platforms=['youtube_shorts', 'instagram_reels'], mode=None):
         """
         Procesa el video manteniendo la máxima calidad para las plataformas objetivo
         
@@ -55,6 +81,7 @@ class VideoProcessor:
             video_path (str): Ruta al video original
             metadata (dict): Metadatos del video
             target_platforms (list): Plataformas objetivo
+            mode (str): 'throughput' o 'quality' (None usa el de la configuración)
             
         Returns:
             dict: Información del video procesado
@@ -66,126 +93,150 @@ class VideoProcessor:
             # Analizar video original
             video_info = self.analyze_video(video_path)
             
-            # Determinar si necesita procesamiento
-            needs_processing = self.needs_processing(video_info, target_platforms)
-            
-            if not needs_processing:
-                # El video ya está optimizado
-                return {
-                    'path': video_path,
-                    'processed': False,
-                    'original_info': video_info,
-                    'thumbnail': self.extract_thumbnail(video_path),
-                    'platforms_ready': target_platforms
-                }
+            result = self.transcode(video_path, video_info, target_platforms, mode)
             
-            # Procesar video para cada plataforma
-            processed_videos = {}
-            
-            for platform in target_platforms:
-                processed_path = self.process_for_platform(video_path, platform, video_info)
-                processed_videos[platform] = processed_path
-            
-            # Usar la versión de mejor calidad como principal
-            main_video = processed_videos.get('youtube_shorts', processed_videos[list(processed_videos.keys())[0]])
-            
-            # Extraer miniatura de alta calidad
-            thumbnail_path = self.extract_high_quality_thumbnail(main_video)
-            
-            return {
-                'path': main_video,
-                'processed': True,
-                'original_info': video_info,
-                'processed_videos': processed_videos,
-                'thumbnail': thumbnail_path,
-                'platforms_ready': target_platforms,
-                'processing_report': self.create_processing_report(video_path, main_video, video_info)
-            }
+            return self.finalize(video_path, video_info, result)
             
         except Exception as e:
             raise Exception(f"Error procesando video: {str(e)}")
     
-    def analyze_video(self, video_path):
-        """Analiza las propiedades técnicas del video"""
-        try:
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                '-show_format', '-show_streams', video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                # Usar OpenCV como fallback
-                return self.analyze_with_opencv(video_path)
-            
-            data = json.loads(result.stdout)
-            
-            video_stream = None
-            audio_stream = None
-            
-            for stream in data.get('streams', []):
-                if stream.get('codec_type') == 'video' and not video_stream:
-                    video_stream = stream
-                elif stream.get('codec_type') == 'audio' and not audio_stream:
-                    audio_stream = stream
-            
-            format_info = data.get('format', {})
+    def transcode(self, video_path, video_info, target_platforms=['youtube_shorts', 'instagram_reels'], mode=None, progress_callback=None):
+        """
+        Etapa de transcodificación: genera las versiones para cada plataforma
+        (sin miniatura ni reporte, que se agregan en finalize)
+        
+        Args:
+            video_path (str): Ruta al video original
+            video_info (dict): Resultado de analyze_video
+            target_platforms (list): Plataformas objetivo
+            mode (str): 'throughput' o 'quality' (None usa el de la configuración)
+            progress_callback (callable): Recibe el avance de FFmpeg (ver run_ffmpeg)
             
+        Returns:
+            dict: Información parcial del video procesado
+        """
+        tier = self.select_tier(video_info, target_platforms, mode)
+        print(f"[INFO] Nivel de codificación: {tier}")
+        
+        if tier == 'remux':
+            # El video ya cumple: solo se reempaqueta con +faststart
+            remuxed_path = self.remux(video_path, video_info, progress_callback)
             return {
-                'duration': float(format_info.get('duration', 0)),
-                'width': int(video_stream.get('width', 0)) if video_stream else 0,
-                'height': int(video_stream.get('height', 0)) if video_stream else 0,
-                'fps': self.parse_fps(video_stream.get('r_frame_rate', '30/1')) if video_stream else 30,
-                'bitrate': int(format_info.get('bit_rate', 0)),
-                'codec': video_stream.get('codec_name', 'unknown') if video_stream else 'unknown',
-                'has_audio': audio_stream is not None,
-                'audio_codec': audio_stream.get('codec_name', 'none') if audio_stream else 'none',
-                'file_size': int(format_info.get('size', 0)),
-                'aspect_ratio': self.calculate_aspect_ratio(
-                    video_stream.get('width', 0) if video_stream else 0,
-                    video_stream.get('height', 0) if video_stream else 0
-                )
+                'path': remuxed_path,
+                'processed': False,
+                'tier': tier,
+                'original_info': video_info,
+                'processed_videos': {platform: remuxed_path for platform in target_platforms},
+                'platforms_ready': target_platforms
             }
-            
-        except Exception as e:
-            print(f"Error analizando video con ffprobe: {str(e)}")
-            return self.analyze_with_opencv(video_path)
+        
+        groups = self.group_platforms_by_encode(target_platforms, video_info, tier)
+        processed_videos = {}
+        cache_keys = {}
+        
+        # Reutilizar versiones ya generadas para el mismo original y parámetros
+        if self.cache:
+            source_hash = self.cache.hash_file(video_path)
+            pending_groups = []
+            
+            for settings, platforms in groups:
+                key = self.cache.make_key(source_hash, settings['key'])
+                cached_video = self.cache.get(key, 'video')
+                
+                if cached_video:
+                    processed_path = self.cache.checkout(cached_video, self.build_output_path('_'.join(platforms)))
+                    for platform in platforms:
+                        processed_videos[platform] = processed_path
+                else:
+                    pending_groups.append((settings, platforms))
+                
+                for platform in platforms:
+                    cache_keys[platform] = key
+        else:
+            pending_groups = groups
+        
+        # Procesar video para cada plataforma
+        encoded_videos = {}
+        if self.single_pass and len(pending_groups) > 1:
+            # Una sola decodificación para todas las versiones
+            encoded_videos = self.process_multi(
+                video_path, target_platforms, video_info,
+                groups=pending_groups, tier=tier, progress_callback=progress_callback
+            )
+        else:
+            for index, (settings, platforms) in enumerate(pending_groups):
+                callback = self.scale_progress(progress_callback, index, len(pending_groups))
+                processed_path = self.process_for_platform(video_path, platforms[0], video_info, tier, callback)
+                for platform in platforms:
+                    encoded_videos[platform] = processed_path
+        
+        if self.cache:
+            stored_keys = set()
+            for platform, processed_path in encoded_videos.items():
+                if cache_keys[platform] not in stored_keys:
+                    self.cache.put(cache_keys[platform], 'video', processed_path)
+                    stored_keys.add(cache_keys[platform])
+        
+        processed_videos.update(encoded_videos)
+        
+        # Usar la versión de mejor calidad como principal
+        main_platform = 'youtube_shorts' if 'youtube_shorts' in processed_videos else list(processed_videos.keys())[0]
+        main_video = processed_videos[main_platform]
+        
+        return {
+            'path': main_video,
+            'processed': True,
+            'tier': tier,
+            'original_info': video_info,
+            'processed_videos': processed_videos,
+            'platforms_ready': target_platforms,
+            'cache_key': cache_keys.get(main_platform)
+        }
     
-    def analyze_with_opencv(self, video_path):
-        """Analizar video usando OpenCV como fallback"""
-        try:
-            cap = cv2.VideoCapture(video_path)
-            
-            if not cap.isOpened():
-                raise Exception("No se pudo abrir el video con OpenCV")
-            
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            duration = frame_count / fps if fps > 0 else 0
-            
-            cap.release()
-            
-            file_size = os.path.getsize(video_path)
-            
-            return {
-                'duration': duration,
-                'width': width,
-                'height': height,
-                'fps': fps,
-                'bitrate': 0,  # No disponible con OpenCV
-                'codec': 'unknown',
-                'has_audio': True,  # Asumimos que tiene audio
-                'audio_codec': 'unknown',
-                'file_size': file_size,
-                'aspect_ratio': self.calculate_aspect_ratio(width, height)
-            }
+    def finalize(self, video_path, video_info, result):
+        """
+        Etapa de miniatura: extrae la miniatura y crea el reporte de procesamiento
+        
+        Args:
+            video_path (str): Ruta al video original
+            video_info (dict): Resultado de analyze_video
+            result (dict): Resultado de transcode
             
-        except Exception as e:
-            print(f"Error analizando video con OpenCV: {str(e)}")
-            return self.get_default_video_info()
+        Returns:
+            dict: Información completa del video procesado
+        """
+        if not result['processed']:
+            # Nivel remux: el video sale tal cual, pero la miniatura se elige
+            # igual entre los keyframes (solo el selector, sin estadísticas)
+            result['thumbnail'] = self.extract_high_quality_thumbnail(video_path, video_info.get('duration'))
+            return result
+        
+        # Extraer miniatura de alta calidad (o reutilizar la cacheada)
+        cache_key = result.get('cache_key')
+        cached_thumbnail = self.cache.get(cache_key, 'thumbnail') if self.cache and cache_key else None
+        frame_analysis = None
+        
+        if cached_thumbnail:
+            result['thumbnail'] = self.cache.checkout(
+                cached_thumbnail,
+                os.path.join(self.temp_dir, f"thumb_{uuid.uuid4().hex[:8]}.jpg")
+            )
+        else:
+            frame_analysis = frame_sampler.analyze(result['path'], video_info.get('duration')) or {}
+            result['thumbnail'] = self.extract_high_quality_thumbnail(
+                result['path'], video_info.get('duration'), frame_analysis
+            )
+            if self.cache and cache_key and result['thumbnail']:
+                self.cache.put(cache_key, 'thumbnail', result['thumbnail'])
+        result['processing_report'] = self.create_processing_report(
+            video_path, result['path'], video_info, frame_analysis
+        )
+        
+        return result
+    
+    def analyze_video(self, video_path):
+        """Analiza las propiedades técnicas del video (cacheado por archivo)"""
+        return video_probe.probe(video_path)
     
     def needs_processing(self, video_info, target_platforms):
         """Determina si el video necesita ser procesado"""
@@ -211,24 +262,89 @@ class VideoProcessor:
         
         return False
     
-    def process_for_platform(self, video_path, platform, video_info):
-        """Procesa el video específicamente para una plataforma"""
-        config = self.platform_configs.get(platform)
-        if not config:
-            raise Exception(f"Configuración no encontrada para plataforma: {platform}")
+    def resolve_mode(self, mode):
+        """Normaliza el modo de procesamiento ('throughput' por defecto)"""
+        mode = (mode or getattr(self, 'default_mode', None) or 'throughput').lower()
+        if mode not in self.PROCESSING_MODES:
+            raise Exception(f"Modo de procesamiento no válido: {mode}")
+        return mode
+    
+    def select_tier(self, video_info, target_platforms, mode=None):
+        """
+        Decide cómo generar las versiones para las plataformas
         
-        output_path = os.path.join(
-            self.temp_dir,
-            f"{platform}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
-        )
+        Returns:
+            str: 'remux' (copia de streams con +faststart) si el video ya
+                cumple códec, resolución, duración y tamaño; si no, 'fast'
+                en modo throughput o 'quality' en modo quality
+        """
+        mode = self.resolve_mode(mode)
         
-        # Construir comando FFmpeg
-        cmd = ['ffmpeg', '-i', video_path]
+        if not self.needs_processing(video_info, target_platforms) and self.stream_compatible(video_info, target_platforms):
+            return 'remux'
         
-        # Configurar video
-        cmd.extend(['-c:v', 'libx264'])
-        cmd.extend(['-b:v', config['bitrate']])
-        cmd.extend(['-r', str(config['fps'])])
+        return 'quality' if mode == 'quality' else 'fast'
+    
+    def stream_compatible(self, video_info, target_platforms):
+        """Indica si el stream de video puede copiarse sin recodificar"""
+        for platform in target_platforms:
+            config = self.platform_configs[platform]
+            
+            if video_info.get('codec') != config['codec']:
+                return False
+            
+            # No subir resoluciones mayores a las de la plataforma
+            if (video_info['width'] > config['resolution']['width'] or
+                    video_info['height'] > config['resolution']['height']):
+                return False
+        
+        return True
+    
+    def remux(self, video_path, video_info, progress_callback=None):
+        """
+        Copia los streams a un nuevo MP4 con el índice al inicio (+faststart).
+        Solo se recodifica el audio si no es AAC.
+        """
+        options = Config.FFMPEG_OPTIONS
+        output_path = self.build_output_path('remux')
+        
+        cmd = ['ffmpeg', '-y', '-i', video_path, '-map', '0:v:0', '-map', '0:a:0?', '-c:v', 'copy']
+        if video_info.get('audio_codec') in ('aac', 'none'):
+            cmd.extend(['-c:a', 'copy'])
+        else:
+            cmd.extend(['-c:a', options['audio_codec'], '-b:a', '128k'])
+        cmd.extend(['-movflags', options['movflags'], output_path])
+        
+        try:
+            self.run_ffmpeg(cmd, [output_path], video_info.get('duration'), progress_callback)
+            return output_path
+        except Exception as e:
+            # Mismo comportamiento que antes: usar el original sin tocar
+            print(f"[ERROR] ❌ No se pudo reempaquetar el video, se usa el original: {str(e)}")
+            return video_path
+    
+    def encode_options(self, tier):
+        """Opciones de FFmpeg del nivel: FFMPEG_OPTIONS con el preset rápido en 'fast'"""
+        options = dict(Config.FFMPEG_OPTIONS)
+        if tier == 'fast':
+            options.update(Config.FFMPEG_FAST_OPTIONS)
+        return options
+    
+    def build_encode_settings(self, platform, video_info, tier='quality'):
+        """
+        Construye los parámetros de codificación de una plataforma
+        
+        Args:
+            platform (str): Plataforma objetivo
+            video_info (dict): Resultado de analyze_video
+            tier (str): 'fast' o 'quality'
+        
+        Returns:
+            dict: filtro de video, argumentos de salida y clave de deduplicación
+        """
+        config = self.platform_configs.get(platform)
+        if not config:
+            raise Exception(f"Configuración no encontrada para plataforma: {platform}")
         
         # Configurar resolución (mantener proporción si es necesario)
         target_width = config['resolution']['width']
@@ -236,43 +352,276 @@ class VideoProcessor:
         
         # Filtro para redimensionar manteniendo calidad
         scale_filter = f"scale={target_width}:{target_height}:force_original_aspect_ratio=decrease,pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2:black"
-        cmd.extend(['-vf', scale_filter])
+        
+        options = self.encode_options(tier)
+        
+        # Configurar video
+        output_args = ['-c:v', options['video_codec']]
+        output_args.extend(['-b:v', config['bitrate']])
+        output_args.extend(['-r', str(config['fps'])])
         
         # Configurar audio
         if video_info.get('has_audio', True):
-            cmd.extend(['-c:a', 'aac'])
-            cmd.extend(['-b:a', config['audio_bitrate']])
+            output_args.extend(['-c:a', options['audio_codec']])
+            output_args.extend(['-b:a', config['audio_bitrate']])
         else:
-            cmd.extend(['-an'])  # Sin audio
+            output_args.extend(['-an'])  # Sin audio
         
         # Limitar duración si es necesario
         if video_info['duration'] > config['max_duration']:
-            cmd.extend(['-t', str(config['max_duration'])])
+            output_args.extend(['-t', str(config['max_duration'])])
+        
+        # Preset y calidad del nivel (el preset rápido cambia velocidad por tamaño)
+        output_args.extend(['-preset', options['preset']])
+        output_args.extend(['-crf', str(options['crf'])])  # 0-51, menor = mejor
+        output_args.extend(['-pix_fmt', options['pix_fmt']])  # Compatibilidad
+        output_args.extend(['-movflags', options['movflags']])  # Para streaming
+        
+        # Clave de deduplicación: con libx264 el modo -crf tiene prioridad sobre
+        # -b:v, así que el bitrate no cambia el resultado cuando hay CRF
+        effective_args = list(output_args)
+        if '-crf' in effective_args:
+            index = effective_args.index('-b:v')
+            del effective_args[index:index + 2]
+        
+        return {
+            'filter': scale_filter,
+            'output_args': output_args,
+            'key': (scale_filter, tuple(effective_args))
+        }
+    
+    def group_platforms_by_encode(self, target_platforms, video_info, tier='quality'):
+        """
+        Agrupa las plataformas que producirían exactamente la misma codificación
+        
+        Returns:
+            list: [(settings, [plataformas])] en el orden de target_platforms
+        """
+        groups = {}
+        
+        for platform in target_platforms:
+            settings = self.build_encode_settings(platform, video_info, tier)
+            if settings['key'] in groups:
+                groups[settings['key']][1].append(platform)
+            else:
+                groups[settings['key']] = (settings, [platform])
+        
+        return list(groups.values())
+    
+    def process_for_platform(self, video_path, platform, video_info, tier='quality', progress_callback=None):
+        """Procesa el video específicamente para una plataforma"""
+        settings = self.build_encode_settings(platform, video_info, tier)
+        output_path = self.build_output_path(platform)
         
-        # Configuraciones adicionales para calidad
-        cmd.extend(['-preset', 'slow'])  # Mejor calidad
-        cmd.extend(['-crf', '18'])  # Calidad alta (0-51, menor = mejor)
-        cmd.extend(['-pix_fmt', 'yuv420p'])  # Compatibilidad
+        # Construir comando FFmpeg
+        cmd = ['ffmpeg', '-i', video_path, '-vf', settings['filter']]
+        cmd.extend(settings['output_args'])
         
         # Archivo de salida
         cmd.extend(['-y', output_path])  # -y para sobrescribir
         
-        # Ejecutar comando
+        duration = min(video_info['duration'], self.platform_configs[platform]['max_duration'])
+        self.run_ffmpeg(cmd, [output_path], duration, progress_callback)
+        return output_path
+    
+    def process_multi(self, video_path, target_platforms, video_info, groups=None, tier='quality', progress_callback=None):
+        """
+        Transcodifica todas las plataformas en un único proceso FFmpeg: el video
+        se decodifica una sola vez, se escala una vez por resolución distinta y
+        un filtro split reparte los frames a cada salida. Las plataformas con
+        parámetros idénticos comparten la misma salida.
+        
+        Args:
+            video_path (str): Ruta al video original
+            target_platforms (list): Plataformas objetivo
+            video_info (dict): Resultado de analyze_video
+            groups (list): Grupos ya calculados por group_platforms_by_encode (opcional)
+            tier (str): 'fast' o 'quality' (si no se pasan grupos)
+            progress_callback (callable): Recibe el avance de FFmpeg (ver run_ffmpeg)
+        
+        Returns:
+            dict: Ruta del video procesado por plataforma
+        """
+        if groups is None:
+            groups = self.group_platforms_by_encode(target_platforms, video_info, tier)
+        
+        # Filtros de escalado únicos (uno por resolución)
+        chains = []
+        for settings, _ in groups:
+            if settings['filter'] not in chains:
+                chains.append(settings['filter'])
+        
+        filter_parts = []
+        if len(chains) > 1:
+            filter_parts.append(f"[0:v]split={len(chains)}" + ''.join(f"[c{j}]" for j in range(len(chains))))
+        
+        for j, chain in enumerate(chains):
+            members = [i for i, (settings, _) in enumerate(groups) if settings['filter'] == chain]
+            source = f"[c{j}]" if len(chains) > 1 else "[0:v]"
+            filter_parts.append(
+                f"{source}{chain},split={len(members)}" + ''.join(f"[v{i}]" for i in members)
+            )
+        
+        cmd = ['ffmpeg', '-y', '-i', video_path, '-filter_complex', ';'.join(filter_parts)]
+        
+        processed_videos = {}
+        outputs = []
+        
+        for i, (settings, platforms) in enumerate(groups):
+            output_path = self.build_output_path('_'.join(platforms))
+            
+            cmd.extend(['-map', f"[v{i}]"])
+            if '-an' not in settings['output_args']:
+                cmd.extend(['-map', '0:a:0?'])
+            cmd.extend(settings['output_args'])
+            cmd.append(output_path)
+            
+            outputs.append(output_path)
+            for platform in platforms:
+                processed_videos[platform] = output_path
+        
+        # La salida más larga marca el avance del proceso
+        duration = min(
+            video_info['duration'],
+            max(self.platform_configs[platform]['max_duration'] for _, platforms in groups for platform in platforms)
+        )
+        self.run_ffmpeg(cmd, outputs, duration, progress_callback)
+        return processed_videos
+    
+    def build_output_path(self, name):
+        """Ruta única en el directorio temporal para un video procesado"""
+        return os.path.join(
+            self.temp_dir,
+            f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.mp4"
+        )
+    
+    def run_ffmpeg(self, cmd, outputs, duration=None, progress_callback=None):
+        """
+        Ejecuta FFmpeg leyendo su avance en streaming (-progress pipe:1) y
+        verifica que se generaron todas las salidas
+        
+        Args:
+            cmd (list): Comando FFmpeg
+            outputs (list): Archivos que debe generar
+            duration (float): Duración esperada de la salida en segundos; se
+                usa para el porcentaje, el ETA y el timeout adaptativo
+            progress_callback (callable): Recibe un dict con fraction (0-1),
+                out_time, fps, speed y eta
+        """
+        cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + cmd[1:]
+        timeout = self.ffmpeg_timeout(duration)
+        
+        # Solo se conservan las últimas líneas de stderr para el mensaje de error
+        stderr_tail = deque(maxlen=Config.FFMPEG_STDERR_LINES)
+        
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-            
-            if result.returncode != 0:
-                raise Exception(f"Error en FFmpeg: {result.stderr}")
-            
-            if not os.path.exists(output_path):
-                raise Exception("El archivo procesado no se generó")
-            
-            return output_path
-            
-        except subprocess.TimeoutExpired:
-            raise Exception("Timeout procesando video")
+            process = subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                text=True, errors='replace'
+            )
         except Exception as e:
             raise Exception(f"Error ejecutando FFmpeg: {str(e)}")
+        
+        stderr_reader = threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True)
+        stderr_reader.start()
+        
+        # Vigilancia: tiempo total adaptativo y FFmpeg sin avanzar
+        started = time.time()
+        last_progress = [started]
+        killed = []
+        
+        def watchdog():
+            while process.poll() is None:
+                now = time.time()
+                if now - started > timeout:
+                    killed.append(f"Timeout procesando video ({int(timeout)}s)")
+                elif now - last_progress[0] > Config.FFMPEG_STALL_TIMEOUT:
+                    killed.append(f"FFmpeg sin avanzar durante {Config.FFMPEG_STALL_TIMEOUT}s")
+                if killed:
+                    process.kill()
+                    return
+                time.sleep(1)
+        
+        threading.Thread(target=watchdog, daemon=True).start()
+        
+        block = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            block[key] = value
+            
+            if key != 'progress':
+                continue
+            
+            last_progress[0] = time.time()
+            if progress_callback:
+                try:
+                    progress_callback(self.parse_ffmpeg_progress(block, duration))
+                except Exception as e:
+                    print(f"[DEBUG] Error notificando avance de FFmpeg: {str(e)}")
+            block = {}
+        
+        returncode = process.wait()
+        stderr_reader.join(timeout=5)
+        
+        if killed:
+            raise Exception(f"Error ejecutando FFmpeg: {killed[0]}")
+        
+        if returncode != 0:
+            raise Exception(f"Error ejecutando FFmpeg: {''.join(stderr_tail)}")
+        
+        for output_path in outputs:
+            if not os.path.exists(output_path):
+                raise Exception("Error ejecutando FFmpeg: El archivo procesado no se generó")
+    
+    def ffmpeg_timeout(self, duration):
+        """Timeout proporcional a la duración del video (con un mínimo fijo)"""
+        if not duration:
+            return Config.FFMPEG_TIMEOUT_MIN
+        return max(Config.FFMPEG_TIMEOUT_MIN, duration * Config.FFMPEG_TIMEOUT_FACTOR)
+    
+    def parse_ffmpeg_progress(self, block, duration):
+        """Convierte un bloque de -progress en fracción completada, velocidad y ETA"""
+        try:
+            out_time = int(block.get('out_time_us', '0')) / 1000000
+        except ValueError:
+            out_time = 0.0
+        
+        try:
+            fps = float(block.get('fps', '0'))
+        except ValueError:
+            fps = 0.0
+        
+        try:
+            speed = float(block.get('speed', '0').rstrip('x'))
+        except ValueError:
+            speed = 0.0
+        
+        done = block.get('progress') == 'end'
+        fraction = 1.0 if done else 0.0
+        eta = 0 if done else None
+        
+        if not done and duration:
+            fraction = min(max(out_time / duration, 0.0), 1.0)
+            if speed > 0:
+                eta = max(duration - out_time, 0) / speed
+        
+        return {
+            'fraction': fraction,
+            'out_time': round(out_time, 2),
+            'fps': fps,
+            'speed': speed,
+            'eta': round(eta, 1) if eta is not None else None
+        }
+    
+    def scale_progress(self, progress_callback, index, total):
+        """Adapta el avance de una de varias codificaciones secuenciales al total"""
+        if not progress_callback or total <= 1:
+            return progress_callback
+        
+        def callback(progress):
+            progress_callback(dict(progress, fraction=(index + progress['fraction']) / total))
+        
+        return callback
     
     def extract_thumbnail(self, video_path, timestamp=1.0):
         """Extrae miniatura del video en un timestamp específico"""
@@ -282,9 +631,10 @@ class VideoProcessor:
                 f"thumb_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
             )
             
+            # -ss antes de -i: busca por keyframes en vez de decodificar desde el inicio
             cmd = [
-                'ffmpeg', '-i', video_path,
-                '-ss', str(timestamp),
+                'ffmpeg', '-ss', str(timestamp),
+                '-i', video_path,
                 '-vframes', '1',
                 '-q:v', '2',  # Alta calidad
                 '-y', thumbnail_path
@@ -332,57 +682,44 @@ class VideoProcessor:
             print(f"Error extrayendo miniatura con OpenCV: {str(e)}")
             return None
     
-    def extract_high_quality_thumbnail(self, video_path):
-        """Extrae miniatura de alta calidad desde el centro del video"""
-        try:
-            # Obtener duración del video
-            video_info = self.analyze_video(video_path)
-            duration = video_info.get('duration', 10)
-            
-            # Extraer desde el centro del video
-            center_timestamp = duration / 2
+    def extract_high_quality_thumbnail(self, video_path, duration=None, frame_analysis=None):
+        """
+        Extrae la miniatura del fotograma más nítido y mejor expuesto
+        
+        Args:
+            video_path (str): Ruta al video
+            duration (float): Duración conocida (evita volver a analizar el video)
+            frame_analysis (dict): Resultado de frame_sampler.analyze ya calculado (opcional)
             
-            return self.extract_thumbnail(video_path, center_timestamp)
+        Returns:
+            str: Ruta a la miniatura en resolución completa
+        """
+        try:
+            if frame_analysis is None:
+                frame_analysis = frame_sampler.analyze(video_path, duration, names=['thumbnail']) or {}
+            selection = frame_analysis.get('thumbnail')
+            
+            if selection:
+                sampling = frame_analysis['sampling']
+                print(f"[DEBUG] Miniatura en {selection['timestamp']:.2f}s "
+                      f"(puntaje {selection['score']}, {selection['candidates']} candidatos, "
+                      f"decodificados con {sampling['backend']} en {sampling['elapsed']}s)")
+                return self.extract_thumbnail(video_path, selection['timestamp'])
+            
+            # Sin NumPy o sin fotogramas decodificables: centro del video
+            if duration is None:
+                duration = self.analyze_video(video_path).get('duration', 10)
+            return self.extract_thumbnail(video_path, duration / 2)
             
         except Exception as e:
             print(f"Error extrayendo miniatura de alta calidad: {str(e)}")
             return self.extract_thumbnail(video_path, 1.0)
     
-    def calculate_aspect_ratio(self, width, height):
-        """Calcula la proporción de aspecto"""
-        if height == 0:
-            return 0
-        return width / height
-    
-    def parse_fps(self, fps_string):
-        """Parsea string de FPS (ej: '30/1') a número"""
-        try:
-            if '/' in fps_string:
-                numerator, denominator = fps_string.split('/')
-                return float(numerator) / float(denominator)
-            return float(fps_string)
-        except:
-            return 30.0  # Default
-    
-    def get_default_video_info(self):
-        """Retorna información de video por defecto en caso de error"""
-        return {
-            'duration': 0,
-            'width': 1080,
-            'height': 1920,
-            'fps': 30,
-            'bitrate': 0,
-            'codec': 'unknown',
-            'has_audio': True,
-            'audio_codec': 'unknown',
-            'file_size': 0,
-            'aspect_ratio': 9/16
-        }
-    
-    def create_processing_report(self, original_path, processed_path, original_info):
+    def create_processing_report(self, original_path, processed_path, original_info, frame_analysis=None):
         """Crea un reporte del procesamiento realizado"""
         try:
             processed_info = self.analyze_video(processed_path)
+            frame_analysis = frame_analysis or {}
             
             return {
                 'timestamp': datetime.now().isoformat(),
@@ -400,7 +737,9 @@ class VideoProcessor:
                         original_info['file_size'] > processed_info['file_size']
                     ),
                     'quality_maintained': processed_info['fps'] >= 30
-                }
+                },
+                'frame_stats': frame_analysis.get('frame_stats'),
+                'frame_sampling': frame_analysis.get('sampling')
             }
         except Exception as e:
             return {
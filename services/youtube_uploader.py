@@ -1,13 +1,70 @@
 import os
 import json
+import time
+import random
+import threading
+import http.client
+import httplib2
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError, ResumableUploadError
 from googleapiclient.http import MediaFileUpload
 import pickle
 from datetime import datetime
+from config import Config
+from services.credential_store import create_credential_store
+from services.upload_sessions import UploadSessionStore
+
+# Errores transitorios que justifican reintentar el chunk
+RETRIABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+RETRIABLE_EXCEPTIONS = (httplib2.HttpLib2Error, http.client.HTTPException, OSError)
+
+# Los chunks de una subida resumible deben ser múltiplos de 256 KB
+CHUNK_ALIGNMENT = 256 * 1024
+
+class SharedCredentials(Credentials):
+    """
+    Credenciales compartidas por los clientes de todos los hilos. AuthorizedHttp
+    refresca por su cuenta (antes de cada petición si el token venció, y ante
+    un 401): este refresh() lo delega en el uploader para que también esos
+    refrescos pasen por su lock, reutilicen el token de otro worker y se
+    guarden en el store.
+    """
+    
+    @classmethod
+    def adopt(cls, credentials, owner, scopes=None):
+        """Copia unas credenciales cualesquiera y las asocia al uploader"""
+        shared = cls(
+            token=credentials.token,
+            refresh_token=credentials.refresh_token,
+            token_uri=credentials.token_uri,
+            client_id=credentials.client_id,
+            client_secret=credentials.client_secret,
+            scopes=credentials.scopes or scopes
+        )
+        shared.expiry = credentials.expiry
+        shared._owner = owner
+        return shared
+    
+    def refresh(self, request):
+        owner = getattr(self, '_owner', None)
+        if owner is None:
+            return super().refresh(request)
+        owner.refresh_credentials(request, self.token)
+    
+    def refresh_token_now(self, request):
+        """Refresco real contra el servidor de OAuth (solo lo llama el uploader con el lock tomado)"""
+        super().refresh(request)
+    
+    def __getstate__(self):
+        # El uploader (y su lock) no se serializa con el token
+        state = super().__getstate__()
+        state.pop('_owner', None)
+        return state
 
 class YouTubeUploader:
     def __init__(self):
@@ -15,7 +72,16 @@ class YouTubeUploader:
         self.API_SERVICE_NAME = 'youtube'
         self.API_VERSION = 'v3'
         self.credentials = None
-        self.service = None
+        self.token_file = 'youtube_token.pickle'
+        self.credential_store = create_credential_store()
+        self.upload_sessions = UploadSessionStore(Config.UPLOAD_SESSIONS_DB)
+        self.chunk_size = max(1, round(Config.YOUTUBE_UPLOAD_CHUNK_SIZE / CHUNK_ALIGNMENT)) * CHUNK_ALIGNMENT
+        
+        # httplib2 no es thread-safe: cada hilo usa su propio cliente, todos
+        # con las mismas credenciales, y solo un hilo a la vez las refresca
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+        self._discovery_doc = None
         
         # Configuración para YouTube Shorts (2025)
         self.shorts_config = {
@@ -33,9 +99,14 @@ class YouTubeUploader:
         try:
             # Buscar credenciales guardadas
             creds_file = 'youtube_credentials.json'
-            token_file = 'youtube_token.pickle'
+            token_file = self.token_file
             
-            if os.path.exists(token_file):
+            if self.credential_store:
+                # Store compartido: el token que refresca un worker lo reutilizan los demás
+                stored = self.credential_store.load('youtube')
+                if stored:
+                    self.credentials = Credentials.from_authorized_user_info(json.loads(stored), self.SCOPES)
+            elif os.path.exists(token_file):
                 with open(token_file, 'rb') as token:
                     self.credentials = pickle.load(token)
             
@@ -67,17 +138,96 @@ class YouTubeUploader:
                             raise Exception("No se encontraron credenciales de YouTube. Configure las variables de entorno o el archivo credentials.json")
                 
                 # Guardar credenciales para uso futuro
-                with open(token_file, 'wb') as token:
-                    pickle.dump(self.credentials, token)
+                self.save_credentials()
+            
+            # Todo refresco posterior, también los que dispara AuthorizedHttp
+            # en medio de una subida, pasa por refresh_credentials
+            self.credentials = SharedCredentials.adopt(self.credentials, self, self.SCOPES)
             
-            # Construir el servicio
-            self.service = build(self.API_SERVICE_NAME, self.API_VERSION, credentials=self.credentials)
+            # Documento de discovery empaquetado con la librería: construir un
+            # cliente por hilo no implica otra petición de red
+            self._discovery_doc = get_static_doc(self.API_SERVICE_NAME, self.API_VERSION)
+            
+            # Construir el cliente del hilo actual para validar la configuración
+            self._local.service = self.build_service()
             
         except Exception as e:
             print(f"Error inicializando YouTube API: {str(e)}")
-            self.service = None
+            self.credentials = None
+    
+    @property
+    def service(self):
+        """Cliente de la API del hilo actual (None si no hay credenciales)"""
+        if not self.credentials:
+            return None
+        
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self.build_service()
+            self._local.service = service
+        
+        self.ensure_credentials()
+        return service
+    
+    def build_service(self):
+        """Construye un cliente con su propia conexión HTTP sobre las credenciales compartidas"""
+        transport = httplib2.Http(timeout=Config.YOUTUBE_HTTP_TIMEOUT)
+        # En la subida resumible, 308 significa "chunk recibido", no una
+        # redirección (lo mismo que hace googleapiclient.http.build_http)
+        transport.redirect_codes = transport.redirect_codes - {308}
+        http = AuthorizedHttp(self.credentials, http=transport)
+        
+        if self._discovery_doc:
+            return build_from_document(self._discovery_doc, http=http)
+        return build(self.API_SERVICE_NAME, self.API_VERSION, http=http, cache_discovery=False)
+    
+    def ensure_credentials(self):
+        """Refresca el token si venció; los hilos concurrentes esperan a un único refresco"""
+        if self.credentials.valid:
+            return
+        
+        self.credentials.refresh(Request())
+    
+    def refresh_credentials(self, request, stale_token):
+        """
+        Único punto de refresco del token, para todos los hilos del proceso
+        
+        Args:
+            request: Transporte de google-auth con el que refrescar
+            stale_token (str): Token que el hilo vio vencido o rechazado (401)
+        """
+        with self._refresh_lock:
+            # Otro hilo ya lo reemplazó mientras se esperaba el lock
+            if self.credentials.token != stale_token and self.credentials.valid:
+                return
+            
+            if self.credential_store:
+                # Otro worker pudo haberlo refrescado: se reutiliza su token
+                stored = self.credential_store.load('youtube')
+                if stored:
+                    info = json.loads(stored)
+                    fresh = Credentials.from_authorized_user_info(info, self.SCOPES)
+                    if fresh.valid and fresh.token != stale_token:
+                        self.credentials.token = fresh.token
+                        self.credentials.expiry = fresh.expiry
+                        return
+            
+            print("[INFO] Refrescando token de YouTube")
+            self.credentials.refresh_token_now(request)
+            self.save_credentials()
+    
+    def save_credentials(self):
+        """Persiste las credenciales; el archivo local se reemplaza de forma atómica"""
+        if self.credential_store:
+            self.credential_store.save('youtube', self.credentials.to_json())
+            return
+        
+        temp_file = f"{self.token_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'wb') as token:
+            pickle.dump(self.credentials, token)
+        os.replace(temp_file, self.token_file)
     
-    def upload(self, video_path, description, thumbnail_path=None, custom_title=None):
+    def upload(self, video_path, description, thumbnail_path=None, custom_title=None, progress_callback=None, session_scope=None):
         """
         Sube un video a YouTube como Short
         
@@ -86,6 +236,9 @@ class YouTubeUploader:
             description (str): Descripción del video
             thumbnail_path (str): Ruta a la miniatura (opcional)
             custom_title (str): Título personalizado (opcional)
+            progress_callback (callable): Recibe la fracción subida (0-1) tras cada chunk
+            session_scope (str): Identificador estable de la subida (p. ej. el ID
+                del trabajo) para retomar la sesión tras un reinicio o reintento
             
         Returns:
             dict: Información del video subido
@@ -127,10 +280,10 @@ class YouTubeUploader:
                 }
             }
             
-            # Configurar upload
+            # Configurar upload en chunks: un corte de conexión solo repite el chunk en curso
             media = MediaFileUpload(
                 video_path,
-                chunksize=-1,
+                chunksize=self.chunk_size,
                 resumable=True,
                 mimetype='video/mp4'
             )
@@ -143,7 +296,11 @@ class YouTubeUploader:
             )
             
             # Ejecutar upload con reintentos
-            response = self.resumable_upload(insert_request)
+            response = self.resumable_upload(
+                insert_request,
+                session_key=UploadSessionStore.file_key(video_path, session_scope),
+                progress_callback=progress_callback
+            )
             
             if response:
                 video_id = response['id']
@@ -175,34 +332,104 @@ class YouTubeUploader:
         except Exception as e:
             raise Exception(f"Error subiendo a YouTube: {str(e)}")
     
-    def resumable_upload(self, insert_request):
-        """Maneja la subida resumible con reintentos"""
-        response = None
-        error = None
+    def resumable_upload(self, insert_request, session_key=None, progress_callback=None):
+        """
+        Maneja la subida resumible chunk a chunk con reintentos
+        
+        La URI de la sesión se persiste apenas el servidor la crea: si el
+        worker se reinicia, el próximo intento consulta el último byte
+        confirmado y continúa desde ahí.
+        
+        Args:
+            insert_request: Petición videos().insert con media resumible
+            session_key (str): Identificador del archivo para persistir la sesión
+            progress_callback (callable): Recibe la fracción subida (0-1)
+            
+        Returns:
+            dict: Respuesta de la API con el video creado
+        """
+        saved_uri = self.upload_sessions.get('youtube', session_key) if session_key else None
+        if saved_uri:
+            print("[INFO] Reanudando subida de YouTube desde una sesión previa")
+            insert_request.resumable_uri = saved_uri
+            # Con el estado de error, next_chunk pregunta primero cuántos bytes recibió el servidor
+            insert_request._in_error_state = True
+        
         retry = 0
-        max_retries = 3
         
-        while response is None:
+        while True:
             try:
+                if insert_request.resumable_uri is None:
+                    # La sesión se crea y se guarda antes de enviar el primer
+                    # chunk: si el worker cae durante ese chunk, no se pierde
+                    insert_request.resumable_uri = self.start_resumable_session(insert_request)
+                    if session_key:
+                        self.upload_sessions.save('youtube', session_key, insert_request.resumable_uri)
+                
                 status, response = insert_request.next_chunk()
+            except HttpError as e:
+                if saved_uri and e.resp.status in (404, 410):
+                    # La sesión guardada caducó: se empieza una nueva desde el byte 0
+                    print("[INFO] La sesión de subida expiró, se inicia una nueva")
+                    self.upload_sessions.delete('youtube', session_key)
+                    saved_uri = None
+                    insert_request.resumable_uri = None
+                    insert_request.resumable_progress = 0
+                    insert_request._in_error_state = False
+                    continue
+                if e.resp.status not in RETRIABLE_STATUS_CODES:
+                    raise e
+                error = e
+            except RETRIABLE_EXCEPTIONS as e:
+                error = e
+            else:
+                retry = 0
+                
                 if response is not None:
+                    if session_key:
+                        self.upload_sessions.delete('youtube', session_key)
                     if 'id' in response:
                         return response
-                    else:
-                        raise Exception(f"Error inesperado: {response}")
-            except HttpError as e:
-                if e.resp.status in [500, 502, 503, 504]:
-                    # Errores del servidor, reintentar
-                    retry += 1
-                    if retry > max_retries:
-                        raise Exception(f"Error después de {max_retries} intentos: {e}")
-                    
-                    import time
-                    time.sleep(2 ** retry)  # Backoff exponencial
-                else:
-                    raise e
+                    raise Exception(f"Error inesperado: {response}")
+                
+                if status and progress_callback:
+                    progress_callback(status.progress())
+                continue
+            
+            retry += 1
+            if retry > Config.YOUTUBE_UPLOAD_MAX_RETRIES:
+                raise Exception(f"Error después de {Config.YOUTUBE_UPLOAD_MAX_RETRIES} intentos: {error}")
+            
+            # Backoff exponencial con jitter completo para no sincronizar reintentos entre workers
+            delay = random.uniform(0, min(Config.YOUTUBE_UPLOAD_MAX_BACKOFF, 2 ** retry))
+            print(f"[INFO] Reintentando chunk de YouTube en {delay:.1f}s ({retry}/{Config.YOUTUBE_UPLOAD_MAX_RETRIES}): {error}")
+            time.sleep(delay)
+    
+    def start_resumable_session(self, insert_request):
+        """
+        Crea la sesión de subida resumible (la misma petición inicial que hace
+        next_chunk) sin enviar todavía datos del video
+        
+        Returns:
+            str: URI de la sesión
+        """
+        size = insert_request.resumable.size()
+        headers = dict(insert_request.headers)
+        headers['X-Upload-Content-Type'] = insert_request.resumable.mimetype()
+        if size is not None:
+            headers['X-Upload-Content-Length'] = str(size)
+        headers['content-length'] = str(insert_request.body_size)
+        
+        resp, content = insert_request.http.request(
+            insert_request.uri,
+            method=insert_request.method,
+            body=insert_request.body,
+            headers=headers
+        )
         
-        return response
+        if resp.status == 200 and 'location' in resp:
+            return resp['location']
+        raise ResumableUploadError(resp, content)
     
     def upload_thumbnail(self, video_id, thumbnail_path):
         """Sube una miniatura personalizada"""
@@ -5,6 +5,7 @@ const POLL_INTERVAL = 1000; // 1 segundo
 // Estado de la aplicación
 let currentTaskId = null;
 let pollInterval = null;
+let eventSource = null;
 
 // Elementos del DOM
 const elements = {
@@ -201,7 +202,7 @@ async function handleProcessClick() {
         if (data.task_id) {
             currentTaskId = data.task_id;
             showProgressSection();
-            startPolling();
+            startTaskUpdates();
             showToast('Procesamiento iniciado', 'success');
         } else {
             throw new Error(data.error || 'Error desconocido');
@@ -243,7 +244,7 @@ async function handleDownloadClick() {
         if (data.task_id) {
             currentTaskId = data.task_id;
             showProgressSection();
-            startPolling();
+            startTaskUpdates();
             showToast('Descarga iniciada', 'success');
         } else {
             throw new Error(data.error || 'Error desconocido');
@@ -264,7 +265,82 @@ function getSelectedPlatforms() {
     return platforms;
 }
 
-// Polling para el estado de las tareas
+// Actualizaciones de la tarea por Server-Sent Events (con polling como respaldo)
+function startTaskUpdates() {
+    stopTaskUpdates();
+
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    const taskId = currentTaskId;
+    let taskState = {};
+    let received = false;
+
+    eventSource = new EventSource(`/api/task/${taskId}/events`);
+
+    eventSource.addEventListener('snapshot', (event) => {
+        received = true;
+        taskState = JSON.parse(event.data);
+        handleTaskState(taskState);
+    });
+
+    eventSource.addEventListener('update', (event) => {
+        received = true;
+        // Solo llegan las claves que cambiaron
+        taskState = Object.assign({}, taskState, JSON.parse(event.data));
+        handleTaskState(taskState);
+    });
+
+    eventSource.onerror = () => {
+        // El navegador reintenta solo; si la conexión quedó cerrada o nunca
+        // llegó un evento (proxy sin soporte SSE), pasar a polling
+        if (currentTaskId !== taskId || (received && eventSource.readyState !== EventSource.CLOSED)) {
+            return;
+        }
+        console.warn('SSE no disponible, usando polling');
+        closeEventSource();
+        startPolling();
+    };
+}
+
+function closeEventSource() {
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+}
+
+function stopTaskUpdates() {
+    closeEventSource();
+    if (pollInterval) {
+        clearInterval(pollInterval);
+        pollInterval = null;
+    }
+}
+
+// Aplica un estado de tarea a la UI; devuelve true si la tarea terminó
+function handleTaskState(data) {
+    updateProgress(data);
+
+    const succeeded = data.status === 'completed' || data.status === 'completed_with_errors';
+    if (!succeeded && data.status !== 'error') {
+        return false;
+    }
+
+    stopTaskUpdates();
+
+    if (succeeded) {
+        showResults(data);
+    } else {
+        showToast(`Error: ${data.message}`, 'error');
+        hideProgressSection();
+    }
+    return true;
+}
+
+// Polling para el estado de las tareas (respaldo si no hay SSE)
 function startPolling() {
     if (pollInterval) {
         clearInterval(pollInterval);
@@ -284,24 +360,11 @@ function startPolling() {
             }
 
             const data = await response.json();
-            updateProgress(data);
-
-            if (data.status === 'completed' || data.status === 'error') {
-                clearInterval(pollInterval);
-                pollInterval = null;
-                
-                if (data.status === 'completed') {
-                    showResults(data);
-                } else {
-                    showToast(`Error: ${data.message}`, 'error');
-                    hideProgressSection();
-                }
-            }
+            handleTaskState(data);
 
         } catch (error) {
             console.error('Error polling task status:', error);
-            clearInterval(pollInterval);
-            pollInterval = null;
+            stopTaskUpdates();
             showToast('Error obteniendo estado de la tarea', 'error');
             hideProgressSection();
         }
@@ -382,7 +445,7 @@ function displayUploadResults(uploads) {
                 </div>
                 ${isSuccess ? `
                     <div class="upload-details">
-                        <p><strong>URL:</strong> <a href="${result.video_url || result.reel_url}" target="_blank" rel="noopener">${result.video_url || result.reel_url}</a></p>
+                        <p><strong>URL:</strong> <a href="${result.video_url || result.permalink || result.reel_url}" target="_blank" rel="noopener">${result.video_url || result.permalink || result.reel_url}</a></p>
                         <p><strong>Fecha:</strong> ${formatDate(result.upload_date)}</p>
                         ${result.title ? `<p><strong>Título:</strong> ${result.title}</p>` : ''}
                     </div>
@@ -431,10 +494,7 @@ function resetToInitialState() {
     
     // Limpiar estado
     currentTaskId = null;
-    if (pollInterval) {
-        clearInterval(pollInterval);
-        pollInterval = null;
-    }
+    stopTaskUpdates();
     
     // Ocultar secciones
     hideAllSections();
@@ -545,7 +605,5 @@ window.addEventListener('unhandledrejection', function(event) {
 
 // Cleanup al cerrar la página
 window.addEventListener('beforeunload', function() {
-    if (pollInterval) {
-        clearInterval(pollInterval);
-    }
+    stopTaskUpdates();
 }); 
\ No newline at end of file
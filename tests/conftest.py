@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+# Los tests importan los módulos de la app igual que app.py (desde la raíz)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Las bases y carpetas de datos de la app (si un test importa app) van a un
+# directorio temporal en vez de data/ del repositorio
+DATA_DIR = tempfile.mkdtemp(prefix='uploader-tests-')
+for name, filename in [
+    ('JOB_QUEUE_DB', 'jobs.sqlite3'),
+    ('TASK_STORE_DB', 'tasks.sqlite3'),
+    ('DOWNLOAD_CACHE_DB', 'downloads.sqlite3'),
+    ('IMPORT_DB', 'imports.sqlite3'),
+    ('UPLOAD_SESSIONS_DB', 'upload_sessions.sqlite3'),
+    ('CREDENTIALS_DB', 'credentials.sqlite3'),
+    ('JOB_STAGE_SLOT_DIR', 'stage_slots'),
+    ('TRANSCODE_CACHE_DIR', 'transcode_cache'),
+    ('MEDIA_DIR', 'media')
+]:
+    os.environ.setdefault(name, os.path.join(DATA_DIR, filename))
@@ -0,0 +1,120 @@
+import json
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockInstagram:
+    """
+    Servidor local con la parte de la Graph API que usa la subida resumible:
+    creación del container (upload_type=resumable), host de subida por
+    chunks con cabeceras offset/file_size, estado con bytes_transferred y
+    publicación.
+    """
+
+    def __init__(self, user_id='user'):
+        self.user_id = user_id
+        self.containers = {}
+        self.published = []
+        self.log = []
+        # offset -> bytes que el servidor alcanza a guardar antes de fallar
+        self.fail_offsets = {}
+        self.lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def requests(self, kind):
+        with self.lock:
+            return [entry for entry in self.log if entry[0] == kind]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            timeout = 10
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload=None):
+                body = json.dumps(payload if payload is not None else {}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                container_id = url.path.strip('/')
+                fields = parse_qs(url.query).get('fields', [''])[0]
+
+                with mock.lock:
+                    container = mock.containers.get(container_id)
+                    if container is None:
+                        self._reply(404, {'error': 'container desconocido'})
+                        return
+                    received = len(container['data'])
+                    complete = container['size'] is not None and received == container['size']
+                    mock.log.append(('status', container_id, fields))
+
+                payload = {'status_code': 'FINISHED' if complete else 'IN_PROGRESS'}
+                if 'video_status' in fields:
+                    payload['video_status'] = {'uploading_phase': {'bytes_transferred': received}}
+                self._reply(200, payload)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                path = urlparse(self.path).path
+
+                if path == f"/{mock.user_id}/media":
+                    with mock.lock:
+                        container_id = f"C{len(mock.containers) + 1}"
+                        mock.containers[container_id] = {'size': None, 'data': bytearray()}
+                        mock.log.append(('create', container_id, None))
+                    self._reply(200, {'id': container_id, 'uri': f"{mock.url}/rupload/{container_id}"})
+                    return
+
+                if path.startswith('/rupload/'):
+                    container_id = path.rsplit('/', 1)[-1]
+                    offset = int(self.headers['offset'])
+                    with mock.lock:
+                        container = mock.containers[container_id]
+                        container['size'] = int(self.headers['file_size'])
+                        mock.log.append(('chunk', container_id, offset))
+
+                        if offset in mock.fail_offsets:
+                            # Parte del chunk llega antes de que el servidor falle
+                            kept = mock.fail_offsets.pop(offset)
+                            container['data'].extend(body[:kept])
+                            self._reply(503, {'error': 'temporalmente no disponible'})
+                            return
+                        if offset != len(container['data']):
+                            self._reply(400, {'error': 'offset fuera de orden'})
+                            return
+                        container['data'].extend(body)
+                    self._reply(200, {'success': True})
+                    return
+
+                if path == f"/{mock.user_id}/media_publish":
+                    creation_id = parse_qs(body.decode())['creation_id'][0]
+                    with mock.lock:
+                        mock.published.append(creation_id)
+                    self._reply(200, {'id': f"M{creation_id}"})
+                    return
+
+                self._reply(404, {'error': 'ruta desconocida'})
+
+        return Handler
@@ -0,0 +1,363 @@
+import json
+import time
+import uuid
+import threading
+
+import pytest
+
+for module in ('flask', 'flask_cors', 'yt_dlp', 'googleapiclient'):
+    pytest.importorskip(module)
+
+import app as app_module
+from services.job_queue import JobContext
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+def job_context(kind, payload):
+    """Contexto de un trabajo ejecutado a mano (la cola no se arranca en los tests)"""
+    job_id = str(uuid.uuid4())
+    app_module.tasks[job_id] = {'status': 'queued', 'progress': 0, 'message': '', 'uploads': {}}
+    return JobContext(app_module.job_queue, job_id, kind, payload, 1, 1, time.time() + 60)
+
+
+class FakeListing:
+    """YoutubeDL que devuelve un listado plano con los captions de TikTok"""
+
+    def __init__(self, opts):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=False, process=True):
+        return {'entries': iter([
+            {'id': video_id, 'url': f"https://www.tiktok.com/@user/video/{video_id}", 'title': f"caption {video_id}"}
+            for video_id in ('903', '902', '901')
+        ])}
+
+
+def test_import_uses_the_request_title_over_the_captions(monkeypatch):
+    import services.tiktok_downloader as downloader_module
+    monkeypatch.setattr(downloader_module.yt_dlp, 'YoutubeDL', FakeListing)
+
+    source_url = f"https://www.tiktok.com/tag/prueba{uuid.uuid4().hex[:8]}"
+    ctx = job_context('import', {
+        'url': source_url, 'platforms': ['youtube'], 'title': 'Mi serie {index}',
+        'description': '', 'limit': 10
+    })
+    app_module.run_import_job(ctx)
+
+    batch_id = app_module.tasks[ctx.job_id]['result']['batch_id']
+    jobs = app_module.job_queue.find_jobs('batch_id', batch_id)
+    assert [job['payload']['url'].rsplit('/', 1)[-1] for job in jobs] == ['901', '902', '903']
+    assert {job['payload']['title'] for job in jobs} == {'Mi serie {index}'}
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch):
+    from services.media_host import MediaHost
+
+    host = MediaHost(str(tmp_path / 'media'), 'secreto', base_url='https://app.example.com')
+    monkeypatch.setattr(app_module, 'media_host', host)
+
+    video = tmp_path / 'video.mp4'
+    video.write_bytes(bytes(range(256)) * 16)
+    _, url = host.publish(str(video))
+    return url[len('https://app.example.com'):], video.read_bytes()
+
+
+def test_serve_media_answers_ranges_and_conditional_requests(client, media):
+    url, content = media
+
+    full = client.get(url)
+    assert full.status_code == 200
+    assert full.data == content
+    assert full.headers['Accept-Ranges'] == 'bytes'
+    etag = full.headers['ETag']
+
+    partial = client.get(url, headers={'Range': 'bytes=100-199'})
+    assert partial.status_code == 206
+    assert partial.data == content[100:200]
+    assert partial.headers['Content-Range'] == f"bytes 100-199/{len(content)}"
+
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    assert client.head(url).headers['Content-Length'] == str(len(content))
+
+
+def test_serve_media_hides_unsigned_files(client, media):
+    url, _ = media
+    path = url.split('?', 1)[0]
+
+    assert client.get(path).status_code == 404
+    assert client.get(url.replace('sig=', 'sig=0')).status_code == 404
+
+
+def test_retry_skips_uploads_still_in_flight(monkeypatch):
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_upload(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return {'video_url': 'https://youtu.be/x'}
+
+    monkeypatch.setattr(app_module.youtube_uploader, 'upload', slow_upload)
+    ctx = job_context('process', {'platforms': ['youtube', 'instagram']})
+    task_id = ctx.job_id
+
+    # Subida del intento que venció, todavía en marcha
+    thread = threading.Thread(target=app_module.upload_to_platform, args=(task_id, 'youtube', 'video.mp4', ''))
+    thread.start()
+    assert started.wait(5)
+
+    assert app_module.pending_platforms(task_id, ['youtube', 'instagram']) == ['instagram']
+    assert not app_module.wait_for_uploads(task_id, 0.1)
+
+    release.set()
+    assert app_module.wait_for_uploads(task_id, 5)
+    thread.join(5)
+    assert app_module.pending_platforms(task_id, ['youtube', 'instagram']) == ['instagram']
+    assert app_module.tasks[task_id]['uploads']['youtube']['status'] == 'completed'
+
+
+def test_partial_success_is_a_terminal_state():
+    ctx = job_context('process', {'platforms': ['youtube', 'instagram']})
+    app_module.tasks[ctx.job_id]['uploads'] = {
+        'youtube': {'status': 'completed'},
+        'instagram': {'status': 'error', 'error': 'container ERROR'}
+    }
+
+    assert app_module.handle_process_error(ctx, Exception('instagram'), will_retry=True) is None
+    assert app_module.tasks[ctx.job_id]['status'] == 'queued'
+
+    assert app_module.handle_process_error(ctx, Exception('instagram'), will_retry=False) == 'completed_with_errors'
+    task = app_module.tasks[ctx.job_id]
+    assert task['status'] == 'completed_with_errors'
+    assert task['message'] == 'Completado con errores en: instagram'
+
+
+def test_upload_platforms_fail_independently(client, monkeypatch):
+    from concurrent.futures import Future
+    from services.pipeline import BranchError
+
+    calls = {'youtube': 0, 'instagram': 0}
+    youtube_fails = [True]
+
+    def youtube_upload(*args, **kwargs):
+        calls['youtube'] += 1
+        if youtube_fails[0]:
+            raise Exception('quotaExceeded')
+        return {'video_url': 'https://youtu.be/x'}
+
+    def instagram_upload(*args, **kwargs):
+        calls['instagram'] += 1
+        future = Future()
+        future.set_result({'permalink': 'https://instagram.com/reel/x'})
+        return future
+
+    monkeypatch.setattr(app_module.youtube_uploader, 'upload', youtube_upload)
+    monkeypatch.setattr(app_module.instagram_uploader, 'upload_async', instagram_upload)
+
+    response = client.post('/api/upload', json={
+        'video_path': 'video.mp4', 'platforms': ['youtube', 'instagram'], 'description': 'hola'
+    })
+    assert response.status_code == 200
+    task_id = response.get_json()['task_id']
+    job = app_module.job_queue.get(task_id)
+    ctx = JobContext(app_module.job_queue, task_id, 'upload', job['payload'], 1, 2, time.time() + 60)
+
+    # YouTube falla sin impedir la subida a Instagram
+    with pytest.raises(BranchError) as error:
+        app_module.run_upload_job(ctx)
+    assert list(error.value.errors) == ['youtube']
+    uploads = app_module.tasks[task_id]['uploads']
+    assert uploads['youtube']['status'] == 'error'
+    assert uploads['instagram']['status'] == 'completed'
+
+    # El reintento sube solo la plataforma que falló
+    youtube_fails[0] = False
+    app_module.run_upload_job(ctx)
+    assert calls == {'youtube': 2, 'instagram': 1}
+    assert app_module.tasks[task_id]['status'] == 'completed'
+    assert app_module.tasks[task_id]['uploads']['youtube']['status'] == 'completed'
+
+
+def tiktok_url(video_id):
+    return f"https://www.tiktok.com/@user/video/{video_id}"
+
+
+def test_batch_rejects_invalid_urls(client):
+    response = client.post('/api/batch', json={'urls': [tiktok_url(1), 'https://example.com/x'], 'platforms': ['youtube']})
+
+    assert response.status_code == 400
+    assert response.get_json()['invalid_urls'] == ['https://example.com/x']
+    assert client.post('/api/batch', json={'urls': [tiktok_url(1)], 'platforms': []}).status_code == 400
+
+
+def test_batch_status_aggregates_its_items(client):
+    response = client.post('/api/batch', json={
+        'urls': [tiktok_url(1), {'url': tiktok_url(2), 'title': 'Propio'}, tiktok_url(3), tiktok_url(1)],
+        'platforms': ['youtube', 'instagram'],
+        'title': 'Serie {index}'
+    })
+    assert response.status_code == 200
+    created = response.get_json()
+    assert (created['total'], created['duplicates']) == (3, 1)
+    batch_id = created['batch_id']
+    first, second, third = created['task_ids']
+
+    jobs = app_module.job_queue.find_jobs('batch_id', batch_id)
+    assert [job['payload']['title'] for job in jobs] == ['Serie {index}', 'Propio', 'Serie {index}']
+
+    status = client.get(f"/api/batch/{batch_id}").get_json()
+    assert (status['status'], status['finished'], status['counts']) == ('queued', 0, {'queued': 3})
+
+    app_module.tasks[first].update(status='completed', progress=100)
+    app_module.tasks[second].update(status='processing', progress=50)
+    status = client.get(f"/api/batch/{batch_id}").get_json()
+    assert (status['status'], status['finished'], status['progress']) == ('processing', 1, 50)
+
+    app_module.tasks[second].update(
+        status='completed_with_errors', progress=100,
+        uploads={'youtube': {'status': 'completed'}, 'instagram': {'status': 'error', 'error': 'container ERROR'}}
+    )
+    app_module.tasks[third].update(status='error', progress=0, message='Error: video privado')
+    status = client.get(f"/api/batch/{batch_id}").get_json()
+
+    assert status['status'] == 'completed_with_errors'
+    assert status['finished'] == status['total'] == 3
+    assert status['counts'] == {'completed': 1, 'completed_with_errors': 1, 'error': 1}
+    assert [(failure['task_id'], failure['failed_uploads']) for failure in status['failures']] == [
+        (second, {'instagram': 'container ERROR'}),
+        (third, {})
+    ]
+    assert [item['index'] for item in status['items']] == [1, 2, 3]
+
+
+def test_batch_from_jsonl_upload(client):
+    import io
+
+    lines = '\n'.join([json.dumps(tiktok_url(7)), '', json.dumps({'url': tiktok_url(8), 'description': 'Otra'})])
+    response = client.post('/api/batch', data={
+        'platforms': 'youtube,instagram',
+        'file': (io.BytesIO(lines.encode()), 'lote.jsonl')
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    jobs = app_module.job_queue.find_jobs('batch_id', response.get_json()['batch_id'])
+    assert [job['payload']['platforms'] for job in jobs] == [['youtube', 'instagram']] * 2
+    assert jobs[1]['payload']['description'] == 'Otra'
+
+    bad = client.post('/api/batch', data={
+        'platforms': 'youtube', 'file': (io.BytesIO(b'{no es json'), 'lote.jsonl')
+    }, content_type='multipart/form-data')
+    assert bad.status_code == 400
+    assert client.get('/api/batch/no-existe').status_code == 404
+
+
+class EventReader:
+    """Lee un stream SSE del cliente de pruebas evento a evento"""
+
+    def __init__(self, response):
+        self.response = response
+        self.chunks = iter(response.response)
+
+    def next(self):
+        for chunk in self.chunks:
+            text = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if text.startswith('event: '):
+                kind, data = text.strip().split('\n', 1)
+                return kind[len('event: '):], json.loads(data[len('data: '):])
+        return None
+
+    def close(self):
+        self.response.close()
+
+
+def new_task(**fields):
+    task_id = str(uuid.uuid4())
+    app_module.tasks[task_id] = dict({'status': 'processing', 'progress': 10, 'message': '', 'uploads': {}}, **fields)
+    return task_id
+
+
+def test_task_events_send_a_snapshot_then_only_the_changed_keys(client):
+    task_id = new_task()
+    reader = EventReader(client.get(f'/api/task/{task_id}/events', buffered=False))
+
+    kind, data = reader.next()
+    assert kind == 'snapshot'
+    assert data['task_id'] == task_id
+    assert data['status'] == 'processing' and data['progress'] == 10
+
+    app_module.tasks[task_id].update({'progress': 40, 'message': 'Subiendo...', 'status': 'processing'})
+    assert reader.next() == ('update', {'progress': 40, 'message': 'Subiendo...', 'task_id': task_id})
+    reader.close()
+
+
+def test_task_events_of_a_finished_task_close_after_the_snapshot(client):
+    task_id = new_task(status='completed', progress=100)
+    reader = EventReader(client.get(f'/api/task/{task_id}/events', buffered=False))
+
+    kind, data = reader.next()
+    assert (kind, data['status']) == ('snapshot', 'completed')
+    assert reader.next() is None
+
+
+def test_task_events_of_an_unknown_task(client):
+    assert client.get(f'/api/task/{uuid.uuid4()}/events').status_code == 404
+
+
+def test_multiplexed_events_only_include_the_requested_tasks(client):
+    first, second, other = new_task(), new_task(), new_task()
+    reader = EventReader(client.get(f'/api/events?tasks={first},{second}', buffered=False))
+
+    assert {reader.next()[1]['task_id'] for _ in range(2)} == {first, second}
+
+    app_module.tasks[other]['progress'] = 50
+    app_module.tasks[second]['progress'] = 60
+    assert reader.next() == ('update', {'progress': 60, 'task_id': second})
+    reader.close()
+
+
+def test_task_events_deliver_the_final_change_before_closing(client):
+    task_id = new_task()
+    reader = EventReader(client.get(f'/api/task/{task_id}/events', buffered=False))
+    assert reader.next()[0] == 'snapshot'
+
+    # La tarea termina mientras el stream espera: el cliente recibe el cambio
+    app_module.tasks[task_id].update({'status': 'completed', 'progress': 100})
+    assert reader.next() == ('update', {'status': 'completed', 'progress': 100, 'task_id': task_id})
+    assert reader.next() is None
+
+
+def test_task_events_of_a_task_only_in_the_job_queue(client):
+    job_id = app_module.job_queue.submit('download', {'url': 'https://www.tiktok.com/@user/video/1'})
+    assert job_id not in app_module.tasks
+
+    reader = EventReader(client.get(f'/api/task/{job_id}/events', buffered=False))
+    kind, data = reader.next()
+    assert (kind, data['task_id'], data['status']) == ('snapshot', job_id, 'queued')
+    reader.close()
+
+
+def test_resync_includes_tasks_created_after_connecting(client, monkeypatch):
+    active = [new_task()]
+    monkeypatch.setattr(app_module, 'active_task_ids', lambda: list(active))
+
+    reader = EventReader(client.get('/api/events', buffered=False))
+    assert reader.next()[1]['task_id'] == active[0]
+
+    active.append(new_task())
+    assert reader.next()[1]['task_id'] == active[1]
+
+    # El cliente se atrasó: la resincronización reenvía todas las tareas activas
+    app_module.task_events._subscribers[-1].overflowed = True
+    assert {reader.next()[1]['task_id'] for _ in range(2)} == set(active)
+    reader.close()
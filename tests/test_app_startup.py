@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('PIL')
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# sitecustomize del proceso de prueba: en vez de servir, app.run manda una
+# tarea al pool de miniaturas y guarda los hilos del proceso principal y los
+# de un worker del pool
+SITECUSTOMIZE = """
+import os
+import sys
+import json
+import threading
+
+
+def thread_names():
+    main = sys.modules.get('__mp_main__')
+    queue = getattr(main, 'job_queue', None)
+    return {
+        'threads': sorted(thread.name for thread in threading.enumerate()),
+        'reimported_main': queue is not None,
+        'queue_threads': len(queue._threads) if queue is not None else 0
+    }
+
+
+def fake_run(self, *args, **kwargs):
+    from services.thumbnail_renderer import thumbnail_renderer
+    executor = thumbnail_renderer._get_executor()
+    worker = executor.submit(thread_names).result(timeout=120)
+    main = {'threads': sorted(thread.name for thread in threading.enumerate())}
+    executor.shutdown(wait=True)
+    with open(os.environ['STARTUP_RESULT'], 'w') as f:
+        json.dump({'main': main, 'worker': worker}, f)
+    os._exit(0)
+
+
+try:
+    import flask
+    flask.Flask.run = fake_run
+except ImportError:
+    pass
+"""
+
+
+def test_thumbnail_pool_does_not_start_another_queue_consumer(tmp_path):
+    for module in ('yt_dlp', 'googleapiclient'):
+        pytest.importorskip(module)
+
+    hooks = tmp_path / 'hooks'
+    hooks.mkdir()
+    (hooks / 'sitecustomize.py').write_text(SITECUSTOMIZE)
+
+    data = tmp_path / 'data'
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join([str(hooks), REPO_DIR, os.environ.get('PYTHONPATH', '')]),
+        THUMBNAIL_RENDER_WORKERS='1',
+        JOB_QUEUE_DB=str(data / 'jobs.sqlite3'),
+        TASK_STORE_DB=str(data / 'tasks.sqlite3'),
+        DOWNLOAD_CACHE_DB=str(data / 'downloads.sqlite3'),
+        IMPORT_DB=str(data / 'imports.sqlite3'),
+        UPLOAD_SESSIONS_DB=str(data / 'upload_sessions.sqlite3'),
+        CREDENTIALS_DB=str(data / 'credentials.sqlite3'),
+        JOB_STAGE_SLOT_DIR=str(data / 'stage_slots'),
+        TRANSCODE_CACHE_DIR=str(data / 'transcode_cache'),
+        MEDIA_DIR=str(data / 'media'),
+        STARTUP_RESULT=str(tmp_path / 'result.json')
+    )
+
+    # Igual que `python app.py`: el script de la app es __main__
+    with open(tmp_path / 'output.txt', 'w') as output:
+        process = subprocess.run(
+            [sys.executable, os.path.join(REPO_DIR, 'app.py')],
+            cwd=tmp_path, env=env, stdout=output, stderr=subprocess.STDOUT, timeout=180
+        )
+    assert process.returncode == 0, (tmp_path / 'output.txt').read_text()
+    result = json.loads((tmp_path / 'result.json').read_text())
+
+    # El proceso principal consume la cola...
+    assert any(name.startswith('job-worker') for name in result['main']['threads'])
+
+    # ...y el worker del pool reimporta app.py como __mp_main__ sin arrancarla
+    worker = result['worker']
+    assert worker['reimported_main']
+    assert worker['queue_threads'] == 0
+    assert not [name for name in worker['threads']
+                if name.startswith(('job-', 'pipeline', 'task-events-bridge'))]
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from services.container_poller import ContainerStatusPoller
+
+
+class FakeCheck:
+    """check() que devuelve los estados indicados y anota cuándo se consultó"""
+
+    def __init__(self, *statuses, repeat='IN_PROGRESS'):
+        self.statuses = list(statuses)
+        self.repeat = repeat
+        self.times = []
+
+    def __call__(self):
+        self.times.append(time.time())
+        if self.statuses:
+            status = self.statuses.pop(0)
+        else:
+            status = self.repeat
+        if isinstance(status, Exception):
+            raise status
+        return status
+
+    def gaps(self):
+        return [later - earlier for earlier, later in zip(self.times, self.times[1:])]
+
+
+def test_interval_grows_until_the_maximum():
+    poller = ContainerStatusPoller(initial_delay=0.05, max_delay=0.2, backoff=2, timeout=10)
+    check = FakeCheck(*['IN_PROGRESS'] * 5, 'FINISHED')
+
+    assert poller.watch('C1', check).result(timeout=5) == 'C1'
+
+    # La primera consulta es inmediata; después 0.05, 0.1, 0.2 y el máximo
+    for gap, expected in zip(check.gaps(), [0.05, 0.1, 0.2, 0.2, 0.2]):
+        assert expected - 0.01 <= gap < expected + 0.1
+
+
+def test_status_callback_and_metrics():
+    poller = ContainerStatusPoller(initial_delay=0.01, max_delay=0.01, timeout=10)
+    seen = []
+    check = FakeCheck('IN_PROGRESS', None, 'FINISHED')
+
+    poller.watch('C1', check, on_status=lambda status, elapsed: seen.append(status)).result(timeout=5)
+
+    # None es un error transitorio de la consulta: se sigue esperando
+    assert seen == ['IN_PROGRESS', None, 'FINISHED']
+    stats = poller.stats()
+    assert (stats['polls'], stats['finished'], stats['watching'], stats['scheduled']) == (3, 1, 0, 0)
+    assert 0 < stats['avg_in_progress'] <= stats['max_in_progress'] + 0.01
+
+
+@pytest.mark.parametrize('status', ['ERROR', 'EXPIRED', Exception('sin conexión')])
+def test_failed_container(status):
+    poller = ContainerStatusPoller(initial_delay=0.01, timeout=10)
+
+    with pytest.raises(Exception):
+        poller.watch('C1', FakeCheck('IN_PROGRESS', status)).result(timeout=5)
+    assert poller.stats()['failed'] == 1
+
+
+def test_gives_up_when_the_next_poll_would_pass_the_timeout():
+    poller = ContainerStatusPoller(initial_delay=0.05, max_delay=0.1, backoff=2, timeout=0.3)
+    check = FakeCheck()
+
+    started = time.time()
+    with pytest.raises(Exception, match='Timeout'):
+        poller.watch('C1', check).result(timeout=5)
+
+    assert time.time() - started < 0.3
+    assert len(check.times) == 4
+    stats = poller.stats()
+    assert (stats['timed_out'], stats['watching'], stats['polls']) == (1, 0, 4)
+
+
+def test_containers_are_polled_by_their_own_schedule():
+    poller = ContainerStatusPoller(initial_delay=0.05, max_delay=0.05, timeout=10, workers=1)
+    slow = FakeCheck(*['IN_PROGRESS'] * 3, 'FINISHED')
+    fast = FakeCheck('FINISHED')
+
+    slow_future = poller.watch('slow', slow)
+    fast_future = poller.watch('fast', fast)
+
+    assert fast_future.result(timeout=5) == 'fast'
+    assert not slow_future.done()
+    assert slow_future.result(timeout=5) == 'slow'
+    assert poller.stats()['finished'] == 2
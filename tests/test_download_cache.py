@@ -0,0 +1,84 @@
+import os
+import time
+
+from services.download_cache import DownloadCache
+
+
+def make_video(folder, video_id, size=1000):
+    paths = {}
+    for key, suffix in (('video_path', '.mp4'), ('info_path', '_info.json'), ('thumbnail_path', '_thumb.jpg')):
+        path = os.path.join(folder, f"{video_id}{suffix}")
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        paths[key] = path
+    return dict(paths, video_id=video_id, metadata={'title': video_id})
+
+
+def files_exist(result):
+    return [os.path.exists(result[key]) for key in ('video_path', 'info_path', 'thumbnail_path')]
+
+
+def test_quota_skips_entries_in_use(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache.sqlite3'), ttl_seconds=3600, max_bytes=6000)
+
+    first = make_video(str(tmp_path), 'first')
+    cache.store('https://tiktok.com/@a/video/1', first, holder='job-1')
+    time.sleep(0.01)
+    second = make_video(str(tmp_path), 'second')
+    cache.store('https://tiktok.com/@a/video/2', second)
+
+    # Supera la cuota: se expulsa la entrada libre aunque sea la más nueva
+    third = make_video(str(tmp_path), 'third')
+    cache.store('https://tiktok.com/@a/video/3', third, holder='job-3')
+
+    assert files_exist(first) == [True] * 3
+    assert files_exist(second) == [False] * 3
+    assert cache.lookup('https://tiktok.com/@a/video/1') is not None
+
+
+def test_expired_entry_is_deleted_only_after_release(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache.sqlite3'), ttl_seconds=0.05, max_bytes=10 ** 9)
+
+    video = make_video(str(tmp_path), 'video')
+    cache.store('https://tiktok.com/@a/video/1', video)
+    assert cache.lookup('https://tiktok.com/@a/video/1', holder='job-1') is not None
+
+    time.sleep(0.1)
+    cache.evict()
+
+    # Fuera del índice, pero el trabajo sigue usando los archivos
+    assert cache.lookup('https://tiktok.com/@a/video/1') is None
+    assert files_exist(video) == [True] * 3
+
+    cache.release('job-1')
+    assert files_exist(video) == [False] * 3
+
+
+def test_stale_leases_stop_protecting_files(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache.sqlite3'), ttl_seconds=0.05, max_bytes=10 ** 9, lease_ttl=0.05)
+
+    video = make_video(str(tmp_path), 'video')
+    cache.store('https://tiktok.com/@a/video/1', video, holder='dead-job')
+
+    time.sleep(0.1)
+    cache.evict()
+
+    assert files_exist(video) == [False] * 3
+    assert cache.stats()['leased'] == 0
+
+
+def test_checkout_is_scoped_to_each_holder(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'cache.sqlite3'), ttl_seconds=0.05, max_bytes=10 ** 9)
+
+    video = make_video(str(tmp_path), 'video')
+    cache.store('https://tiktok.com/@a/video/1', video, holder='job-1')
+    assert cache.checkout('video', 'job-2')['video_path'] == video['video_path']
+
+    time.sleep(0.1)
+    cache.evict()
+
+    cache.release('job-1')
+    assert files_exist(video) == [True] * 3
+
+    cache.release('job-2')
+    assert files_exist(video) == [False] * 3
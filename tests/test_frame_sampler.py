@@ -0,0 +1,47 @@
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip('numpy')
+if not shutil.which('ffmpeg'):
+    pytest.skip('ffmpeg no está instalado', allow_module_level=True)
+
+from services.frame_sampler import FrameSampler
+
+
+def make_clip(path, extra_args=()):
+    # 3 s a 10 fps con un keyframe por segundo
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=size=320x240:rate=10:duration=3',
+         '-c:v', 'libx264', '-g', '10', '-pix_fmt', 'yuv420p', *extra_args, '-y', str(path)],
+        check=True
+    )
+    return str(path)
+
+
+@pytest.mark.parametrize('name, extra_args', [
+    ('clip.mp4', ()),
+    # Archivos que no empiezan en 0 (start: 5.000000)
+    ('offset.mp4', ('-output_ts_offset', '5')),
+    ('offset.mkv', ('-output_ts_offset', '5')),
+])
+def test_keyframe_timestamps_are_relative_to_the_file_start(tmp_path, name, extra_args):
+    sampler = FrameSampler(width=32, height=32)
+    frame_set = sampler.sample(make_clip(tmp_path / name, extra_args), str(tmp_path / 'frames.gray'), duration=3)
+
+    assert len(frame_set) == 3
+    assert frame_set.frames.shape == (3, 32, 32)
+    assert frame_set.timestamps == pytest.approx([0.0, 1.0, 2.0], abs=0.05)
+
+
+def test_time_sampling_of_long_gop_is_relative_to_the_file_start(tmp_path):
+    # Un solo keyframe: se muestrea por tiempo con el filtro fps
+    sampler = FrameSampler(width=32, height=32, max_frames=6)
+    path = make_clip(tmp_path / 'offset.mkv', ('-g', '100', '-output_ts_offset', '5'))
+    frame_set = sampler.sample(path, str(tmp_path / 'frames.gray'), duration=3)
+
+    assert len(frame_set) >= 3
+    assert frame_set.timestamps[0] == pytest.approx(0.0, abs=0.3)
+    assert frame_set.timestamps == sorted(frame_set.timestamps)
+    assert frame_set.timestamps[-1] < 3
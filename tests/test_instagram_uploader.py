@@ -0,0 +1,200 @@
+import os
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+
+import services.instagram_uploader as instagram_uploader
+from config import Config
+from services.instagram_uploader import InstagramUploader
+from tests.instagram_mock import MockInstagram
+
+CHUNK = 64 * 1024
+
+
+@pytest.fixture
+def mock_instagram():
+    server = MockInstagram()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def make_uploader(tmp_path, monkeypatch, mock_instagram):
+    """Uploaders en modo resumible contra el servidor simulado (uno por 'worker')"""
+    for name in ('INSTAGRAM_CLIENT_ID', 'INSTAGRAM_CLIENT_SECRET', 'INSTAGRAM_ACCESS_TOKEN'):
+        monkeypatch.setenv(name, 'test')
+    monkeypatch.setenv('INSTAGRAM_USER_ID', mock_instagram.user_id)
+
+    monkeypatch.setattr(Config, 'INSTAGRAM_GRAPH_URL', mock_instagram.url)
+    monkeypatch.setattr(Config, 'INSTAGRAM_UPLOAD_MODE', 'resumable')
+    monkeypatch.setattr(Config, 'UPLOAD_SESSIONS_DB', str(tmp_path / 'upload_sessions.db'))
+    monkeypatch.setattr(Config, 'INSTAGRAM_POLL_INITIAL_DELAY', 0.01)
+    monkeypatch.setattr(Config, 'INSTAGRAM_POLL_MAX_DELAY', 0.05)
+    monkeypatch.setattr(Config, 'INSTAGRAM_CONTAINER_TIMEOUT', 10)
+    monkeypatch.setattr(instagram_uploader.random, 'uniform', lambda low, high: 0)
+
+    def make():
+        uploader = InstagramUploader()
+        uploader.chunk_size = CHUNK
+        return uploader
+
+    return make
+
+
+def write_video(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = os.urandom(size)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return data
+
+
+def test_upload_resumes_after_restart_from_confirmed_offset(make_uploader, mock_instagram, monkeypatch, tmp_path):
+    first_path = str(tmp_path / 'run1' / 'video.mp4')
+    data = write_video(first_path, 5 * CHUNK - 100)
+
+    # Primer intento: el host de subida cae a mitad del tercer chunk
+    monkeypatch.setattr(Config, 'INSTAGRAM_UPLOAD_MAX_RETRIES', 0)
+    mock_instagram.fail_offsets = {2 * CHUNK: CHUNK // 2}
+    with pytest.raises(Exception):
+        make_uploader().upload(first_path, 'descripción', session_scope='job-1')
+
+    # Reinicio: otro proceso, y el mismo video en otra ruta
+    second_path = str(tmp_path / 'run2' / 'video_retry.mp4')
+    os.makedirs(os.path.dirname(second_path))
+    with open(second_path, 'wb') as f:
+        f.write(data)
+
+    chunks_before = len(mock_instagram.requests('chunk'))
+    uploader = make_uploader()
+    result = uploader.upload(second_path, 'descripción', session_scope='job-1')
+
+    assert result['success']
+    # Mismo container: el reinicio no creó otro
+    assert len(mock_instagram.requests('create')) == 1
+    assert mock_instagram.published == ['C1']
+    # Continúa desde los bytes que Instagram confirmó, incluido el medio chunk
+    resumed = mock_instagram.requests('chunk')[chunks_before:]
+    assert resumed[0][2] == 2 * CHUNK + CHUNK // 2
+    assert bytes(mock_instagram.containers['C1']['data']) == data
+    # La sesión terminada se borra del store
+    key = uploader.upload_sessions.file_key(second_path, 'job-1')
+    assert uploader.upload_sessions.get('instagram', key) is None
+
+
+def test_failed_chunk_resyncs_offset_within_the_same_upload(make_uploader, mock_instagram, monkeypatch, tmp_path):
+    path = str(tmp_path / 'video.mp4')
+    data = write_video(path, 3 * CHUNK)
+
+    monkeypatch.setattr(Config, 'INSTAGRAM_UPLOAD_MAX_RETRIES', 2)
+    mock_instagram.fail_offsets = {CHUNK: 1000}
+
+    result = make_uploader().upload(path, 'descripción', session_scope='job-1')
+
+    assert result['success']
+    offsets = [entry[2] for entry in mock_instagram.requests('chunk')]
+    assert offsets == [0, CHUNK, CHUNK + 1000, 2 * CHUNK + 1000]
+    assert bytes(mock_instagram.containers['C1']['data']) == data
+
+
+def test_other_job_does_not_reuse_the_session(make_uploader, mock_instagram, monkeypatch, tmp_path):
+    path = str(tmp_path / 'video.mp4')
+    write_video(path, 2 * CHUNK)
+
+    monkeypatch.setattr(Config, 'INSTAGRAM_UPLOAD_MAX_RETRIES', 0)
+    mock_instagram.fail_offsets = {CHUNK: 0}
+    with pytest.raises(Exception):
+        make_uploader().upload(path, 'descripción', session_scope='job-1')
+
+    make_uploader().upload(path, 'descripción', session_scope='job-2')
+
+    assert len(mock_instagram.requests('create')) == 2
+    assert mock_instagram.published == ['C2']
+
+
+@pytest.fixture
+def flaky_server():
+    """Servidor que responde 503 (o tarda 'delay' segundos) y cuenta las peticiones por método"""
+    calls = {'GET': 0, 'POST': 0}
+    settings = {'delay': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self):
+            calls[self.command] += 1
+            time.sleep(settings['delay'])
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        do_GET = do_POST = respond
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/", calls, settings
+    server.shutdown()
+    server.server_close()
+
+
+def test_only_get_requests_are_retried(make_uploader, flaky_server, monkeypatch):
+    url, calls, _ = flaky_server
+    monkeypatch.setattr(Config, 'INSTAGRAM_HTTP_RETRIES', 2)
+    monkeypatch.setattr(Config, 'INSTAGRAM_HTTP_BACKOFF', 0)
+    uploader = make_uploader()
+
+    assert uploader._request('GET', url).status_code == 503
+    assert calls['GET'] == 3
+
+    # Un POST repetido podría crear o publicar el container dos veces
+    assert uploader._request('POST', url).status_code == 503
+    assert calls['POST'] == 1
+
+
+def test_requests_use_the_configured_timeouts(make_uploader, flaky_server, monkeypatch):
+    url, calls, settings = flaky_server
+    monkeypatch.setattr(Config, 'INSTAGRAM_CONNECT_TIMEOUT', 2)
+    monkeypatch.setattr(Config, 'INSTAGRAM_READ_TIMEOUT', 0.2)
+    uploader = make_uploader()
+    assert uploader.timeout == (2, 0.2)
+
+    settings['delay'] = 1
+    started = time.time()
+    with pytest.raises(instagram_uploader.requests.exceptions.ReadTimeout):
+        uploader._request('POST', url)
+    assert time.time() - started < 0.9
+    assert calls['POST'] == 1
+
+
+def test_publish_does_not_hold_a_poller_worker(make_uploader, mock_instagram, monkeypatch, tmp_path):
+    path = str(tmp_path / 'video.mp4')
+    write_video(path, CHUNK)
+    monkeypatch.setattr(Config, 'INSTAGRAM_POLL_WORKERS', 1)
+    uploader = make_uploader()
+
+    release = threading.Event()
+    publish_threads = []
+    original = uploader._publish_container
+
+    def slow_publish(container_id):
+        publish_threads.append(threading.current_thread().name)
+        release.wait(5)
+        return original(container_id)
+
+    monkeypatch.setattr(uploader, '_publish_container', slow_publish)
+    future = uploader.upload_async(path, 'descripción', session_scope='job-1')
+
+    # Con la publicación en curso, el único worker del poller sigue libre
+    while not publish_threads:
+        time.sleep(0.01)
+    assert uploader.poller.watch('otro', lambda: 'FINISHED').result(timeout=2) == 'otro'
+
+    release.set()
+    assert future.result(timeout=5)['success']
+    assert publish_threads[0].startswith('instagram-publish')
@@ -0,0 +1,161 @@
+import os
+import time
+import sqlite3
+import multiprocessing
+from collections import Counter
+
+import pytest
+
+from services import job_queue as job_queue_module
+from services.job_queue import JobQueue, QueueHostError
+
+
+JOBS = 200
+PROCESSES = 3
+
+
+def append_line(path, line):
+    # O_APPEND: las líneas de varios procesos no se mezclan
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    try:
+        os.write(fd, f"{line}\n".encode())
+    finally:
+        os.close(fd)
+
+
+def run_worker_process(db_path, out_path, expected, timeout):
+    """Un worker de gunicorn: su propia JobQueue sobre la misma base"""
+    queue = JobQueue(db_path, workers=2, max_queue_size=JOBS, poll_interval=0.05)
+
+    def echo(ctx):
+        append_line(out_path, f"{ctx.job_id} {os.getpid()}")
+        time.sleep(0.02)
+
+    queue.register('echo', echo)
+    queue.start()
+
+    deadline = time.time() + timeout
+    while time.time() < deadline and queue.stats()['by_state'].get('completed', 0) < expected:
+        time.sleep(0.05)
+    queue.stop()
+
+
+def read_status(db_path, job_ids, barrier, duration, results):
+    """Lecturas de estado (get y find_jobs de un lote) durante duration segundos"""
+    queue = JobQueue(db_path, workers=1, max_queue_size=JOBS)
+    barrier.wait()
+
+    reads = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        queue.get(job_ids[reads % len(job_ids)])
+        queue.find_jobs('batch_id', 'batch')
+        reads += 1
+    results.put(reads)
+
+
+@pytest.fixture
+def spawn():
+    # Procesos nuevos, como los workers de gunicorn (sin heredar hilos ni conexiones)
+    return multiprocessing.get_context('spawn')
+
+
+def submit_jobs(db_path, count):
+    queue = JobQueue(db_path, workers=1, max_queue_size=count)
+    queue.register('echo', lambda ctx: None)
+    return queue, queue.submit_many('echo', [(f"job-{index:04d}", {'batch_id': 'batch'}) for index in range(count)])
+
+
+def test_jobs_run_exactly_once_across_worker_processes(tmp_path, spawn):
+    db_path = str(tmp_path / 'jobs.sqlite3')
+    out_path = str(tmp_path / 'executed.txt')
+    queue, job_ids = submit_jobs(db_path, JOBS)
+
+    processes = [
+        spawn.Process(target=run_worker_process, args=(db_path, out_path, JOBS, 60))
+        for _ in range(PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(90)
+        assert process.exitcode == 0
+
+    with open(out_path) as f:
+        executed = [line.split() for line in f.read().splitlines()]
+
+    assert sorted(job_id for job_id, _ in executed) == job_ids
+    assert queue.stats()['by_state'] == {'completed': JOBS}
+    print(f"\n[INFO] Trabajos por proceso: {sorted(Counter(pid for _, pid in executed).values())}")
+
+
+def test_status_reads_scale_with_worker_processes(tmp_path, spawn):
+    db_path = str(tmp_path / 'jobs.sqlite3')
+    _, job_ids = submit_jobs(db_path, JOBS)
+    duration = 1.0
+
+    throughput = {}
+    for processes in (1, 2, 4):
+        barrier = spawn.Barrier(processes)
+        results = spawn.Queue()
+        workers = [
+            spawn.Process(target=read_status, args=(db_path, job_ids, barrier, duration, results))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        reads = sum(results.get(timeout=60) for _ in workers)
+        for worker in workers:
+            worker.join(30)
+        throughput[processes] = reads / duration
+
+    cpus = os.cpu_count() or 1
+    print(f"\n[INFO] Lecturas de estado por segundo ({cpus} CPU): "
+          + ', '.join(f"{processes} procesos={int(rate)}" for processes, rate in throughput.items()))
+
+    # Las lecturas (WAL) no se bloquean entre procesos: el total crece con los
+    # procesos hasta el número de CPUs y no cae por contención más allá
+    for processes, rate in throughput.items():
+        assert rate >= 0.5 * throughput[1] * min(processes, cpus)
+
+
+def test_a_second_host_cannot_share_the_queue(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'jobs.sqlite3')
+    JobQueue(db_path)
+
+    monkeypatch.setattr(job_queue_module.socket, 'gethostname', lambda: 'otro-host')
+    with pytest.raises(QueueHostError):
+        JobQueue(db_path)
+
+    # El primer host dejó de renovar la reserva: el nuevo host la toma
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('UPDATE queue_host SET seen_at = ?', (time.time() - JobQueue.LEASE_SECONDS - 1,))
+    assert JobQueue(db_path).host == 'otro-host'
+
+
+def test_on_error_can_record_a_partial_success(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), workers=1, retry_count=1, retry_delay=0, poll_interval=0.05)
+    calls = []
+
+    def fail(ctx):
+        raise Exception('instagram: error')
+
+    def on_error(ctx, error, will_retry):
+        calls.append(will_retry)
+        return None if will_retry else 'completed_with_errors'
+
+    queue.register('partial', fail, on_error=on_error)
+    job_id = queue.submit('partial', {})
+    queue.start()
+    try:
+        deadline = time.time() + 10
+        while time.time() < deadline and queue.get(job_id)['state'] in ('queued', 'running'):
+            time.sleep(0.05)
+    finally:
+        queue.stop()
+
+    # Primero se reintenta; sin más intentos, el estado lo decide on_error
+    assert calls == [True, False]
+    job = queue.get(job_id)
+    assert job['state'] == 'completed_with_errors'
+    assert job['last_error'] == 'instagram: error'
@@ -0,0 +1,67 @@
+import os
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from services.media_host import MediaHost
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(b'\x00' * 1024)
+    return str(path)
+
+
+def signed_parts(url):
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    return parsed.path.rsplit('/', 1)[-1], query['expires'][0], query['sig'][0]
+
+
+def test_signed_url_resolves_to_the_published_file(tmp_path, video):
+    host = MediaHost(str(tmp_path / 'media'), 'secreto', base_url='https://app.example.com/')
+    name, url = host.publish(video)
+
+    assert url.startswith(f"https://app.example.com/media/{name}?")
+    path = host.resolve(*signed_parts(url))
+    assert path == os.path.join(host.media_dir, name)
+    with open(path, 'rb') as published, open(video, 'rb') as original:
+        assert published.read() == original.read()
+
+    host.release(name)
+    assert host.resolve(*signed_parts(url)) is None
+
+
+def test_tampered_or_expired_urls_are_rejected(tmp_path, video):
+    host = MediaHost(str(tmp_path / 'media'), 'secreto', base_url='https://app.example.com')
+    name, url = host.publish(video)
+    _, expires, signature = signed_parts(url)
+
+    # Otra clave, otra firma o un vencimiento alargado
+    assert MediaHost(str(tmp_path / 'media'), 'otro', base_url='x').resolve(name, expires, signature) is None
+    assert host.resolve(name, expires, '0' * len(signature)) is None
+    assert host.resolve(name, str(int(expires) + 3600), signature) is None
+    assert host.resolve(name, 'mañana', signature) is None
+
+    past = int(time.time()) - 1
+    assert host.resolve(name, past, host.sign(name, past)) is None
+
+
+@pytest.mark.parametrize('name', ['../video.mp4', 'sub/../../video.mp4', '.hidden', ''])
+def test_names_outside_the_media_dir_are_rejected(tmp_path, video, name):
+    host = MediaHost(str(tmp_path / 'media'), 'secreto', base_url='https://app.example.com')
+    expires = int(time.time()) + 60
+
+    # Aunque la firma sea válida para ese nombre
+    assert host.resolve(name, expires, host.sign(name, expires)) is None
+
+
+def test_publish_requires_an_explicit_secret(tmp_path, video):
+    host = MediaHost(str(tmp_path / 'media'), None, base_url='https://app.example.com')
+
+    with pytest.raises(Exception, match='MEDIA_URL_SECRET'):
+        host.publish(video)
+    assert os.listdir(host.media_dir) == []
+    assert host.resolve('x.mp4', int(time.time()) + 60, '') is None
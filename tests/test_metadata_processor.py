@@ -0,0 +1,131 @@
+import json
+import timeit
+
+import pytest
+
+from services.metadata_processor import (
+    EMOJI_PATTERNS,
+    HASHTAG_MAPPING,
+    KeywordMatcher,
+    MetadataProcessor,
+    load_metadata_mapping
+)
+
+
+# Palabras que se solapan o son sufijo/prefijo de otras (enlaces de fallo)
+OVERLAPPING = ['he', 'she', 'his', 'hers', 'fire', 'firework', 'work', 'ork', 'a', 'ñandú', '🔥']
+TEXTS = [
+    '',
+    'ushers',
+    'fireworks at the dance',
+    'hishe',
+    'un ñandú 🔥 en la pista',
+    'nothing to see here'
+]
+
+
+def brute_force(keywords, text):
+    return {keyword for keyword in keywords if keyword in text}
+
+
+@pytest.mark.parametrize('padding', [0, KeywordMatcher.SCAN_THRESHOLD])
+def test_find_matches_substring_search_on_both_sides_of_the_threshold(padding):
+    # Con relleno el conjunto supera el umbral y se usa el autómata
+    keywords = OVERLAPPING + [f"kw{index:03d}x" for index in range(padding)]
+    matcher = KeywordMatcher(keywords)
+
+    assert bool(matcher._goto[0]) == (len(matcher.keywords) > KeywordMatcher.SCAN_THRESHOLD)
+    for text in TEXTS + ['kw007x and kw0 and hers']:
+        assert matcher.find(text) == brute_force(matcher.keywords, text)
+
+
+def test_find_ignores_duplicate_and_empty_keywords():
+    matcher = KeywordMatcher(['fire', '', 'fire', 'wow'])
+
+    assert matcher.keywords == ['fire', 'wow']
+    assert matcher.find('wow, fire!') == {'fire', 'wow'}
+
+
+def test_process_descriptions_keeps_order_and_processes_repeats_once(monkeypatch):
+    processor = MetadataProcessor(mapping_file='')
+    descriptions = ['primero #fyp', 'segundo fire', 'primero #fyp', '', 'segundo fire']
+    expected = [processor.process_description(description) for description in descriptions]
+
+    calls = []
+    process_description = processor.process_description
+
+    def counting(description, *args):
+        calls.append(description)
+        return process_description(description, *args)
+
+    monkeypatch.setattr(processor, 'process_description', counting)
+    results = processor.process_descriptions(descriptions)
+
+    assert results == expected
+    assert calls == ['primero #fyp', 'segundo fire', '']
+
+    # Cada posición recibe su propio dict aunque la descripción se repita
+    results[0]['youtube'] = 'editado'
+    assert results[2]['youtube'] == expected[2]['youtube']
+
+
+def test_mapping_file_extends_and_overrides_defaults(tmp_path):
+    path = tmp_path / 'mapping.json'
+    path.write_text(json.dumps({
+        'hashtag_mapping': {'FYP': ['#paratodos'], '#Comedia': ['#humor', '#risa']},
+        'emoji_patterns': {'Fire': '🚒', 'gato': '🐱'}
+    }), encoding='utf-8')
+
+    hashtag_mapping, emoji_patterns = load_metadata_mapping(str(path))
+
+    assert hashtag_mapping['#fyp'] == ['#paratodos']
+    assert hashtag_mapping['#comedia'] == ['#humor', '#risa']
+    assert hashtag_mapping['#viral'] == HASHTAG_MAPPING['#viral']
+    assert emoji_patterns['fire'] == '🚒'
+    assert emoji_patterns['gato'] == '🐱'
+    assert list(emoji_patterns)[:len(EMOJI_PATTERNS)] == list(EMOJI_PATTERNS)
+
+    processor = MetadataProcessor(mapping_file=str(path))
+    assert processor.convert_tiktok_hashtags('#FYP y #comedia') == ['#paratodos', '#humor', '#risa']
+    assert processor.enhance_with_emojis('fire y un gato') == '🚒 fire y un gato 🐱'
+
+    # Los valores por defecto del módulo no se modifican
+    assert HASHTAG_MAPPING['#fyp'] == ['#viral', '#trending']
+
+
+def test_invalid_mapping_file_falls_back_to_defaults(tmp_path):
+    path = tmp_path / 'mapping.json'
+    path.write_text('{no es json', encoding='utf-8')
+
+    assert load_metadata_mapping(str(path)) == (HASHTAG_MAPPING, EMOJI_PATTERNS)
+    assert load_metadata_mapping('') == (HASHTAG_MAPPING, EMOJI_PATTERNS)
+
+
+def time_find(matcher, text, number=300):
+    return min(timeit.repeat(lambda: matcher.find(text), number=number, repeat=5)) / number
+
+
+def test_benchmark_scan_and_automaton_on_each_side_of_the_threshold():
+    class Automaton(KeywordMatcher):
+        SCAN_THRESHOLD = -1
+
+    words = [f"palabra{index:04d}" for index in range(1000)]
+    text = ' '.join(words[::37]) + ' fire dance #fyp #viral ' * 4
+
+    # Palabras por defecto: el camino que usa la app compara con `in`
+    default = KeywordMatcher(EMOJI_PATTERNS)
+    assert not default._goto[0]
+    scan, automaton = time_find(default, text), time_find(Automaton(EMOJI_PATTERNS), text)
+
+    # Muchas palabras clave: el autómata recorre el texto una sola vez
+    many = KeywordMatcher(list(EMOJI_PATTERNS) + words)
+    assert many._goto[0]
+    many_automaton = time_find(many, text, number=50)
+    many_scan = min(timeit.repeat(
+        lambda: {keyword for keyword in many.keywords if keyword in text}, number=50, repeat=5
+    )) / 50
+
+    print(f"\n[INFO] 8 palabras: in={scan * 1e6:.1f}us autómata={automaton * 1e6:.1f}us; "
+          f"{len(many.keywords)} palabras: in={many_scan * 1e6:.1f}us autómata={many_automaton * 1e6:.1f}us")
+    assert scan * 3 < automaton
+    assert many_automaton * 2 < many_scan
@@ -0,0 +1,123 @@
+import time
+import threading
+
+import pytest
+
+from services.pipeline import BranchError, ItemCancelledError, Pipeline
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = Pipeline()
+    yield pipeline
+    pipeline.stop(timeout=2)
+
+
+def test_cancel_skips_the_stages_that_did_not_start(pipeline):
+    started = threading.Event()
+    release = threading.Event()
+    ran = []
+
+    def slow(item):
+        ran.append('slow')
+        started.set()
+        release.wait(5)
+
+    def upload(item):
+        ran.append('upload')
+
+    pipeline.add_stage('slow', slow)
+    pipeline.add_stage('upload', upload)
+    pipeline.start()
+
+    future = pipeline.submit('job-1', {}, route=['slow', 'upload'])
+    assert started.wait(5)
+    assert pipeline.cancel(future)
+
+    # La etapa en curso termina; la siguiente no llega a ejecutarse
+    release.set()
+    with pytest.raises(ItemCancelledError):
+        future.result(timeout=5)
+    assert ran == ['slow']
+    assert not pipeline.cancel(future)
+
+
+def test_parallel_group_runs_branches_concurrently_and_joins(pipeline):
+    barrier = threading.Barrier(2, timeout=5)
+    order = []
+
+    def branch(name):
+        def handler(item):
+            # Solo pasa si las dos ramas están en ejecución a la vez
+            barrier.wait()
+            item.data[name] = True
+            order.append(name)
+        return handler
+
+    pipeline.add_stage('prepare', lambda item: order.append('prepare'))
+    pipeline.add_stage('youtube', branch('youtube'))
+    pipeline.add_stage('instagram', branch('instagram'))
+    pipeline.add_stage('report', lambda item: order.append('report'))
+    pipeline.start()
+
+    future = pipeline.submit('job-1', {}, route=['prepare', ['youtube', 'instagram'], 'report'])
+
+    assert future.result(timeout=5) == {'youtube': True, 'instagram': True}
+    assert order[0] == 'prepare' and order[-1] == 'report'
+    assert sorted(order[1:3]) == ['instagram', 'youtube']
+
+
+def test_failed_branch_waits_for_the_others_and_reports_all_errors(pipeline):
+    finished = []
+
+    def fail(item):
+        raise Exception('cuota agotada')
+
+    def slow(item):
+        time.sleep(0.2)
+        finished.append('slow')
+
+    pipeline.add_stage('fail', fail)
+    pipeline.add_stage('slow', slow)
+    pipeline.add_stage('after', lambda item: finished.append('after'))
+    pipeline.start()
+
+    future = pipeline.submit('job-1', {}, route=[['fail', 'slow'], 'after'])
+
+    with pytest.raises(BranchError) as error:
+        future.result(timeout=5)
+    # La rama lenta terminó antes de resolver el Future; el resto no se ejecuta
+    assert finished == ['slow']
+    assert list(error.value.errors) == ['fail']
+    assert 'cuota agotada' in str(error.value)
+
+
+def test_bounded_queue_blocks_the_previous_stage(pipeline):
+    release = threading.Event()
+    downloaded = []
+
+    def download(item):
+        downloaded.append(item.job_id)
+
+    pipeline.add_stage('download', download, workers=1, queue_size=1)
+    pipeline.add_stage('transcode', lambda item: release.wait(5), workers=1, queue_size=1)
+    pipeline.start()
+
+    futures = [pipeline.submit(f"job-{index}", {}) for index in range(2)]
+    # job-0 ocupa transcode y job-1 su cola: la descarga de job-2 queda
+    # bloqueada al entregarlo y job-3 espera en la cola de descarga
+    time.sleep(0.3)
+    submitter = threading.Thread(target=lambda: futures.extend(
+        pipeline.submit(f"job-{index}", {}) for index in (2, 3)
+    ))
+    submitter.start()
+    time.sleep(0.3)
+
+    assert downloaded == ['job-0', 'job-1', 'job-2']
+    assert pipeline.stats()['transcode']['queue_depth'] == 1
+
+    release.set()
+    submitter.join(5)
+    for future in futures:
+        future.result(timeout=5)
+    assert downloaded == ['job-0', 'job-1', 'job-2', 'job-3']
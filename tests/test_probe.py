@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from services.probe import VideoInfo, VideoProbe
+
+
+@pytest.fixture
+def probe(monkeypatch):
+    probe = VideoProbe(max_entries=2)
+    probe.analyzed = []
+
+    def analyze(video_path):
+        probe.analyzed.append(video_path)
+        return VideoInfo(VideoInfo.default(), file_size=os.path.getsize(video_path))
+
+    monkeypatch.setattr(probe, 'analyze', analyze)
+    return probe
+
+
+def write(path, size):
+    path.write_bytes(b'\x00' * size)
+    return str(path)
+
+
+def test_same_file_is_probed_once(tmp_path, probe):
+    path = write(tmp_path / 'video.mp4', 100)
+
+    first = probe.probe(path)
+    first['duration'] = 999
+    second = probe.probe(path)
+
+    assert probe.analyzed == [path]
+    # Cada llamada recibe su propia copia
+    assert second['duration'] == 0
+    assert probe.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'entries': 1}
+
+
+def test_changed_mtime_or_size_is_probed_again(tmp_path, probe):
+    path = write(tmp_path / 'video.mp4', 100)
+    probe.probe(path)
+
+    # Mismo tamaño, otro mtime (el archivo se reemplazó)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    probe.probe(path)
+
+    # Otro tamaño
+    write(tmp_path / 'video.mp4', 200)
+    assert probe.probe(path)['file_size'] == 200
+
+    assert probe.analyzed == [path] * 3
+
+
+def test_cache_keeps_the_most_recently_used_entries(tmp_path, probe):
+    paths = [write(tmp_path / f"video{index}.mp4", 100) for index in range(3)]
+
+    probe.probe(paths[0])
+    probe.probe(paths[1])
+    probe.probe(paths[0])
+    probe.probe(paths[2])
+
+    # paths[1] fue el menos usado: es el que sale de la cache
+    probe.analyzed.clear()
+    probe.probe(paths[0])
+    probe.probe(paths[1])
+    assert probe.analyzed == [paths[1]]
+    assert probe.stats()['entries'] == 2
+
+
+def test_from_ffprobe_normalizes_the_streams():
+    info = VideoInfo.from_ffprobe({
+        'streams': [
+            {'codec_type': 'video', 'codec_name': 'h264', 'width': 1080, 'height': 1920, 'r_frame_rate': '30000/1001'},
+            {'codec_type': 'audio', 'codec_name': 'aac'}
+        ],
+        'format': {'duration': '12.5', 'bit_rate': '4000000', 'size': '6250000'}
+    })
+
+    assert set(info) == set(VideoInfo.FIELDS)
+    assert info['fps'] == pytest.approx(29.97, abs=0.01)
+    assert (info['width'], info['height'], info['codec'], info['audio_codec']) == (1080, 1920, 'h264', 'aac')
+    assert info['aspect_ratio'] == pytest.approx(9 / 16)
@@ -0,0 +1,164 @@
+import types
+
+import pytest
+
+import services.task_store as task_store_module
+from services.task_store import SQLiteTaskBackend, TaskStore
+
+
+class FakeBroker:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, task_id, data, event='update'):
+        self.events.append((event, task_id, dict(data)))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(task_store_module, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_only_changed_keys_are_published():
+    broker = FakeBroker()
+    store = TaskStore(broker=broker)
+
+    store['t1'] = {'status': 'queued', 'progress': 0, 'uploads': {}}
+    store['t1'].update({'status': 'processing', 'progress': 0})
+    store['t1']['custom'] = 'x'
+    store['t1']['custom'] = 'x'
+
+    # Los dicts anidados se comparan por contenido al reasignarlos
+    uploads = dict(store['t1']['uploads'], youtube={'status': 'uploading'})
+    store['t1']['uploads'] = uploads
+    store['t1']['uploads'] = dict(uploads)
+
+    assert broker.events == [
+        ('snapshot', 't1', {'status': 'queued', 'progress': 0, 'uploads': {}}),
+        ('update', 't1', {'status': 'processing'}),
+        ('update', 't1', {'custom': 'x'}),
+        ('update', 't1', {'uploads': {'youtube': {'status': 'uploading'}}}),
+    ]
+    assert store.snapshot('t1') == {
+        'status': 'processing', 'progress': 0, 'uploads': {'youtube': {'status': 'uploading'}}, 'custom': 'x'
+    }
+
+
+def test_finished_tasks_expire_after_the_ttl(clock):
+    store = TaskStore(ttl_seconds=60)
+    store['done'] = {'status': 'queued'}
+    store['active'] = {'status': 'processing'}
+
+    store['done']['status'] = 'completed'
+    clock[0] += 30
+    store.evict()
+    assert 'done' in store
+
+    clock[0] += 31
+    store.evict()
+    assert 'done' not in store
+    assert 'active' in store
+    assert store.evictions == 1
+
+
+def test_retried_task_is_active_again(clock):
+    store = TaskStore(ttl_seconds=60)
+    store['t1'] = {'status': 'error'}
+    store['t1']['status'] = 'queued'
+
+    clock[0] += 120
+    store.evict()
+    assert 't1' in store
+    assert store.active_ids() == ['t1']
+
+
+def test_cap_evicts_the_oldest_finished_tasks_only(clock):
+    store = TaskStore(ttl_seconds=3600, max_tasks=2)
+    for task_id in ('a', 'b', 'c'):
+        store[task_id] = {'status': 'processing'}
+
+    # Las tareas activas nunca se expulsan, aunque se supere el máximo
+    assert all(task_id in store for task_id in ('a', 'b', 'c'))
+
+    for task_id in ('b', 'a'):
+        clock[0] += 1
+        store[task_id]['status'] = 'completed'
+
+    assert 'b' not in store
+    assert 'a' in store and 'c' in store
+    assert store.stats()['local_records'] == 2
+
+
+@pytest.fixture
+def shared_db(tmp_path):
+    return str(tmp_path / 'tasks.sqlite3')
+
+
+def test_workers_see_each_others_changes_through_the_backend(shared_db):
+    broker = FakeBroker()
+    first = TaskStore(backend=SQLiteTaskBackend(shared_db))
+    second = TaskStore(broker=broker, backend=SQLiteTaskBackend(shared_db))
+
+    first['t1'] = {'status': 'queued', 'progress': 0}
+    record = second['t1']
+    version = record._version
+
+    first['t1'].update({'status': 'processing', 'progress': 20})
+    assert second.backend.version('t1') == version + 1
+    assert second['t1'] is record
+    assert (record['status'], record['progress'], record._version) == ('processing', 20, version + 1)
+
+    # Lo recargado no se vuelve a publicar como cambio
+    record['progress'] = 20
+    assert broker.events == []
+    record['progress'] = 30
+    assert broker.events == [('update', 't1', {'progress': 30})]
+    assert first.snapshot('t1')['progress'] == 30
+
+
+def test_backend_evicts_expired_and_excess_finished_tasks(shared_db, clock):
+    store = TaskStore(backend=SQLiteTaskBackend(shared_db), ttl_seconds=60, max_tasks=2)
+    for task_id in ('a', 'b', 'c', 'd'):
+        store[task_id] = {'status': 'processing'}
+
+    for task_id in ('a', 'b', 'c'):
+        clock[0] += 1
+        store[task_id]['status'] = 'completed'
+
+    # Con 'd' activa solo cabe una terminada: la más reciente
+    assert [task_id for task_id in 'abcd' if store.snapshot(task_id)] == ['c', 'd']
+
+    clock[0] += 61
+    store.evict()
+    assert store.snapshot('c') is None
+    assert store.active_ids() == ['d']
+
+
+def test_redis_backend_applies_the_cap_to_finished_tasks(clock):
+    fakeredis = pytest.importorskip('fakeredis')
+    from services.task_store import RedisTaskBackend
+
+    backend = RedisTaskBackend('redis://localhost:6379/0', ttl_seconds=60)
+    backend.client = fakeredis.FakeRedis(decode_responses=True)
+    store = TaskStore(backend=backend, ttl_seconds=60, max_tasks=2)
+
+    for task_id in ('a', 'b', 'c', 'd'):
+        store[task_id] = {'status': 'processing'}
+    for task_id in ('a', 'b', 'c'):
+        clock[0] += 1
+        store[task_id]['status'] = 'completed'
+
+    assert [task_id for task_id in 'abcd' if store.snapshot(task_id)] == ['c', 'd']
+    assert backend.client.zrange(backend.FINISHED_KEY, 0, -1) == ['c']
+
+    # Reintentada: vuelve a ser activa y sale del sorted set
+    store['c']['status'] = 'queued'
+    assert backend.client.zcard(backend.FINISHED_KEY) == 0
+
+    store['c']['status'] = 'error'
+    clock[0] += 61
+    store.evict()
+    assert store.snapshot('c') is None
+    assert store.active_ids() == ['d']
@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from services import thumbnail_renderer as renderer_module
+from services.thumbnail_renderer import ThumbnailRenderer
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'thumb.jpg'
+    Image.new('RGB', (1920, 1080), (200, 40, 40)).save(path, 'JPEG')
+    return str(path)
+
+
+class BrokenExecutor:
+    """Pool cuyo worker muere: el Future falla desde otro hilo"""
+
+    def __init__(self):
+        self.future = Future()
+
+    def submit(self, fn, *args):
+        return self.future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def test_renders_every_platform_in_a_worker_process(source):
+    renderer = ThumbnailRenderer(workers=1)
+    try:
+        result = renderer.render(source, timeout=120)
+        # El proceso de la app tiene hilos: los workers no pueden salir de un fork
+        assert renderer._get_executor()._mp_context.get_start_method() in ('forkserver', 'spawn')
+    finally:
+        renderer.shutdown()
+
+    assert result['backend'] == 'process'
+    assert set(result['variants']) == {'youtube', 'instagram'}
+    for variant in result['variants'].values():
+        with Image.open(variant['path']) as img:
+            assert img.size == (variant['width'], variant['height'])
+
+
+def test_broken_pool_fallback_does_not_block_the_callback_thread(source, monkeypatch):
+    renderer = ThumbnailRenderer(workers=1)
+    executor = BrokenExecutor()
+    renderer._executor = executor
+
+    render_variants = renderer_module.render_variants
+    release = threading.Event()
+    render_threads = []
+
+    def slow_render(*args):
+        render_threads.append(threading.current_thread())
+        release.wait(10)
+        return render_variants(*args)
+
+    monkeypatch.setattr(renderer_module, 'render_variants', slow_render)
+
+    result = renderer.submit(source)
+    failing = threading.Thread(target=executor.future.set_exception, args=(BrokenProcessPool('worker died'),))
+    failing.start()
+    # set_exception corre el callback: debe volver sin esperar al render
+    failing.join(5)
+    assert not failing.is_alive()
+
+    release.set()
+    assert result.result(timeout=60)['backend'] == 'inline'
+    assert render_threads and render_threads[0] is not failing
+    assert renderer._executor is None
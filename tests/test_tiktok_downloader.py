@@ -0,0 +1,160 @@
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('yt_dlp')
+
+from config import Config
+from services.tiktok_downloader import TikTokDownloader
+
+
+PAGE = """<html><head>
+<title>{video_id}</title>
+<meta property="og:title" content="Video {video_id}">
+<meta property="og:description" content="Descripcion {video_id}">
+</head><body>
+<video src="/media/{video_id}.mp4" poster="/media/{video_id}.jpg"></video>
+</body></html>"""
+
+
+class MockVideoSite:
+    """
+    Servidor local con una página por video (la que lee el extractor de
+    yt-dlp) y sus archivos; registra cada petición para contar las de
+    metadatos
+    """
+
+    def __init__(self):
+        self.log = []
+        self.lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def video_url(self, video_id):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/@user/video/{video_id}"
+
+    def requests(self, path):
+        with self.lock:
+            return [entry for entry in self.log if entry == path]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            timeout = 10
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with mock.lock:
+                    mock.log.append(self.path)
+
+                name = self.path.rsplit('/', 1)[-1]
+                if self.path.startswith('/@user/video/'):
+                    body, content_type = PAGE.format(video_id=name).encode(), 'text/html'
+                elif name.endswith('.mp4'):
+                    body, content_type = b'\x00' * 4096, 'video/mp4'
+                elif name.endswith('.jpg'):
+                    body, content_type = b'\xff\xd8\xff\xd9', 'image/jpeg'
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+@pytest.fixture
+def site():
+    server = MockVideoSite()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Config, 'DOWNLOAD_CACHE_ENABLED', False)
+    downloader = TikTokDownloader()
+    monkeypatch.setattr(downloader, 'is_valid_tiktok_url', lambda url: True)
+    monkeypatch.setattr(downloader, 'get_video_info', lambda path: {})
+    return downloader
+
+
+def test_one_metadata_request_per_video(site, downloader):
+    for video_id in ('101', '102'):
+        result = downloader.fetch(site.video_url(video_id), f"job-{video_id}")
+
+        assert len(site.requests(f"/@user/video/{video_id}")) == 1
+        assert os.path.exists(result['video_path'])
+
+        # El info.json escrito por yt-dlp se conserva junto al video
+        assert result['info_path'] and os.path.exists(result['info_path'])
+        with open(result['info_path']) as f:
+            assert json.load(f)['webpage_url'] == site.video_url(video_id)
+
+
+class FakeListing:
+    """YoutubeDL que devuelve un listado plano fijo"""
+
+    entries = []
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=False, process=True):
+        return {'entries': iter([{'id': video_id, 'url': f"https://www.tiktok.com/@user/video/{video_id}"}
+                                 for video_id in self.entries])}
+
+
+@pytest.fixture
+def listing(downloader, monkeypatch):
+    import services.tiktok_downloader as downloader_module
+    monkeypatch.setattr(downloader_module.yt_dlp, 'YoutubeDL', FakeListing)
+    return FakeListing
+
+
+def test_profile_listing_stops_at_the_checkpoint(downloader, listing):
+    # Los 3 primeros pueden ser fijados: el punto de control se busca después
+    listing.entries = ['9', '1', '8', '7', '6', '5', '4']
+
+    result = downloader.list_entries('https://www.tiktok.com/@user', checkpoint_id='5')
+
+    assert [entry['video_id'] for entry in result['entries']] == ['9', '1', '8', '7', '6']
+    assert result['checkpoint_id'] == '7'
+
+
+def test_hashtag_listing_ignores_the_checkpoint(downloader, listing):
+    # Orden por relevancia: un video ya visto no marca el final de los nuevos
+    listing.entries = ['9', '1', '8', '5', '7', '6']
+    known = {'1', '5'}
+
+    result = downloader.list_entries(
+        'https://www.tiktok.com/tag/gatos', is_known=known.__contains__, checkpoint_id='5'
+    )
+
+    assert [entry['video_id'] for entry in result['entries']] == ['9', '8', '7', '6']
+    assert result['checkpoint_id'] is None
+    assert result['scanned'] == 6
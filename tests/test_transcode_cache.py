@@ -0,0 +1,78 @@
+import os
+import time
+
+import pytest
+
+from services.transcode_cache import TranscodeCache
+
+
+def write(path, size, byte=b'\x01'):
+    path.write_bytes(byte * size)
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TranscodeCache(str(tmp_path / 'cache'), max_bytes=3000)
+
+
+def test_hit_after_put_and_miss_for_other_parameters(tmp_path, cache):
+    source = write(tmp_path / 'source.mp4', 500)
+    source_hash = cache.hash_file(source)
+    key = cache.make_key(source_hash, {'platform': 'youtube_shorts', 'crf': 23})
+
+    assert cache.get(key, 'video') is None
+    cached = cache.put(key, 'video', write(tmp_path / 'out.mp4', 1000))
+
+    assert cache.get(key, 'video') == cached
+    # Mismo original con otros parámetros: otra clave
+    assert cache.get(cache.make_key(source_hash, {'platform': 'youtube_shorts', 'crf': 28}), 'video') is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries'], stats['size_bytes']) == (1, 2, 1, 1000)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, cache):
+    keys = [cache.make_key(f"hash-{index}", {}) for index in range(3)]
+    for index, key in enumerate(keys):
+        cache.put(key, 'video', write(tmp_path / f"out{index}.mp4", 1000))
+        time.sleep(0.01)
+
+    # Usar la primera entrada la vuelve la más reciente
+    assert cache.get(keys[0], 'video')
+    time.sleep(0.01)
+    cache.put(cache.make_key('hash-3', {}), 'video', write(tmp_path / 'out3.mp4', 1000))
+
+    assert cache.get(keys[1], 'video') is None
+    assert cache.get(keys[0], 'video') and cache.get(keys[2], 'video')
+    assert not os.path.exists(os.path.join(cache.cache_dir, keys[1][:2], keys[1]))
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size_bytes'] <= cache.max_bytes
+
+
+def test_files_are_hard_linked_and_survive_eviction(tmp_path, cache):
+    output = write(tmp_path / 'out.mp4', 1000)
+    key = cache.make_key('hash', {})
+    cached = cache.put(key, 'video', output)
+
+    # Sin copiar: el archivo de la cache es el mismo inodo
+    assert os.stat(cached).st_ino == os.stat(output).st_ino
+
+    working = cache.checkout(cached, str(tmp_path / 'work.mp4'))
+    assert os.stat(working).st_ino == os.stat(cached).st_ino
+
+    # Expulsar la entrada no borra la copia de trabajo de quien la usa
+    for index in range(3):
+        cache.put(cache.make_key(f"other-{index}", {}), 'video', write(tmp_path / f"o{index}.mp4", 1000, b'\x02'))
+    assert cache.get(key, 'video') is None
+    with open(working, 'rb') as f:
+        assert f.read() == b'\x01' * 1000
+
+
+def test_hash_is_memoized_until_the_file_changes(tmp_path, cache):
+    source = write(tmp_path / 'source.mp4', 100)
+    first = cache.hash_file(source)
+    assert cache.hash_file(source) == first
+
+    write(tmp_path / 'source.mp4', 101)
+    assert cache.hash_file(source) != first
@@ -0,0 +1,294 @@
+import os
+import re
+import time
+import shutil
+import subprocess
+
+import pytest
+
+if not shutil.which('ffmpeg'):
+    pytest.skip('ffmpeg no está instalado', allow_module_level=True)
+
+from config import Config
+from services.video_processor import VideoProcessor
+
+PLATFORMS = ['youtube_shorts', 'instagram_reels']
+
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('source') / 'source.mp4')
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=size=640x360:rate=30:duration=2',
+         '-f', 'lavfi', '-i', 'sine=frequency=440:duration=2',
+         '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', '-y', path],
+        check=True
+    )
+    return path
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    monkeypatch.setattr(Config, 'TRANSCODE_CACHE_ENABLED', False)
+    monkeypatch.setattr(Config, 'FFMPEG_SINGLE_PASS', True)
+    processor = VideoProcessor()
+
+    calls = {'multi': 0, 'single': 0}
+    process_multi, process_for_platform = processor.process_multi, processor.process_for_platform
+
+    def counting_multi(*args, **kwargs):
+        calls['multi'] += 1
+        return process_multi(*args, **kwargs)
+
+    def counting_single(*args, **kwargs):
+        calls['single'] += 1
+        return process_for_platform(*args, **kwargs)
+
+    monkeypatch.setattr(processor, 'process_multi', counting_multi)
+    monkeypatch.setattr(processor, 'process_for_platform', counting_single)
+    processor.calls = calls
+    yield processor
+    shutil.rmtree(processor.temp_dir, ignore_errors=True)
+
+
+def source_info(path):
+    return {
+        'duration': 2.0, 'width': 640, 'height': 360, 'fps': 30, 'codec': 'h264',
+        'audio_codec': 'aac', 'has_audio': True, 'file_size': 1, 'path': path
+    }
+
+
+def output_streams(path):
+    """Resolución, fps y duración de un archivo (sin ffprobe: se lee `ffmpeg -i`)"""
+    stderr = subprocess.run(['ffmpeg', '-hide_banner', '-i', path], capture_output=True, text=True).stderr
+    size = re.search(r'Video: .*?, (\d+)x(\d+)', stderr)
+    fps = re.search(r'([\d.]+) fps', stderr)
+    duration = re.search(r'Duration: (\d+):(\d+):([\d.]+)', stderr)
+    hours, minutes, seconds = duration.groups()
+    return {
+        'size': (int(size.group(1)), int(size.group(2))),
+        'fps': float(fps.group(1)),
+        'duration': int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+        'audio': 'Audio: aac' in stderr
+    }
+
+
+def test_single_pass_encodes_each_distinct_group(source, processor):
+    # Resolución y fps distintos: dos codificaciones en un solo FFmpeg
+    processor.platform_configs['youtube_shorts'].update(resolution={'width': 360, 'height': 640}, fps=30)
+    processor.platform_configs['instagram_reels'].update(resolution={'width': 272, 'height': 480}, fps=24)
+
+    groups = processor.group_platforms_by_encode(PLATFORMS, source_info(source), 'fast')
+    assert [platforms for _, platforms in groups] == [['youtube_shorts'], ['instagram_reels']]
+
+    result = processor.transcode(source, source_info(source), PLATFORMS, mode='throughput')
+
+    assert processor.calls == {'multi': 1, 'single': 0}
+    youtube = result['processed_videos']['youtube_shorts']
+    instagram = result['processed_videos']['instagram_reels']
+    assert youtube != instagram
+
+    assert output_streams(youtube)['size'] == (360, 640)
+    assert output_streams(youtube)['fps'] == 30
+    assert output_streams(instagram)['size'] == (272, 480)
+    assert output_streams(instagram)['fps'] == 24
+    assert output_streams(instagram)['audio']
+
+
+def test_same_resolution_groups_share_the_scaler(source, processor):
+    # Solo cambia la duración máxima: un escalado repartido a dos salidas
+    for platform in PLATFORMS:
+        processor.platform_configs[platform].update(resolution={'width': 360, 'height': 640}, fps=30)
+    processor.platform_configs['instagram_reels']['max_duration'] = 1
+
+    result = processor.transcode(source, source_info(source), PLATFORMS, mode='throughput')
+
+    assert processor.calls == {'multi': 1, 'single': 0}
+    youtube = output_streams(result['processed_videos']['youtube_shorts'])
+    instagram = output_streams(result['processed_videos']['instagram_reels'])
+    assert youtube['size'] == instagram['size'] == (360, 640)
+    assert youtube['duration'] == pytest.approx(2.0, abs=0.1)
+    assert instagram['duration'] == pytest.approx(1.0, abs=0.1)
+
+
+def test_identical_settings_produce_one_output(source, processor):
+    # Con CRF el bitrate no cambia la codificación: las dos comparten archivo
+    for platform in PLATFORMS:
+        processor.platform_configs[platform].update(resolution={'width': 360, 'height': 640}, fps=30)
+
+    result = processor.transcode(source, source_info(source), PLATFORMS, mode='throughput')
+
+    assert processor.calls == {'multi': 0, 'single': 1}
+    assert result['processed_videos']['youtube_shorts'] == result['processed_videos']['instagram_reels']
+
+
+@pytest.fixture(scope='module')
+def phone_clip(tmp_path_factory):
+    # 10 s vertical con un keyframe cada 2 s, como los videos de TikTok
+    path = str(tmp_path_factory.mktemp('phone') / 'phone.mp4')
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=size=540x960:rate=30:duration=10',
+         '-c:v', 'libx264', '-g', '60', '-pix_fmt', 'yuv420p', '-y', path],
+        check=True
+    )
+    return path
+
+
+def best_time(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def test_remux_thumbnail_uses_the_selector_at_seek_cost(phone_clip, processor, monkeypatch):
+    pytest.importorskip('numpy')
+    import services.video_processor as processor_module
+
+    timestamps = []
+    extract_thumbnail = processor.extract_thumbnail
+
+    def recording(video_path, timestamp=1.0):
+        timestamps.append(timestamp)
+        return extract_thumbnail(video_path, timestamp)
+
+    monkeypatch.setattr(processor, 'extract_thumbnail', recording)
+    selection = processor_module.frame_sampler.analyze(phone_clip, 10.0, names=['thumbnail'])['thumbnail']
+
+    result = processor.finalize(phone_clip, {'duration': 10.0}, {'processed': False})
+    assert os.path.exists(result['thumbnail'])
+    assert timestamps == [selection['timestamp']]
+
+    # Antes: un solo FFmpeg en 1.0 s. Ahora: keyframes en baja resolución y
+    # después el fotograma elegido; con GOP corto cuesta prácticamente lo mismo
+    fixed = best_time(lambda: extract_thumbnail(phone_clip, 1.0))
+    selected = best_time(lambda: processor.finalize(phone_clip, {'duration': 10.0}, {'processed': False}))
+    print(f"\n[INFO] Miniatura remux: fija={fixed * 1000:.0f} ms, selector={selected * 1000:.0f} ms")
+    assert selected <= fixed * 1.5 + 0.05
+
+
+def vertical_info(**overrides):
+    info = {
+        'duration': 30.0, 'width': 1080, 'height': 1920, 'fps': 30, 'codec': 'h264',
+        'audio_codec': 'aac', 'has_audio': True, 'file_size': 20 * 1024 * 1024
+    }
+    info.update(overrides)
+    return info
+
+
+@pytest.mark.parametrize('overrides, mode, tier', [
+    # Ya cumple: solo se reempaqueta, sin importar el modo
+    ({}, 'throughput', 'remux'),
+    ({}, 'quality', 'remux'),
+    ({'width': 720, 'height': 1280}, 'throughput', 'remux'),
+    # Otro códec, más resolución que la plataforma, otra proporción,
+    # demasiado largo o demasiado pesado: se recodifica según el modo
+    ({'codec': 'hevc'}, 'throughput', 'fast'),
+    ({'codec': 'hevc'}, 'quality', 'quality'),
+    ({'width': 2160, 'height': 3840}, 'throughput', 'fast'),
+    ({'width': 1920, 'height': 1080}, 'quality', 'quality'),
+    ({'duration': 600.0}, 'throughput', 'fast'),
+    ({'file_size': 300 * 1024 * 1024}, 'quality', 'quality'),
+])
+def test_select_tier(processor, overrides, mode, tier):
+    assert processor.select_tier(vertical_info(**overrides), PLATFORMS, mode) == tier
+
+
+def test_tier_presets(processor):
+    assert processor.encode_options('fast')['preset'] == Config.FFMPEG_FAST_OPTIONS['preset']
+    assert processor.encode_options('quality')['preset'] == Config.FFMPEG_OPTIONS['preset']
+    with pytest.raises(Exception):
+        processor.select_tier(vertical_info(), PLATFORMS, 'turbo')
+
+
+def test_remux_tier_copies_the_stream(tmp_path, processor):
+    # 9:16 en H.264 dentro de los límites: no se recodifica
+    path = str(tmp_path / 'vertical.mp4')
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=size=360x640:rate=30:duration=1',
+         '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-y', path],
+        check=True
+    )
+    info = vertical_info(duration=1.0, width=360, height=640, has_audio=False, audio_codec='none',
+                         file_size=os.path.getsize(path))
+
+    result = processor.transcode(path, info, PLATFORMS, mode='quality')
+
+    assert result['tier'] == 'remux'
+    assert processor.calls == {'multi': 0, 'single': 0}
+    assert output_streams(result['path'])['size'] == (360, 640)
+
+
+def test_parse_ffmpeg_progress(processor):
+    block = {'out_time_us': '5000000', 'fps': '59.5', 'speed': '2.5x', 'progress': 'continue'}
+    assert processor.parse_ffmpeg_progress(block, 20) == {
+        'fraction': 0.25, 'out_time': 5.0, 'fps': 59.5, 'speed': 2.5, 'eta': 6.0
+    }
+
+    # Valores que FFmpeg informa antes del primer fotograma
+    block = {'out_time_us': 'N/A', 'fps': '0.00', 'speed': 'N/A', 'progress': 'continue'}
+    assert processor.parse_ffmpeg_progress(block, 20) == {
+        'fraction': 0.0, 'out_time': 0.0, 'fps': 0.0, 'speed': 0.0, 'eta': None
+    }
+
+    # Sin duración no hay porcentaje hasta el final
+    block = {'out_time_us': '5000000', 'speed': '1x', 'progress': 'continue'}
+    assert processor.parse_ffmpeg_progress(block, None)['fraction'] == 0.0
+    assert processor.parse_ffmpeg_progress({'progress': 'end'}, None)['fraction'] == 1.0
+    assert processor.parse_ffmpeg_progress({'progress': 'end'}, 20)['eta'] == 0
+
+
+def test_ffmpeg_timeout_scales_with_duration(processor, monkeypatch):
+    monkeypatch.setattr(Config, 'FFMPEG_TIMEOUT_MIN', 300)
+    monkeypatch.setattr(Config, 'FFMPEG_TIMEOUT_FACTOR', 10)
+
+    assert processor.ffmpeg_timeout(None) == 300
+    assert processor.ffmpeg_timeout(12) == 300
+    assert processor.ffmpeg_timeout(180) == 1800
+
+
+def fake_ffmpeg(tmp_path, body):
+    # Ignora los argumentos; escribe en stdout como -progress pipe:1
+    path = tmp_path / 'fake-ffmpeg'
+    path.write_text(f"#!/bin/sh\n{body}\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_run_ffmpeg_reports_streamed_progress(tmp_path, processor):
+    output = tmp_path / 'out.mp4'
+    script = fake_ffmpeg(tmp_path, '\n'.join(
+        f"echo out_time_us={seconds * 1000000}; echo speed=2x; echo progress=continue"
+        for seconds in (1, 2, 3)
+    ) + f"\necho progress=end\ntouch {output}")
+
+    updates = []
+    processor.run_ffmpeg([script], [str(output)], duration=4, progress_callback=updates.append)
+
+    assert [update['fraction'] for update in updates] == [0.25, 0.5, 0.75, 1.0]
+    assert updates[0]['eta'] == 1.5
+
+
+def test_watchdog_kills_a_stalled_ffmpeg(tmp_path, processor, monkeypatch):
+    monkeypatch.setattr(Config, 'FFMPEG_STALL_TIMEOUT', 1)
+    script = fake_ffmpeg(tmp_path, 'echo progress=continue\nexec sleep 30')
+
+    started = time.time()
+    with pytest.raises(Exception, match='sin avanzar'):
+        processor.run_ffmpeg([script], [], duration=60)
+    assert time.time() - started < 10
+
+
+def test_watchdog_enforces_the_total_timeout(tmp_path, processor, monkeypatch):
+    monkeypatch.setattr(Config, 'FFMPEG_TIMEOUT_MIN', 1)
+    monkeypatch.setattr(Config, 'FFMPEG_TIMEOUT_FACTOR', 0)
+    # Avanza siempre, pero nunca termina
+    script = fake_ffmpeg(tmp_path, 'while true; do echo progress=continue; sleep 0.2; done')
+
+    started = time.time()
+    with pytest.raises(Exception, match=r'Timeout procesando video \(1s\)'):
+        processor.run_ffmpeg([script], [], duration=2)
+    assert time.time() - started < 10
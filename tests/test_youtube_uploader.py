@@ -0,0 +1,195 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip('googleapiclient')
+pytest.importorskip('google_auth_httplib2')
+
+from google.oauth2.credentials import Credentials
+
+from config import Config
+from services.credential_store import SQLiteCredentialStore
+from services.youtube_uploader import YouTubeUploader, SharedCredentials
+from tests.youtube_mock import MockYouTube
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@pytest.fixture
+def mock_youtube():
+    server = MockYouTube()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def make_uploader(tmp_path, monkeypatch, mock_youtube):
+    """Uploaders apuntando al servidor simulado y con stores en tmp_path (uno por 'worker')"""
+    monkeypatch.setattr(Config, 'UPLOAD_SESSIONS_DB', str(tmp_path / 'upload_sessions.db'))
+    monkeypatch.setattr(Config, 'YOUTUBE_UPLOAD_MAX_BACKOFF', 0)
+    monkeypatch.setattr(Config, 'YOUTUBE_HTTP_TIMEOUT', 10)
+    monkeypatch.setattr(YouTubeUploader, 'initialize_service', lambda self: None)
+
+    def make(token='valid', expiry=None):
+        uploader = YouTubeUploader()
+        uploader.credential_store = SQLiteCredentialStore(str(tmp_path / 'credentials.db'))
+        uploader.chunk_size = 256 * 1024
+        uploader._discovery_doc = mock_youtube.discovery_doc()
+
+        base = Credentials(
+            token=token,
+            refresh_token='refresh',
+            token_uri='https://oauth2.googleapis.com/token',
+            client_id='client',
+            client_secret='secret'
+        )
+        base.expiry = expiry or utcnow() + timedelta(hours=1)
+        uploader.credentials = SharedCredentials.adopt(base, uploader, uploader.SCOPES)
+        return uploader
+
+    return make
+
+
+def write_video(path, size):
+    data = os.urandom(size)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return data
+
+
+@pytest.mark.parametrize('scenario', ['expired', 'revoked'])
+def test_concurrent_uploads_refresh_token_once(scenario, make_uploader, mock_youtube, monkeypatch, tmp_path):
+    """
+    Varias subidas simultáneas con el token vencido (refresco en before_request)
+    o rechazado por el servidor (refresco de AuthorizedHttp ante un 401):
+    un solo refresco contra OAuth y el token nuevo queda guardado
+    """
+    refreshes = []
+    refresh_lock = threading.Lock()
+
+    def fake_refresh(self, request):
+        with refresh_lock:
+            refreshes.append(threading.get_ident())
+            count = len(refreshes)
+        threading.Event().wait(0.05)
+        self.token = f"fresh-{count}"
+        self.expiry = utcnow() + timedelta(hours=1)
+
+    monkeypatch.setattr(Credentials, 'refresh', fake_refresh)
+    mock_youtube.valid_tokens = {'fresh-1'}
+
+    if scenario == 'expired':
+        uploader = make_uploader(token='stale', expiry=utcnow() - timedelta(minutes=5))
+    else:
+        uploader = make_uploader(token='revoked')
+
+    videos = []
+    for index in range(4):
+        path = str(tmp_path / f"video_{index}.mp4")
+        write_video(path, 300 * 1024)
+        videos.append(path)
+
+    results = [None] * len(videos)
+    barrier = threading.Barrier(len(videos))
+
+    def upload(index):
+        # Cada hilo construye su cliente antes de que ninguno suba, para que
+        # todos lleguen con el token viejo
+        uploader._local.service = uploader.build_service()
+        barrier.wait()
+        results[index] = uploader.upload(videos[index], 'descripción', custom_title='test')
+
+    threads = [threading.Thread(target=upload, args=(index,)) for index in range(len(videos))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert not any(thread.is_alive() for thread in threads)
+
+    assert all(result and result['success'] for result in results)
+    assert len(refreshes) == 1
+    assert uploader.credentials.token == 'fresh-1'
+    assert '"fresh-1"' in uploader.credential_store.load('youtube')
+
+
+def test_refresh_reuses_token_saved_by_another_worker(make_uploader, monkeypatch):
+    """Si otro worker ya guardó un token válido, se adopta sin pedir uno nuevo"""
+    monkeypatch.setattr(Credentials, 'refresh', lambda self, request: pytest.fail('no debería refrescar'))
+
+    other = make_uploader(token='from-other-worker')
+    other.save_credentials()
+
+    uploader = make_uploader(token='stale', expiry=utcnow() - timedelta(minutes=5))
+    uploader.ensure_credentials()
+
+    assert uploader.credentials.token == 'from-other-worker'
+
+
+def interrupted_upload(make_uploader, mock_youtube, monkeypatch, path, fail_offset, scope='job-1'):
+    """Primer intento que se corta cuando el servidor falla en fail_offset"""
+    monkeypatch.setattr(Config, 'YOUTUBE_UPLOAD_MAX_RETRIES', 0)
+    mock_youtube.fail_offsets = {fail_offset}
+
+    with pytest.raises(Exception):
+        make_uploader().upload(path, 'descripción', custom_title='test', session_scope=scope)
+
+
+def test_upload_resumes_after_restart_from_saved_offset(make_uploader, mock_youtube, monkeypatch, tmp_path):
+    chunk = 256 * 1024
+    first_path = str(tmp_path / 'run1' / 'video.mp4')
+    os.makedirs(os.path.dirname(first_path))
+    data = write_video(first_path, 5 * chunk - 1000)
+
+    interrupted_upload(make_uploader, mock_youtube, monkeypatch, first_path, fail_offset=2 * chunk)
+
+    # Reinicio: otro proceso, y el pipeline deja el mismo video en otra ruta
+    second_path = str(tmp_path / 'run2' / 'video_retry.mp4')
+    os.makedirs(os.path.dirname(second_path))
+    with open(second_path, 'wb') as f:
+        f.write(data)
+
+    chunks_before = len(mock_youtube.requests('chunk'))
+    uploader = make_uploader()
+    result = uploader.upload(second_path, 'descripción', custom_title='test', session_scope='job-1')
+
+    assert result['success']
+    # Una sola sesión: el reinicio no creó otra
+    assert len(mock_youtube.requests('start')) == 1
+    assert len(mock_youtube.requests('query')) == 1
+    # Tras la consulta continúa desde el último byte confirmado
+    resumed = mock_youtube.requests('chunk')[chunks_before:]
+    assert resumed[0][2].startswith(f"bytes {2 * chunk}-")
+    session = next(iter(mock_youtube.sessions.values()))
+    assert bytes(session['data']) == data
+    # La sesión terminada se borra del store
+    key = uploader.upload_sessions.file_key(second_path, 'job-1')
+    assert uploader.upload_sessions.get('youtube', key) is None
+
+
+def test_session_is_saved_before_the_first_chunk(make_uploader, mock_youtube, monkeypatch, tmp_path):
+    path = str(tmp_path / 'video.mp4')
+    data = write_video(path, 300 * 1024)
+
+    interrupted_upload(make_uploader, mock_youtube, monkeypatch, path, fail_offset=0)
+
+    uploader = make_uploader()
+    key = uploader.upload_sessions.file_key(path, 'job-1')
+    assert uploader.upload_sessions.get('youtube', key)
+
+    assert uploader.upload(path, 'descripción', custom_title='test', session_scope='job-1')['success']
+    assert len(mock_youtube.requests('start')) == 1
+    assert bytes(next(iter(mock_youtube.sessions.values()))['data']) == data
+
+
+def test_other_job_does_not_reuse_the_session(make_uploader, mock_youtube, monkeypatch, tmp_path):
+    path = str(tmp_path / 'video.mp4')
+    write_video(path, 300 * 1024)
+
+    interrupted_upload(make_uploader, mock_youtube, monkeypatch, path, fail_offset=256 * 1024)
+    make_uploader().upload(path, 'descripción', custom_title='test', session_scope='job-2')
+
+    assert len(mock_youtube.requests('start')) == 2
@@ -0,0 +1,128 @@
+import re
+import json
+import uuid
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from googleapiclient.discovery_cache import get_static_doc
+
+
+class MockYouTube:
+    """
+    Servidor local con el protocolo de subida resumible de YouTube: POST de
+    inicio que devuelve la URI de la sesión, PUT por chunk con Content-Range
+    (308 + Range mientras falten bytes) y PUT vacío 'bytes */total' para
+    consultar lo recibido.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self.log = []
+        self.valid_tokens = None
+        self.fail_offsets = set()
+        self.lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def discovery_doc(self):
+        """Documento de discovery de YouTube v3 apuntando a este servidor"""
+        doc = json.loads(get_static_doc('youtube', 'v3'))
+        doc['rootUrl'] = f"{self.url}/"
+        doc['baseUrl'] = f"{self.url}/youtube/v3/"
+        return json.dumps(doc)
+
+    def requests(self, kind):
+        with self.lock:
+            return [entry for entry in self.log if entry[0] == kind]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Un cuerpo que nunca llega no debe colgar el test
+            timeout = 10
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body=b'', headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _authorized(self):
+                token = self.headers.get('Authorization', '').replace('Bearer ', '')
+                if mock.valid_tokens is not None and token not in mock.valid_tokens:
+                    self._reply(401, b'{"error": {"code": 401, "message": "Invalid Credentials"}}',
+                                {'Content-Type': 'application/json'})
+                    return False
+                return True
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with mock.lock:
+                    mock.log.append(('start', self.path, None))
+                if not self._authorized():
+                    return
+
+                session_id = uuid.uuid4().hex
+                with mock.lock:
+                    mock.sessions[session_id] = {
+                        'size': int(self.headers['X-Upload-Content-Length']),
+                        'data': bytearray()
+                    }
+                self._reply(200, headers={'Location': f"{mock.url}/upload/session/{session_id}"})
+
+            def do_PUT(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                content_range = self.headers.get('Content-Range', '')
+                session_id = self.path.rsplit('/', 1)[-1]
+
+                with mock.lock:
+                    session = mock.sessions.get(session_id)
+                    kind = 'query' if content_range.startswith('bytes */') else 'chunk'
+                    mock.log.append((kind, session_id, content_range))
+                if not self._authorized():
+                    return
+                if session is None:
+                    self._reply(404)
+                    return
+
+                with mock.lock:
+                    received = session['data']
+                    if kind == 'chunk':
+                        start = int(re.match(r'bytes (\d+)-', content_range).group(1))
+                        if start in mock.fail_offsets:
+                            # El servidor cae a mitad de la subida
+                            mock.fail_offsets.discard(start)
+                            self._reply(503)
+                            return
+                        if start != len(received):
+                            self._reply(400, b'{"error": "offset fuera de orden"}')
+                            return
+                        received.extend(body)
+
+                    if len(received) >= session['size']:
+                        response = {'id': f"video-{session_id[:8]}", 'kind': 'youtube#video'}
+                        self._reply(200, json.dumps(response).encode(), {'Content-Type': 'application/json'})
+                        return
+
+                    headers = {'Range': f"bytes=0-{len(received) - 1}"} if received else {}
+                self._reply(308, headers=headers)
+
+        return Handler